@@ -0,0 +1,80 @@
+"""Avatar thumbnails.
+
+An uploaded avatar is decoded once, center-cropped to a square and resized
+to each of ``AVATAR_SIZES``; the thumbnails are stored as WebP blobs and the
+upload itself is dropped.  The user document keeps the thumbnail blob ids
+(``avatar_thumbs``, keyed by edge length) and ``avatar_hash``, a hash of the
+uploaded bytes that goes into the avatar URL so the URL changes whenever the
+picture does and can be cached forever.
+
+Pillow does the decoding and is required: an upload is only ever stored as
+a re-encoded thumbnail, never as the bytes the client sent.
+"""
+import asyncio
+import hashlib
+import io
+from typing import Dict, Optional
+from urllib.parse import quote
+
+from PIL import Image, ImageOps
+
+AVATAR_SIZES = (64, 128, 256)
+DEFAULT_AVATAR_SIZE = 128
+# refuse to decode anything bigger (a small PNG can claim gigapixel dimensions)
+MAX_PIXELS = 40_000_000
+THUMBNAIL_TYPE = "image/webp"
+
+
+def avatar_hash(data: bytes) -> str:
+    return hashlib.sha256(data).hexdigest()[:16]
+
+
+def avatar_url(username: str, content_hash: str) -> str:
+    return f"/api/users/{quote(username, safe='')}/avatar?v={content_hash}"
+
+
+def make_thumbnails(data: bytes, sizes=AVATAR_SIZES) -> Dict[int, bytes]:
+    """Return ``{size: WebP bytes}``; CPU-bound, run it off the loop.
+
+    Raises ValueError for anything that isn't a decodable image.
+    """
+    try:
+        image = Image.open(io.BytesIO(data))
+        if image.width * image.height > MAX_PIXELS:
+            raise ValueError("Image too large")
+        # lets the JPEG decoder downscale while decoding
+        image.draft("RGB", (max(sizes), max(sizes)))
+        image = ImageOps.exif_transpose(image)
+        image = image.convert("RGBA" if image.mode in ("RGBA", "LA", "P") else "RGB")
+    except (OSError, Image.DecompressionBombError) as exc:
+        raise ValueError("Invalid image") from exc
+
+    thumbnails = {}
+    for size in sizes:
+        thumb = ImageOps.fit(image, (size, size), Image.LANCZOS)
+        out = io.BytesIO()
+        thumb.save(out, "WEBP", quality=80, method=4)
+        thumbnails[size] = out.getvalue()
+    return thumbnails
+
+
+def pick_size(available, requested: int) -> Optional[str]:
+    """Smallest stored size at least ``requested``, else the largest one."""
+    sizes = sorted(int(size) for size in available)
+    if not sizes:
+        return None
+    for size in sizes:
+        if size >= requested:
+            return str(size)
+    return str(sizes[-1])
+
+
+async def store_avatar(blob_store, username: str, data: bytes) -> dict:
+    """Thumbnail ``data`` into ``blob_store``; returns the user fields to ``$set``."""
+    thumbnails = await asyncio.to_thread(make_thumbnails, data)
+    thumb_ids = {}
+    for size, thumbnail in thumbnails.items():
+        manifest = await blob_store.put_bytes(thumbnail, THUMBNAIL_TYPE)
+        thumb_ids[str(size)] = manifest["id"]
+    content_hash = avatar_hash(data)
+    return {"avatar": avatar_url(username, content_hash), "avatar_thumbs": thumb_ids, "avatar_hash": content_hash}
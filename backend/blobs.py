@@ -0,0 +1,289 @@
+"""Content-addressed blob storage for note attachments and avatars.
+
+Uploads are split into fixed-size chunks as they stream in.  Each chunk is
+stored under the sha256 of its bytes, so identical chunks (and therefore
+identical files) are only stored once.  A blob is a manifest in the ``blobs``
+collection listing its chunk digests; its id is the sha256 of the whole
+content, which doubles as a strong ETag.
+
+Chunks live either in Mongo (``blob_chunks``, one binary document per chunk,
+the same layout GridFS uses) or on the local filesystem, selected with
+``BLOB_BACKEND=mongo|local``.
+"""
+import asyncio
+import base64
+import hashlib
+import os
+from datetime import datetime, timedelta, timezone
+from pathlib import Path
+from typing import AsyncIterator, List, Optional, Tuple
+from urllib.parse import unquote_to_bytes
+
+from bson.binary import Binary
+
+CHUNK_SIZE = 256 * 1024
+# chunks of failed uploads are only collected once they are this old
+ORPHAN_MIN_AGE = timedelta(hours=1)
+BLOB_URL_PREFIX = "/api/blobs/"
+
+
+class BlobTooLarge(Exception):
+    pass
+
+
+class MongoChunkStore:
+    def __init__(self, collection):
+        self.collection = collection
+
+    async def put(self, digest: str, data: bytes) -> bool:
+        """Store a chunk; returns whether it was new."""
+        # $setOnInsert makes re-uploading an existing chunk a no-op
+        result = await self.collection.update_one(
+            {"_id": digest},
+            {"$setOnInsert": {"data": Binary(data), "size": len(data)}},
+            upsert=True,
+        )
+        return result.upserted_id is not None
+
+    async def delete(self, digest: str):
+        await self.collection.delete_one({"_id": digest})
+
+    async def get(self, digest: str) -> bytes:
+        doc = await self.collection.find_one({"_id": digest}, {"data": 1})
+        if doc is None:
+            raise KeyError(digest)
+        return bytes(doc["data"])
+
+
+class LocalChunkStore:
+    def __init__(self, root: Path):
+        self.root = Path(root)
+
+    def _path(self, digest: str) -> Path:
+        return self.root / digest[:2] / digest
+
+    def _put_sync(self, digest: str, data: bytes) -> bool:
+        path = self._path(digest)
+        if path.exists():
+            return False
+        path.parent.mkdir(parents=True, exist_ok=True)
+        tmp = path.with_suffix(f".{os.getpid()}.tmp")
+        tmp.write_bytes(data)
+        os.replace(tmp, path)
+        return True
+
+    async def put(self, digest: str, data: bytes) -> bool:
+        return await asyncio.to_thread(self._put_sync, digest, data)
+
+    async def delete(self, digest: str):
+        await asyncio.to_thread(self._path(digest).unlink, missing_ok=True)
+
+    async def get(self, digest: str) -> bytes:
+        try:
+            return await asyncio.to_thread(self._path(digest).read_bytes)
+        except FileNotFoundError:
+            raise KeyError(digest)
+
+
+class BlobStore:
+    def __init__(self, db, chunks, chunk_size: int = CHUNK_SIZE, max_bytes: Optional[int] = None):
+        self.db = db
+        self.chunks = chunks
+        self.chunk_size = chunk_size
+        self.max_bytes = max_bytes
+
+    async def put_stream(self, stream: AsyncIterator[bytes], content_type: str = "application/octet-stream") -> dict:
+        """Store an async byte stream and return its manifest.
+
+        If the stream fails or turns out too large, the chunks it added are
+        recorded in ``blob_orphans`` for ``collect_orphan_chunks``.
+        """
+        whole = hashlib.sha256()
+        digests, created = [], []
+        size = 0
+        buffer = bytearray()
+
+        async def flush(piece: bytes):
+            digest = hashlib.sha256(piece).hexdigest()
+            if await self.chunks.put(digest, piece):
+                created.append(digest)
+            digests.append(digest)
+
+        try:
+            async for data in stream:
+                if not data:
+                    continue
+                size += len(data)
+                if self.max_bytes is not None and size > self.max_bytes:
+                    raise BlobTooLarge()
+                whole.update(data)
+                buffer.extend(data)
+                while len(buffer) >= self.chunk_size:
+                    await flush(bytes(buffer[:self.chunk_size]))
+                    del buffer[:self.chunk_size]
+            if buffer:
+                await flush(bytes(buffer))
+        except Exception:
+            if created:
+                await self.db.blob_orphans.insert_many(
+                    [{"digest": digest, "created_at": datetime.now(timezone.utc)} for digest in dict.fromkeys(created)]
+                )
+            raise
+
+        manifest = {
+            "id": whole.hexdigest(),
+            "size": size,
+            "content_type": content_type,
+            "chunk_size": self.chunk_size,
+            "chunks": digests,
+        }
+        await self.db.blobs.update_one(
+            {"id": manifest["id"]},
+            {"$setOnInsert": {**manifest, "created_at": datetime.now(timezone.utc)}},
+            upsert=True,
+        )
+        return manifest
+
+    async def collect_orphan_chunks(self, min_age: timedelta = ORPHAN_MIN_AGE, batch_size: int = 500) -> int:
+        """Delete chunks left by failed uploads that no manifest references.
+
+        A concurrent upload of the same bytes may share such a chunk before its
+        manifest is written, so only records older than ``min_age`` (far longer
+        than any upload takes) are considered.
+        """
+        cutoff = datetime.now(timezone.utc) - min_age
+        deleted = 0
+        while True:
+            batch = await self.db.blob_orphans.find(
+                {"created_at": {"$lt": cutoff}}, {"_id": 1, "digest": 1}
+            ).limit(batch_size).to_list(batch_size)
+            for record in batch:
+                if await self.db.blobs.find_one({"chunks": record["digest"]}, {"_id": 1}) is None:
+                    await self.chunks.delete(record["digest"])
+                    deleted += 1
+                await self.db.blob_orphans.delete_one({"_id": record["_id"]})
+            if len(batch) < batch_size:
+                break
+        return deleted
+
+    async def put_bytes(self, data: bytes, content_type: str = "application/octet-stream") -> dict:
+        if self.max_bytes is not None and len(data) > self.max_bytes:
+            raise BlobTooLarge()
+
+        async def one():
+            yield data
+        return await self.put_stream(one(), content_type)
+
+    async def get_manifest(self, blob_id: str) -> Optional[dict]:
+        return await self.db.blobs.find_one({"id": blob_id}, {"_id": 0})
+
+    async def iter_range(self, manifest: dict, start: int, end: int) -> AsyncIterator[bytes]:
+        """Yield bytes ``start..end`` (inclusive), reading only the chunks involved."""
+        chunk_size = manifest["chunk_size"]
+        first, last = start // chunk_size, end // chunk_size
+        for index in range(first, last + 1):
+            data = await self.chunks.get(manifest["chunks"][index])
+            offset = index * chunk_size
+            lo = max(start - offset, 0)
+            hi = min(end - offset + 1, len(data))
+            yield data[lo:hi]
+
+    async def read(self, blob_id: str) -> Optional[bytes]:
+        manifest = await self.get_manifest(blob_id)
+        if manifest is None:
+            return None
+        if manifest["size"] == 0:
+            return b""
+        return b"".join([piece async for piece in self.iter_range(manifest, 0, manifest["size"] - 1)])
+
+
+def create_blob_store(db) -> BlobStore:
+    backend = os.environ.get("BLOB_BACKEND", "mongo")
+    if backend == "local":
+        root = os.environ.get("BLOB_DIR", str(Path(__file__).parent / "blobdata"))
+        chunks = LocalChunkStore(Path(root))
+    elif backend == "mongo":
+        chunks = MongoChunkStore(db.blob_chunks)
+    else:
+        raise ValueError(f"Unknown BLOB_BACKEND: {backend}")
+    max_bytes = int(os.environ.get("BLOB_MAX_BYTES", str(25 * 1024 * 1024)))
+    return BlobStore(db, chunks, max_bytes=max_bytes)
+
+
+# Served as-is: media the browser renders but never runs.  SVG is an image
+# that can carry script, so it is not on the list.
+INLINE_TYPES = ("image/", "video/", "audio/", "application/pdf")
+INERT_EXCLUDED = ("image/svg+xml",)
+
+
+def served_content_type(content_type: Optional[str]) -> Tuple[str, bool]:
+    """``(content type, inline)`` to serve a blob with; anything active becomes a download."""
+    media_type = (content_type or "").split(";")[0].strip().lower()
+    if media_type.startswith(INLINE_TYPES) and media_type not in INERT_EXCLUDED:
+        return media_type, True
+    return "application/octet-stream", False
+
+
+def blob_url(blob_id: str) -> str:
+    return f"{BLOB_URL_PREFIX}{blob_id}"
+
+
+def decode_data_url(value: str) -> Tuple[str, bytes]:
+    """Split a ``data:<type>;base64,<payload>`` URL into (content type, bytes)."""
+    header, _, payload = value.partition(",")
+    if not header.startswith("data:") or not _:
+        raise ValueError("Not a data URL")
+    meta = header[len("data:"):].split(";")
+    content_type = meta[0] or "application/octet-stream"
+    if "base64" in meta[1:]:
+        return content_type, base64.b64decode(payload)
+    return content_type, unquote_to_bytes(payload)
+
+
+async def externalize_attachments(store: BlobStore, attachments: Optional[List[dict]]) -> List[dict]:
+    """Move inline data-URL attachments into the blob store.
+
+    Attachments that already reference a blob are passed through unchanged.
+    """
+    out = []
+    for attachment in attachments or []:
+        url = attachment.get("url") if isinstance(attachment, dict) else None
+        if isinstance(url, str) and url.startswith("data:"):
+            content_type, data = decode_data_url(url)
+            manifest = await store.put_bytes(data, content_type)
+            attachment = {
+                **attachment,
+                "url": blob_url(manifest["id"]),
+                "blob_id": manifest["id"],
+                "size": manifest["size"],
+                "content_type": content_type,
+            }
+        out.append(attachment)
+    return out
+
+
+def parse_range(header: Optional[str], size: int) -> Optional[Tuple[int, int]]:
+    """Parse a single ``bytes=`` range into inclusive offsets.
+
+    Returns None when there is no (usable) Range header and the whole body
+    should be sent; raises ValueError when the range cannot be satisfied.
+    """
+    if not header or not header.startswith("bytes=") or "," in header:
+        return None
+    spec = header[len("bytes="):].strip()
+    start_s, _, end_s = spec.partition("-")
+    try:
+        if start_s == "":
+            length = int(end_s)
+            if length <= 0:
+                raise ValueError("Unsatisfiable range")
+            start, end = max(size - length, 0), size - 1
+        else:
+            start = int(start_s)
+            end = int(end_s) if end_s else size - 1
+    except ValueError:
+        raise ValueError("Unsatisfiable range")
+    end = min(end, size - 1)
+    if start > end or start >= size:
+        raise ValueError("Unsatisfiable range")
+    return start, end
@@ -0,0 +1,210 @@
+"""gzip/brotli response compression with a size threshold.
+
+Pure ASGI middleware: the first ``min_size`` bytes of a response are held
+back; anything that ends before that goes out untouched, anything larger is
+compressed as it streams.  Brotli is used when the client accepts it and the
+``brotli`` package is installed, gzip otherwise.  Only textual content types
+are compressed (blobs and avatars are already-compressed images), and a
+response that already carries a ``Content-Encoding`` is left alone.
+
+Encoded responses get the encoding appended to their ETag
+(``"abc"`` -> ``"abc-gzip"``), so the strong tag stays unique per byte
+representation; ``backend.etags`` strips the suffix again when comparing.
+A 304 carries the tag of the variant the client revalidated, since that is
+the tag its 200 would have had.
+"""
+import zlib
+from typing import Optional
+
+from starlette.datastructures import Headers, MutableHeaders
+
+try:
+    import brotli
+except ImportError:  # pragma: no cover - optional, gzip still works
+    brotli = None
+
+ENCODING_SUFFIXES = ("-br", "-gzip")
+
+COMPRESSIBLE_TYPES = ("text/", "application/json", "application/javascript", "application/xml", "image/svg+xml")
+
+
+def _accepted(accept_encoding: str) -> set:
+    accepted = set()
+    for part in accept_encoding.split(","):
+        name, *params = [piece.strip() for piece in part.split(";")]
+        quality = 1.0
+        for param in params:
+            key, _, value = param.partition("=")
+            if key.strip().lower() == "q":
+                try:
+                    quality = float(value)
+                except ValueError:
+                    quality = 0.0
+        if name and quality > 0:
+            accepted.add(name.lower())
+    return accepted
+
+
+def choose_encoding(accept_encoding: str) -> Optional[str]:
+    accepted = _accepted(accept_encoding)
+    if brotli is not None and "br" in accepted:
+        return "br"
+    if "gzip" in accepted:
+        return "gzip"
+    return None
+
+
+def strip_encoding_suffix(tag: str) -> str:
+    for suffix in ENCODING_SUFFIXES:
+        if tag.endswith(f'{suffix}"'):
+            return tag[:-len(suffix) - 1] + '"'
+    return tag
+
+
+def revalidated_variant(if_none_match: str, etag: str) -> Optional[str]:
+    """The encoded variant of ``etag`` the client listed in If-None-Match, if any."""
+    for tag in if_none_match.split(","):
+        tag = tag.strip()
+        if tag.startswith("W/"):
+            tag = tag[2:]
+        if tag != etag and strip_encoding_suffix(tag) == etag:
+            return tag
+    return None
+
+
+class _Gzip:
+    def __init__(self, level: int):
+        self._compressor = zlib.compressobj(level, zlib.DEFLATED, 31)
+
+    def process(self, data: bytes) -> bytes:
+        return self._compressor.compress(data)
+
+    def finish(self) -> bytes:
+        return self._compressor.flush()
+
+
+class _Brotli:
+    def __init__(self, quality: int):
+        self._compressor = brotli.Compressor(quality=quality)
+
+    def process(self, data: bytes) -> bytes:
+        return self._compressor.process(data)
+
+    def finish(self) -> bytes:
+        return self._compressor.finish()
+
+
+class CompressionMiddleware:
+    def __init__(self, app, min_size: int = 1024, gzip_level: int = 6, brotli_quality: int = 4):
+        self.app = app
+        self.min_size = min_size
+        self.gzip_level = gzip_level
+        self.brotli_quality = brotli_quality
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+        request_headers = Headers(scope=scope)
+        if_none_match = request_headers.get("if-none-match")
+        if if_none_match:
+            send = _variant_tagging(if_none_match, send)
+        encoding = choose_encoding(request_headers.get("accept-encoding", ""))
+        if encoding is None:
+            await self.app(scope, receive, send)
+            return
+        responder = _CompressingResponder(self, encoding, send)
+        await self.app(scope, receive, responder.send)
+
+    def compressor(self, encoding: str):
+        return _Brotli(self.brotli_quality) if encoding == "br" else _Gzip(self.gzip_level)
+
+
+def _variant_tagging(if_none_match: str, send):
+    """Wrap ``send`` so a 304 names the encoded variant the client holds."""
+    async def tagging_send(message):
+        if message["type"] == "http.response.start" and message["status"] == 304:
+            headers = MutableHeaders(raw=message["headers"])
+            etag = headers.get("etag")
+            variant = revalidated_variant(if_none_match, etag) if etag else None
+            if variant:
+                headers["ETag"] = variant
+                headers.add_vary_header("Accept-Encoding")
+        await send(message)
+    return tagging_send
+
+
+class _CompressingResponder:
+    def __init__(self, middleware: CompressionMiddleware, encoding: str, send):
+        self.middleware = middleware
+        self.encoding = encoding
+        self._send = send
+        self.start = None
+        self.buffer = []
+        self.buffered = 0
+        self.passthrough = False
+        self.compressor = None
+
+    async def send(self, message):
+        if message["type"] == "http.response.start":
+            self.start = message
+            headers = Headers(raw=message["headers"])
+            content_type = headers.get("content-type", "")
+            if (
+                "content-encoding" in headers
+                or message["status"] < 200
+                or message["status"] in (204, 304)
+                or not content_type.startswith(COMPRESSIBLE_TYPES)
+            ):
+                self.passthrough = True
+                await self._send(message)
+            return
+
+        if message["type"] != "http.response.body" or self.passthrough:
+            await self._send(message)
+            return
+
+        body, more_body = message.get("body", b""), message.get("more_body", False)
+        if self.compressor is None:
+            self.buffer.append(body)
+            self.buffered += len(body)
+            if self.buffered < self.middleware.min_size:
+                if not more_body:
+                    await self._flush_uncompressed()
+                return
+            self.compressor = self.middleware.compressor(self.encoding)
+            body = b"".join(self.buffer)
+            self.buffer = []
+            if not more_body:
+                # the usual case: the whole response arrived in one piece
+                compressed = self.compressor.process(body) + self.compressor.finish()
+                await self._send(self._start_message(len(compressed)))
+                await self._send({"type": "http.response.body", "body": compressed, "more_body": False})
+                return
+            await self._send(self._start_message(None))
+
+        chunk = self.compressor.process(body)
+        if not more_body:
+            chunk += self.compressor.finish()
+        if chunk or not more_body:
+            await self._send({"type": "http.response.body", "body": chunk, "more_body": more_body})
+
+    async def _flush_uncompressed(self):
+        headers = MutableHeaders(raw=self.start["headers"])
+        headers.add_vary_header("Accept-Encoding")
+        await self._send(self.start)
+        await self._send({"type": "http.response.body", "body": b"".join(self.buffer), "more_body": False})
+
+    def _start_message(self, length: Optional[int]) -> dict:
+        headers = MutableHeaders(raw=self.start["headers"])
+        headers["Content-Encoding"] = self.encoding
+        headers.add_vary_header("Accept-Encoding")
+        if length is None:
+            # streamed: the length is unknown until the compressor finishes
+            del headers["Content-Length"]
+        else:
+            headers["Content-Length"] = str(length)
+        etag = headers.get("etag")
+        if etag and etag.endswith('"'):
+            headers["ETag"] = f'{etag[:-1]}-{self.encoding}"'
+        return self.start
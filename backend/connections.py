@@ -0,0 +1,158 @@
+"""Websocket connections held by this worker, each with its own send queue.
+
+Delivering an event only puts it on the bounded queue of each of the user's
+connections; a per-connection task drains the queue onto the socket.  A slow
+or dead client therefore never holds up the HTTP handler that produced the
+event, or the user's other connections.  When a queue is full the
+slow-consumer policy applies: ``drop_oldest`` discards the oldest queued
+event, ``disconnect`` closes the socket so the client reconnects and resyncs.
+
+On shutdown ``drain`` refuses new sockets and sends every open one a
+``reconnect`` event carrying a jittered ``retry_after_ms``, so clients move
+to another worker spread over the grace period instead of all at once;
+whatever is still open when the grace period ends is closed with 1012.
+"""
+import asyncio
+import logging
+import random
+from typing import Dict, List, Optional
+
+from fastapi import WebSocket
+
+logger = logging.getLogger(__name__)
+
+POLICIES = ("drop_oldest", "disconnect")
+
+# 1013 "Try Again Later": the client should reconnect and refetch
+SLOW_CONSUMER_CLOSE_CODE = 1013
+# 1012 "Service Restart": this worker is going away, reconnect elsewhere
+SERVICE_RESTART_CLOSE_CODE = 1012
+
+
+class ClientConnection:
+    def __init__(self, manager: "ConnectionManager", user_id: str, websocket: WebSocket):
+        self.manager = manager
+        self.user_id = user_id
+        self.websocket = websocket
+        self.queue: asyncio.Queue = asyncio.Queue(maxsize=manager.max_queue)
+        self.closed = False
+        self.closer: Optional[asyncio.Task] = None
+        self.sender = asyncio.create_task(self._drain())
+
+    def enqueue(self, event: dict):
+        if self.closed:
+            return
+        try:
+            self.queue.put_nowait(event)
+            return
+        except asyncio.QueueFull:
+            pass
+
+        self.manager.dropped += 1
+        if self.manager.policy == "disconnect":
+            self.manager.slow_disconnects += 1
+            logger.warning(f"Disconnecting slow websocket consumer: user={self.user_id}")
+            # closed right away, so later events are ignored rather than closing again
+            self.closed = True
+            self.manager.unregister(self)
+            self.closer = asyncio.create_task(self._close_socket(SLOW_CONSUMER_CLOSE_CODE))
+        else:
+            self.queue.get_nowait()
+            self.queue.put_nowait(event)
+
+    async def _drain(self):
+        while True:
+            event = await self.queue.get()
+            try:
+                await asyncio.wait_for(self.websocket.send_json(event), timeout=self.manager.send_timeout)
+            except asyncio.CancelledError:
+                raise
+            except Exception:
+                # dead or stuck socket: stop sending and forget it right away
+                self.manager.send_failures += 1
+                await self.close()
+                return
+
+    async def close(self, code: int = 1000):
+        if self.closed:
+            return
+        self.closed = True
+        self.manager.unregister(self)
+        await self._close_socket(code)
+
+    async def _close_socket(self, code: int):
+        try:
+            await self.websocket.close(code=code)
+        except Exception:
+            pass
+
+
+class ConnectionManager:
+    def __init__(self, max_queue: int = 100, policy: str = "drop_oldest", send_timeout: float = 5.0):
+        if policy not in POLICIES:
+            raise ValueError(f"Unknown slow consumer policy: {policy}")
+        self.max_queue = max_queue
+        self.policy = policy
+        self.send_timeout = send_timeout
+        self.connections: Dict[str, List[ClientConnection]] = {}
+        self.dropped = 0
+        self.slow_disconnects = 0
+        self.send_failures = 0
+        self.draining = False
+
+    def register(self, user_id: str, websocket: WebSocket) -> ClientConnection:
+        conn = ClientConnection(self, user_id, websocket)
+        self.connections.setdefault(user_id, []).append(conn)
+        return conn
+
+    def unregister(self, conn: ClientConnection):
+        conns = self.connections.get(conn.user_id, [])
+        if conn in conns:
+            conns.remove(conn)
+        if not conns:
+            self.connections.pop(conn.user_id, None)
+        if conn.sender is not asyncio.current_task():
+            conn.sender.cancel()
+
+    def deliver(self, user_id: str, event: dict):
+        """Queue ``event`` on every connection of ``user_id``; never blocks."""
+        for conn in list(self.connections.get(user_id, [])):
+            conn.enqueue(event)
+
+    async def drain(self, grace: float, spread: float = 5.0) -> int:
+        """Ask every client to reconnect and wait up to ``grace`` seconds for them to go.
+
+        Returns how many connections had to be closed when time ran out.
+        """
+        self.draining = True
+        open_conns = [conn for conns in self.connections.values() for conn in conns]
+        spread = max(0.0, min(spread, grace))
+        for conn in open_conns:
+            conn.enqueue({"event": "reconnect", "payload": {"retry_after_ms": int(random.uniform(0, spread) * 1000)}})
+        if open_conns:
+            logger.info(f"Draining {len(open_conns)} websocket connections for up to {grace}s")
+
+        loop = asyncio.get_running_loop()
+        deadline = loop.time() + grace
+        while self.connections and loop.time() < deadline:
+            await asyncio.sleep(0.05)
+
+        remaining = [conn for conns in self.connections.values() for conn in conns]
+        for conn in remaining:
+            await conn.close(SERVICE_RESTART_CLOSE_CODE)
+        return len(remaining)
+
+    def stats(self) -> dict:
+        depths = [conn.queue.qsize() for conns in self.connections.values() for conn in conns]
+        return {
+            "users": len(self.connections),
+            "connections": len(depths),
+            "queue_depth_total": sum(depths),
+            "queue_depth_max": max(depths, default=0),
+            "queue_capacity": self.max_queue,
+            "policy": self.policy,
+            "dropped_events": self.dropped,
+            "slow_disconnects": self.slow_disconnects,
+            "send_failures": self.send_failures,
+            "draining": self.draining,
+        }
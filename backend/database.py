@@ -0,0 +1,148 @@
+"""Motor client construction, pool limits and pool health.
+
+Pool size and timeouts come from the environment so a deployment can size
+them against its Mongo tier:
+
+``MONGO_MAX_POOL_SIZE``                 connections per server (default 100)
+``MONGO_MIN_POOL_SIZE``                 kept open while idle (default 5)
+``MONGO_WAIT_QUEUE_TIMEOUT_MS``         how long a request waits for a free
+                                        connection before failing (default 2000)
+``MONGO_SERVER_SELECTION_TIMEOUT_MS``   how long to wait for a usable server
+                                        when Mongo is down (default 5000)
+``MONGO_CONNECT_TIMEOUT_MS``            TCP connect timeout (default 5000)
+
+``PoolMonitor`` is a pymongo connection-pool listener that keeps live counts
+of open, checked-out and waiting connections; the health endpoints report
+them so saturation is visible before requests start timing out.
+"""
+import asyncio
+import logging
+import os
+import threading
+from typing import Dict, List
+
+from motor.motor_asyncio import AsyncIOMotorClient
+from pymongo import monitoring
+
+logger = logging.getLogger(__name__)
+
+
+def client_options() -> dict:
+    return {
+        "maxPoolSize": int(os.environ.get("MONGO_MAX_POOL_SIZE", "100")),
+        "minPoolSize": int(os.environ.get("MONGO_MIN_POOL_SIZE", "5")),
+        "waitQueueTimeoutMS": int(os.environ.get("MONGO_WAIT_QUEUE_TIMEOUT_MS", "2000")),
+        "serverSelectionTimeoutMS": int(os.environ.get("MONGO_SERVER_SELECTION_TIMEOUT_MS", "5000")),
+        "connectTimeoutMS": int(os.environ.get("MONGO_CONNECT_TIMEOUT_MS", "5000")),
+    }
+
+
+def create_client(url: str, event_listeners: List = ()) -> AsyncIOMotorClient:
+    # tz_aware: BSON dates come back as aware UTC datetimes
+    return AsyncIOMotorClient(url, tz_aware=True, event_listeners=list(event_listeners), **client_options())
+
+
+async def ping(client: AsyncIOMotorClient, timeout: float) -> bool:
+    try:
+        await asyncio.wait_for(client.admin.command("ping"), timeout=timeout)
+        return True
+    except Exception as exc:
+        logger.warning(f"Mongo ping failed: {exc!r}")
+        return False
+
+
+class _PoolCounts:
+    __slots__ = ("open", "checked_out", "waiting", "checkout_timeouts", "checkout_failures")
+
+    def __init__(self):
+        self.open = 0
+        self.checked_out = 0
+        self.waiting = 0
+        self.checkout_timeouts = 0
+        self.checkout_failures = 0
+
+
+class PoolMonitor(monitoring.ConnectionPoolListener):
+    """Live connection counts per server.  Callbacks arrive on driver threads."""
+
+    def __init__(self, max_pool_size: int):
+        self.max_pool_size = max_pool_size
+        self._lock = threading.Lock()
+        self._pools: Dict[str, _PoolCounts] = {}
+
+    def _pool(self, event) -> _PoolCounts:
+        key = "%s:%s" % event.address
+        pool = self._pools.get(key)
+        if pool is None:
+            pool = self._pools[key] = _PoolCounts()
+        return pool
+
+    def pool_created(self, event):
+        with self._lock:
+            self._pool(event)
+
+    def pool_ready(self, event):
+        pass
+
+    def pool_cleared(self, event):
+        pass
+
+    def pool_closed(self, event):
+        with self._lock:
+            self._pools.pop("%s:%s" % event.address, None)
+
+    def connection_created(self, event):
+        with self._lock:
+            self._pool(event).open += 1
+
+    def connection_ready(self, event):
+        pass
+
+    def connection_closed(self, event):
+        with self._lock:
+            pool = self._pool(event)
+            pool.open = max(0, pool.open - 1)
+
+    def connection_check_out_started(self, event):
+        with self._lock:
+            self._pool(event).waiting += 1
+
+    def connection_check_out_failed(self, event):
+        with self._lock:
+            pool = self._pool(event)
+            pool.waiting = max(0, pool.waiting - 1)
+            pool.checkout_failures += 1
+            if event.reason == monitoring.ConnectionCheckOutFailedReason.TIMEOUT:
+                pool.checkout_timeouts += 1
+
+    def connection_checked_out(self, event):
+        with self._lock:
+            pool = self._pool(event)
+            pool.waiting = max(0, pool.waiting - 1)
+            pool.checked_out += 1
+
+    def connection_checked_in(self, event):
+        with self._lock:
+            pool = self._pool(event)
+            pool.checked_out = max(0, pool.checked_out - 1)
+
+    def stats(self) -> dict:
+        with self._lock:
+            servers = {
+                address: {
+                    "open": pool.open,
+                    "checked_out": pool.checked_out,
+                    "waiting": pool.waiting,
+                    "checkout_timeouts": pool.checkout_timeouts,
+                    "checkout_failures": pool.checkout_failures,
+                    "saturation": round(pool.checked_out / self.max_pool_size, 3) if self.max_pool_size else 0.0,
+                }
+                for address, pool in self._pools.items()
+            }
+        return {
+            "max_pool_size": self.max_pool_size,
+            # the busiest server decides whether requests are about to queue
+            "saturation": max((server["saturation"] for server in servers.values()), default=0.0),
+            "waiting": sum(server["waiting"] for server in servers.values()),
+            "servers": servers,
+        }
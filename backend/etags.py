@@ -0,0 +1,61 @@
+"""Strong ETags and ``If-None-Match`` handling for note and list reads.
+
+Tags are derived from data the server already keeps, so a match can be
+answered with a 304 before the body is read or serialized:
+
+* a single document is tagged with its own ``seq`` (``updated_at`` for
+  documents written before sync existed), which every write bumps;
+* a list page is tagged with the user's latest change ``seq``, which any
+  write to any of their synced collections bumps.  That is coarser than the
+  page, but it costs one point read on the counter instead of the page query.
+  While a write may still be in flight (see ``sync.settled_seq``) lists get
+  no tag at all.
+
+``ETAG_VERSION`` is part of every tag; bump it when the JSON shape of these
+responses changes without a write to each document (a migration, a new
+projected field), so clients don't revalidate into stale bodies.
+"""
+import hashlib
+from typing import Optional
+
+from fastapi import Response
+
+from backend.compression import strip_encoding_suffix
+
+ETAG_VERSION = "1"
+
+CACHE_CONTROL = "private, no-cache"
+
+
+def make_etag(*parts) -> str:
+    digest = hashlib.blake2b(":".join(str(part) for part in (ETAG_VERSION, *parts)).encode(), digest_size=12)
+    return f'"{digest.hexdigest()}"'
+
+
+def document_etag(doc: dict) -> str:
+    return make_etag(doc["id"], doc.get("seq"), doc.get("updated_at") or doc.get("created_at"))
+
+
+def _opaque(tag: str) -> str:
+    tag = tag.strip()
+    if tag.startswith("W/"):
+        tag = tag[2:]
+    # the compression middleware marks encoded variants; they share the tag
+    return strip_encoding_suffix(tag)
+
+
+def etag_matches(if_none_match: Optional[str], etag: str) -> bool:
+    """Weak comparison, as RFC 9110 prescribes for If-None-Match."""
+    if not if_none_match:
+        return False
+    if if_none_match.strip() == "*":
+        return True
+    return any(_opaque(tag) == etag for tag in if_none_match.split(","))
+
+
+def not_modified(etag: str) -> Response:
+    return Response(status_code=304, headers={"ETag": etag, "Cache-Control": CACHE_CONTROL})
+
+
+def etag_headers(etag: Optional[str]) -> dict:
+    return {"ETag": etag, "Cache-Control": CACHE_CONTROL} if etag else {}
@@ -0,0 +1,61 @@
+"""In-memory friend sets for O(1) friendship checks.
+
+``FriendGraph`` caches, per user id, the set of friend usernames (the
+``friends`` collection is keyed by ``friend_username``, so a check needs no
+user lookup).  All writes go through ``add``/``remove``, which write to Mongo
+and then invalidate the affected entries.
+
+A per-user generation counter keeps a load that raced with a write from
+caching stale data: a load only stores its result if no write for that user
+completed while it was reading.  Other workers are told through
+``invalidate``, which the server triggers from the pub/sub bus.
+"""
+from typing import Dict, FrozenSet, Optional
+
+from backend.cache import TTLCache
+
+
+class FriendGraph:
+    def __init__(self, db, maxsize: int = 10000, ttl: float = 60.0):
+        self.db = db
+        self.cache = TTLCache(maxsize=maxsize, ttl=ttl)
+        self._generation: Dict[str, int] = {}
+
+    async def friends_of(self, user_id: str) -> FrozenSet[str]:
+        friends = self.cache.get(user_id)
+        if friends is not None:
+            return friends
+        generation = self._generation.get(user_id, 0)
+        docs = await self.db.friends.find(
+            {'user_id': user_id}, {'_id': 0, 'friend_username': 1}
+        ).to_list(None)
+        friends = frozenset(doc['friend_username'] for doc in docs)
+        if self._generation.get(user_id, 0) == generation:
+            self.cache.set(user_id, friends)
+        return friends
+
+    async def is_friend(self, user_id: str, friend_username: str) -> bool:
+        return friend_username in await self.friends_of(user_id)
+
+    def invalidate(self, user_id: str):
+        self._generation[user_id] = self._generation.get(user_id, 0) + 1
+        self.cache.pop(user_id)
+
+    async def add(self, link: dict):
+        """Insert a ``friends`` document (one direction) and invalidate its owner."""
+        try:
+            await self.db.friends.insert_one(link)
+        finally:
+            self.invalidate(link['user_id'])
+
+    async def remove(self, user_id: str, friend_username: str) -> Optional[dict]:
+        """Delete the link and return it (``None`` if there was none)."""
+        try:
+            return await self.db.friends.find_one_and_delete(
+                {'user_id': user_id, 'friend_username': friend_username}, {'id': 1}
+            )
+        finally:
+            self.invalidate(user_id)
+
+    def stats(self) -> dict:
+        return self.cache.stats()
@@ -0,0 +1,107 @@
+"""Declared Mongo index set and an idempotent bootstrap for it.
+
+Every query ``server.py`` issues should be served by one of the indexes below.
+``ensure_indexes`` is run at startup: it creates anything missing (creating an
+index that already exists with the same spec is a no-op) and reports drift,
+i.e. declared indexes that could not be built or whose spec differs from the
+live one, and live indexes nobody declared.
+"""
+import logging
+from typing import Dict, List, NamedTuple, Tuple
+
+from pymongo import ASCENDING, DESCENDING
+from pymongo.errors import OperationFailure
+
+logger = logging.getLogger(__name__)
+
+
+class IndexSpec(NamedTuple):
+    collection: str
+    name: str
+    keys: List[Tuple[str, int]]
+    unique: bool = False
+
+
+INDEXES: List[IndexSpec] = [
+    IndexSpec("users", "users_username_unique", [("username", ASCENDING)], unique=True),
+    IndexSpec("users", "users_id_unique", [("id", ASCENDING)], unique=True),
+    IndexSpec("blobs", "blobs_id_unique", [("id", ASCENDING)], unique=True),
+    # multikey: is a chunk still referenced? (orphan chunk collection)
+    IndexSpec("blobs", "blobs_chunks", [("chunks", ASCENDING)]),
+    IndexSpec("blob_orphans", "blob_orphans_created", [("created_at", ASCENDING)]),
+    IndexSpec("notes", "notes_id", [("id", ASCENDING)]),
+    IndexSpec("notes", "notes_user_created_id",
+              [("user_id", ASCENDING), ("created_at", DESCENDING), ("id", DESCENDING)]),
+    IndexSpec("notes", "notes_user_month_day_created",
+              [("user_id", ASCENDING), ("month_day", ASCENDING), ("created_at", DESCENDING)]),
+    # multikey: the inverted index behind /api/notes/search (see backend.search)
+    IndexSpec("notes", "notes_user_search_terms", [("user_id", ASCENDING), ("search.terms", ASCENDING)]),
+    IndexSpec("reminders", "reminders_id", [("id", ASCENDING)]),
+    IndexSpec("reminders", "reminders_user_date_id", [("user_id", ASCENDING), ("date", ASCENDING), ("id", ASCENDING)]),
+    # the reminder scheduler's "due now" range read and "next due" lookup
+    IndexSpec("reminders", "reminders_notified_due", [("notified_at", ASCENDING), ("due_at", ASCENDING)]),
+    IndexSpec("friends", "friends_user_friend", [("user_id", ASCENDING), ("friend_username", ASCENDING)]),
+    IndexSpec("friend_requests", "friend_requests_id", [("id", ASCENDING)]),
+    IndexSpec("friend_requests", "friend_requests_to_status", [("to_user_id", ASCENDING), ("status", ASCENDING)]),
+    IndexSpec("friend_requests", "friend_requests_from_to_status",
+              [("from_user_id", ASCENDING), ("to_username", ASCENDING), ("status", ASCENDING)]),
+    IndexSpec("messages", "messages_from_to_created",
+              [("from_user_id", ASCENDING), ("to_user_id", ASCENDING), ("created_at", ASCENDING)]),
+    IndexSpec("messages", "messages_conversation_created_id",
+              [("conversation_id", ASCENDING), ("created_at", ASCENDING), ("id", ASCENDING)]),
+    IndexSpec("messages", "messages_to_read_by", [("to_user_id", ASCENDING), ("read_by", ASCENDING)]),
+    IndexSpec("checkbox_notes", "checkbox_notes_id", [("id", ASCENDING)]),
+    IndexSpec("checkbox_notes", "checkbox_notes_user_created_id",
+              [("user_id", ASCENDING), ("created_at", DESCENDING), ("id", DESCENDING)]),
+    # /api/sync reads each user-owned collection and the tombstones in seq order
+    IndexSpec("notes", "notes_user_seq", [("user_id", ASCENDING), ("seq", ASCENDING)]),
+    IndexSpec("reminders", "reminders_user_seq", [("user_id", ASCENDING), ("seq", ASCENDING)]),
+    IndexSpec("checkbox_notes", "checkbox_notes_user_seq", [("user_id", ASCENDING), ("seq", ASCENDING)]),
+    IndexSpec("friends", "friends_user_seq", [("user_id", ASCENDING), ("seq", ASCENDING)]),
+    IndexSpec("sync_tombstones", "sync_tombstones_user_seq", [("user_id", ASCENDING), ("seq", ASCENDING)]),
+]
+
+
+def _live_matches(spec: IndexSpec, live: dict) -> bool:
+    return [tuple(k) for k in live.get("key", [])] == [tuple(k) for k in spec.keys] and \
+        bool(live.get("unique", False)) == spec.unique
+
+
+async def ensure_indexes(db, specs: List[IndexSpec] = INDEXES) -> Dict[str, list]:
+    """Create the declared indexes and return a drift report.
+
+    The report has ``failed`` (declared but could not be created, e.g. a unique
+    index over existing duplicates), ``mismatched`` (an index with the declared
+    name exists with different keys/options) and ``undeclared`` (live indexes
+    not in ``specs``).  Problems are logged but never raised, so a bad index
+    cannot keep the API from starting.
+    """
+    report: Dict[str, list] = {"created": [], "failed": [], "mismatched": [], "undeclared": []}
+    by_collection: Dict[str, List[IndexSpec]] = {}
+    for spec in specs:
+        by_collection.setdefault(spec.collection, []).append(spec)
+
+    for collection, col_specs in by_collection.items():
+        live = await db[collection].index_information()
+        for spec in col_specs:
+            if spec.name in live:
+                if not _live_matches(spec, live[spec.name]):
+                    report["mismatched"].append(f"{collection}.{spec.name}")
+                continue
+            try:
+                await db[collection].create_index(spec.keys, name=spec.name, unique=spec.unique)
+                report["created"].append(f"{collection}.{spec.name}")
+            except OperationFailure as exc:
+                report["failed"].append(f"{collection}.{spec.name}: {exc}")
+
+        declared = {spec.name for spec in col_specs} | {"_id_"}
+        for name in live:
+            if name not in declared:
+                report["undeclared"].append(f"{collection}.{name}")
+
+    if report["created"]:
+        logger.info(f"Created indexes: {report['created']}")
+    for kind in ("failed", "mismatched", "undeclared"):
+        if report[kind]:
+            logger.warning(f"Index drift ({kind}): {report[kind]}")
+    return report
@@ -0,0 +1,199 @@
+"""Request latency and Mongo round-trip metrics in Prometheus text format.
+
+``MetricsMiddleware`` times every HTTP request and labels it with the route
+template (``/api/notes/{note_id}``, never the raw path) once routing has run.
+``MongoCommandListener`` is a pymongo command listener; Motor runs commands
+on its executor with the caller's context copied over, so the request's
+``RequestStats`` is reachable from the listener through a context variable
+and every command is attributed to the route that issued it.  Commands
+issued outside a request (scheduler, migrations) count as ``background``.
+
+No client library is needed: the few metric types used here are rendered by
+hand by ``Metrics.render``.
+"""
+import bisect
+import threading
+import time
+from contextvars import ContextVar
+from typing import Dict, Optional, Sequence, Tuple
+
+from pymongo import monitoring
+
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+COMMAND_COUNT_BUCKETS = (0, 1, 2, 3, 5, 8, 13, 21, 34, 55, 89)
+
+BACKGROUND = "background"
+UNMATCHED = "unmatched"
+
+
+class RequestStats:
+    __slots__ = ("scope", "commands", "seconds")
+
+    def __init__(self, scope: dict):
+        self.scope = scope
+        self.commands = 0
+        self.seconds = 0.0
+
+    @property
+    def route(self) -> str:
+        # the router writes the matched route into the shared scope
+        route = self.scope.get("route")
+        return getattr(route, "path", UNMATCHED)
+
+
+_current_request: ContextVar[Optional[RequestStats]] = ContextVar("metrics_request", default=None)
+
+
+class Histogram:
+    def __init__(self, buckets: Sequence[float]):
+        self.buckets = tuple(buckets)
+        self.counts = [0] * (len(self.buckets) + 1)
+        self.sum = 0.0
+        self.count = 0
+
+    def observe(self, value: float):
+        self.counts[bisect.bisect_left(self.buckets, value)] += 1
+        self.sum += value
+        self.count += 1
+
+
+def _labels(names: Sequence[str], values: Sequence[str], extra: str = "") -> str:
+    pairs = [f'{name}="{_escape(value)}"' for name, value in zip(names, values)]
+    if extra:
+        pairs.append(extra)
+    return "{" + ",".join(pairs) + "}" if pairs else ""
+
+
+def _escape(value) -> str:
+    return str(value).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def _number(value: float) -> str:
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+
+class Metrics:
+    def __init__(self, prefix: str = "memora"):
+        self.prefix = prefix
+        # updated from the event loop and from Motor's executor threads
+        self._lock = threading.Lock()
+        self.in_flight = 0
+        self.requests: Dict[Tuple[str, str, str], int] = {}
+        self.latency: Dict[Tuple[str, str], Histogram] = {}
+        self.commands_per_request: Dict[Tuple[str], Histogram] = {}
+        self.mongo_seconds_per_request: Dict[Tuple[str], Histogram] = {}
+        self.mongo_commands: Dict[Tuple[str, str], int] = {}
+        self.mongo_failures: Dict[Tuple[str, str], int] = {}
+        self.mongo_seconds: Dict[Tuple[str, str], float] = {}
+
+    def request_started(self, scope: dict) -> RequestStats:
+        with self._lock:
+            self.in_flight += 1
+        return RequestStats(scope)
+
+    def request_finished(self, stats: RequestStats, method: str, status: int, seconds: float):
+        with self._lock:
+            self.in_flight -= 1
+            key = (method, stats.route, str(status))
+            self.requests[key] = self.requests.get(key, 0) + 1
+            self.latency.setdefault((method, stats.route), Histogram(LATENCY_BUCKETS)).observe(seconds)
+            self.commands_per_request.setdefault((stats.route,), Histogram(COMMAND_COUNT_BUCKETS)).observe(stats.commands)
+            self.mongo_seconds_per_request.setdefault((stats.route,), Histogram(LATENCY_BUCKETS)).observe(stats.seconds)
+
+    def mongo_command(self, command: str, seconds: float, failed: bool = False):
+        stats = _current_request.get()
+        with self._lock:
+            if stats is not None:
+                stats.commands += 1
+                stats.seconds += seconds
+            key = (stats.route if stats is not None else BACKGROUND, command)
+            self.mongo_commands[key] = self.mongo_commands.get(key, 0) + 1
+            self.mongo_seconds[key] = self.mongo_seconds.get(key, 0.0) + seconds
+            if failed:
+                self.mongo_failures[key] = self.mongo_failures.get(key, 0) + 1
+
+    def render(self) -> str:
+        p = self.prefix
+        lines = []
+
+        def family(name, kind, help_text):
+            lines.append(f"# HELP {p}_{name} {help_text}")
+            lines.append(f"# TYPE {p}_{name} {kind}")
+
+        def samples(name, label_names, values):
+            for key, value in sorted(values.items()):
+                lines.append(f"{p}_{name}{_labels(label_names, key)} {_number(value)}")
+
+        def histograms(name, label_names, values):
+            for key, hist in sorted(values.items()):
+                cumulative = 0
+                for bound, count in zip(hist.buckets + (float("inf"),), hist.counts):
+                    cumulative += count
+                    le = "+Inf" if bound == float("inf") else _number(bound)
+                    bucket_labels = _labels(label_names, key, 'le="%s"' % le)
+                    lines.append(f"{p}_{name}_bucket{bucket_labels} {cumulative}")
+                lines.append(f"{p}_{name}_sum{_labels(label_names, key)} {_number(hist.sum)}")
+                lines.append(f"{p}_{name}_count{_labels(label_names, key)} {hist.count}")
+
+        with self._lock:
+            family("http_requests_in_flight", "gauge", "HTTP requests currently being served.")
+            lines.append(f"{p}_http_requests_in_flight {self.in_flight}")
+            family("http_requests_total", "counter", "HTTP requests served, by route template and status.")
+            samples("http_requests_total", ("method", "route", "status"), self.requests)
+            family("http_request_duration_seconds", "histogram", "HTTP request latency by route template.")
+            histograms("http_request_duration_seconds", ("method", "route"), self.latency)
+            family("mongo_commands_per_request", "histogram", "Mongo commands issued while serving one request.")
+            histograms("mongo_commands_per_request", ("route",), self.commands_per_request)
+            family("mongo_seconds_per_request", "histogram", "Time spent in Mongo while serving one request.")
+            histograms("mongo_seconds_per_request", ("route",), self.mongo_seconds_per_request)
+            family("mongo_commands_total", "counter", "Mongo commands, by issuing route and command name.")
+            samples("mongo_commands_total", ("route", "command"), self.mongo_commands)
+            family("mongo_command_failures_total", "counter", "Mongo commands that returned an error.")
+            samples("mongo_command_failures_total", ("route", "command"), self.mongo_failures)
+            family("mongo_command_seconds_total", "counter", "Time spent in Mongo commands, as seen by the driver.")
+            samples("mongo_command_seconds_total", ("route", "command"), self.mongo_seconds)
+        return "\n".join(lines) + "\n"
+
+
+class MongoCommandListener(monitoring.CommandListener):
+    def __init__(self, metrics: Metrics):
+        self.metrics = metrics
+
+    def started(self, event):
+        pass
+
+    def succeeded(self, event):
+        self.metrics.mongo_command(event.command_name, event.duration_micros / 1e6)
+
+    def failed(self, event):
+        self.metrics.mongo_command(event.command_name, event.duration_micros / 1e6, failed=True)
+
+
+class MetricsMiddleware:
+    """Pure ASGI middleware, so it adds no task or body buffering per request."""
+
+    def __init__(self, app, metrics: Metrics):
+        self.app = app
+        self.metrics = metrics
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        stats = self.metrics.request_started(scope)
+        token = _current_request.set(stats)
+        status = 500
+        started = time.perf_counter()
+
+        async def send_wrapper(message):
+            nonlocal status
+            if message["type"] == "http.response.start":
+                status = message["status"]
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_wrapper)
+        finally:
+            _current_request.reset(token)
+            self.metrics.request_finished(stats, scope["method"], status, time.perf_counter() - started)
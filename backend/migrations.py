@@ -0,0 +1,395 @@
+"""Batched, idempotent data migrations.
+
+Each migration only touches documents that still need it, so it can be
+interrupted and re-run safely.  They run in the background at startup and
+can also be run by hand:
+
+    python -m backend.migrations
+"""
+import asyncio
+import logging
+import uuid
+from datetime import datetime, timezone
+
+from pymongo import UpdateOne
+from pymongo.errors import ConnectionFailure
+
+from backend.avatars import store_avatar
+from backend.blobs import BlobTooLarge, blob_url, create_blob_store, decode_data_url, externalize_attachments
+from backend.reminders import due_fields, parse_due_at
+from backend.search import index_fields
+from backend.sync import SYNCED_COLLECTIONS, reserve_seq
+
+logger = logging.getLogger(__name__)
+
+BATCH_SIZE = 500
+
+
+# Timestamps that used to be written as ISO strings and are now BSON dates
+DATE_FIELDS = [
+    ("users", "created_at"),
+    ("notes", "created_at"),
+    ("notes", "updated_at"),
+    ("reminders", "created_at"),
+    ("reminders", "updated_at"),
+    ("checkbox_notes", "created_at"),
+    ("checkbox_notes", "updated_at"),
+    ("friends", "added_at"),
+    ("friends", "updated_at"),
+    ("friend_requests", "created_at"),
+    ("messages", "created_at"),
+    ("blobs", "created_at"),
+    ("sync_tombstones", "updated_at"),
+]
+
+
+def parse_datetime(value) -> datetime:
+    """An aware UTC datetime from a stored ISO string (naive means UTC) or datetime."""
+    if isinstance(value, str):
+        value = datetime.fromisoformat(value.replace("Z", "+00:00"))
+    if value.tzinfo is None:
+        return value.replace(tzinfo=timezone.utc)
+    return value.astimezone(timezone.utc)
+
+
+def month_day_key(created_at) -> str:
+    """``MM-DD`` key used by the On This Day lookup."""
+    created_at = parse_datetime(created_at)
+    return f"{created_at.month:02d}-{created_at.day:02d}"
+
+
+async def convert_iso_dates(db, batch_size: int = BATCH_SIZE) -> int:
+    """Rewrite ISO-string timestamps in ``DATE_FIELDS`` as BSON dates.
+
+    Only string values are selected, and each update re-checks the type, so
+    the migration resumes where it stopped.  Strings that don't parse are
+    logged and left alone rather than retried forever.
+    """
+    converted = 0
+    for collection, field in DATE_FIELDS:
+        skipped = set()
+        while True:
+            query = {field: {"$type": "string"}}
+            if skipped:
+                query["_id"] = {"$nin": list(skipped)}
+            batch = await db[collection].find(query, {"_id": 1, field: 1}).limit(batch_size).to_list(batch_size)
+            if not batch:
+                break
+            ops = []
+            for doc in batch:
+                try:
+                    value = parse_datetime(doc[field])
+                except ValueError:
+                    logger.warning(f"Unparseable {collection}.{field} on {doc['_id']}: {doc[field]!r}")
+                    skipped.add(doc["_id"])
+                    continue
+                ops.append(UpdateOne({"_id": doc["_id"], field: {"$type": "string"}}, {"$set": {field: value}}))
+            if ops:
+                result = await db[collection].bulk_write(ops, ordered=False)
+                converted += result.modified_count
+            if len(batch) < batch_size:
+                break
+    if converted:
+        logger.info(f"Converted {converted} ISO string timestamps to dates")
+    return converted
+
+
+async def backfill_note_month_day(db, batch_size: int = BATCH_SIZE) -> int:
+    """Add ``month_day`` to notes written before it existed.
+
+    Notes whose ``created_at`` is missing or doesn't parse are logged and
+    left alone rather than retried forever.
+    """
+    updated = 0
+    skipped = set()
+    while True:
+        query = {"month_day": {"$exists": False}}
+        if skipped:
+            query["_id"] = {"$nin": list(skipped)}
+        batch = await db.notes.find(query, {"_id": 1, "created_at": 1}).limit(batch_size).to_list(batch_size)
+        if not batch:
+            break
+        ops = []
+        for doc in batch:
+            try:
+                key = month_day_key(doc["created_at"])
+            except (KeyError, AttributeError, TypeError, ValueError):
+                logger.warning(f"Unusable notes.created_at on {doc['_id']}: {doc.get('created_at')!r}")
+                skipped.add(doc["_id"])
+                continue
+            ops.append(UpdateOne({"_id": doc["_id"], "month_day": {"$exists": False}}, {"$set": {"month_day": key}}))
+        if ops:
+            result = await db.notes.bulk_write(ops, ordered=False)
+            updated += result.modified_count
+        if len(batch) < batch_size:
+            break
+    if updated:
+        logger.info(f"Backfilled month_day on {updated} notes")
+    return updated
+
+
+async def move_inline_blobs(db, batch_size: int = BATCH_SIZE) -> int:
+    """Move base64 data-URL attachments and avatars into the blob store."""
+    store = create_blob_store(db)
+    moved = 0
+    inline = {"$regex": "^data:"}
+
+    while True:
+        batch = await db.notes.find(
+            {"attachments.url": inline}, {"_id": 1, "attachments": 1}
+        ).limit(batch_size).to_list(batch_size)
+        for doc in batch:
+            attachments = []
+            for attachment in doc["attachments"]:
+                try:
+                    attachments += await externalize_attachments(store, [attachment])
+                except (ValueError, BlobTooLarge) as exc:
+                    # undecodable or oversized; drop it rather than retry on every start
+                    logger.warning(f"Dropping inline attachment of note {doc['_id']}: {exc!r}")
+            await db.notes.update_one({"_id": doc["_id"]}, {"$set": {"attachments": attachments}})
+            moved += 1
+        if len(batch) < batch_size:
+            break
+
+    while True:
+        batch = await db.users.find({"avatar": inline}, {"_id": 1, "avatar": 1}).limit(batch_size).to_list(batch_size)
+        for doc in batch:
+            try:
+                content_type, data = decode_data_url(doc["avatar"])
+                manifest = await store.put_bytes(data, content_type)
+                update = {"$set": {"avatar": blob_url(manifest["id"]), "avatar_blob_id": manifest["id"]}}
+            except (ValueError, BlobTooLarge) as exc:
+                logger.warning(f"Dropping inline avatar of user {doc['_id']}: {exc!r}")
+                update = {"$unset": {"avatar": ""}}
+            await db.users.update_one({"_id": doc["_id"]}, update)
+            moved += 1
+        if len(batch) < batch_size:
+            break
+
+    if moved:
+        logger.info(f"Moved inline blobs out of {moved} documents")
+    return moved
+
+
+async def backfill_message_conversation_id(db, batch_size: int = BATCH_SIZE) -> int:
+    """Add the canonical ``conversation_id`` to messages written before it existed."""
+    updated = 0
+    while True:
+        batch = await db.messages.find(
+            {"conversation_id": {"$exists": False}},
+            {"_id": 1, "from_user_id": 1, "to_user_id": 1},
+        ).limit(batch_size).to_list(batch_size)
+        if not batch:
+            break
+        ops = [
+            UpdateOne({"_id": doc["_id"]}, {"$set": {
+                "conversation_id": ":".join(sorted((doc["from_user_id"], doc["to_user_id"]))),
+            }})
+            for doc in batch
+        ]
+        result = await db.messages.bulk_write(ops, ordered=False)
+        updated += result.modified_count
+        if len(batch) < batch_size:
+            break
+    if updated:
+        logger.info(f"Backfilled conversation_id on {updated} messages")
+    return updated
+
+
+def _unchanged(doc: dict, *fields) -> dict:
+    """Filter matching ``doc`` only while ``fields`` still hold what was read."""
+    query = {"_id": doc["_id"]}
+    for field in fields:
+        query[field] = doc[field] if field in doc else {"$exists": False}
+    return query
+
+
+async def backfill_checklist_item_ids(db, batch_size: int = BATCH_SIZE) -> int:
+    """Give checklist items a stable ``id`` and notes a ``version`` for item-level updates.
+
+    The whole ``items`` array is rewritten, so each update only applies if the
+    note still has the items and version that were read; a note edited in
+    between is read again on the next pass.
+    """
+    updated = 0
+    while True:
+        batch = await db.checkbox_notes.find(
+            {"$or": [{"version": {"$exists": False}}, {"items": {"$elemMatch": {"id": {"$exists": False}}}}]},
+            {"_id": 1, "items": 1, "version": 1},
+        ).limit(batch_size).to_list(batch_size)
+        if not batch:
+            break
+        ops = [
+            UpdateOne(_unchanged(doc, "items", "version"), {
+                "$set": {"items": [{"id": str(uuid.uuid4()), **item} for item in doc.get("items", [])]},
+                "$inc": {"version": 1},
+            })
+            for doc in batch
+        ]
+        result = await db.checkbox_notes.bulk_write(ops, ordered=False)
+        updated += result.modified_count
+        if len(batch) < batch_size and result.matched_count == len(ops):
+            break
+    if updated:
+        logger.info(f"Backfilled item ids on {updated} checkbox notes")
+    return updated
+
+
+async def backfill_sync_seq(db, batch_size: int = BATCH_SIZE) -> int:
+    """Give user-owned documents written before sync existed a ``seq`` and ``updated_at``."""
+    updated = 0
+    for collection in SYNCED_COLLECTIONS:
+        while True:
+            batch = await db[collection].find(
+                {"seq": {"$exists": False}},
+                {"_id": 1, "user_id": 1, "created_at": 1, "added_at": 1},
+            ).limit(batch_size).to_list(batch_size)
+            if not batch:
+                break
+            by_user = {}
+            for doc in batch:
+                by_user.setdefault(doc["user_id"], []).append(doc)
+            ops = []
+            for user_id, docs in by_user.items():
+                first_seq = await reserve_seq(db, user_id, len(docs))
+                for offset, doc in enumerate(docs):
+                    written = doc.get("created_at") or doc.get("added_at")
+                    ops.append(UpdateOne({"_id": doc["_id"], "seq": {"$exists": False}}, {"$set": {
+                        "seq": first_seq + offset,
+                        "updated_at": parse_datetime(written) if written else datetime.now(timezone.utc),
+                    }}))
+            result = await db[collection].bulk_write(ops, ordered=False)
+            updated += result.modified_count
+            if len(batch) < batch_size:
+                break
+    if updated:
+        logger.info(f"Backfilled sync seq on {updated} documents")
+    return updated
+
+
+async def backfill_note_search(db, batch_size: int = BATCH_SIZE) -> int:
+    """Build the ``search`` term index on notes written before search existed."""
+    updated = 0
+    while True:
+        batch = await db.notes.find(
+            {"search": {"$exists": False}},
+            {"_id": 1, "title": 1, "content": 1},
+        ).limit(batch_size).to_list(batch_size)
+        if not batch:
+            break
+        ops = [
+            UpdateOne({"_id": doc["_id"]}, {"$set": {"search": index_fields(doc.get("title"), doc.get("content"))}})
+            for doc in batch
+        ]
+        result = await db.notes.bulk_write(ops, ordered=False)
+        updated += result.modified_count
+        if len(batch) < batch_size:
+            break
+    if updated:
+        logger.info(f"Built search index on {updated} notes")
+    return updated
+
+
+async def backfill_reminder_due_at(db, batch_size: int = BATCH_SIZE) -> int:
+    """Parse ``due_at`` out of ``date`` for reminders written before the scheduler.
+
+    Reminders already in the past come out marked as notified, so deploying
+    the scheduler doesn't fire the whole backlog.
+    """
+    updated = 0
+    while True:
+        batch = await db.reminders.find(
+            {"due_at": {"$exists": False}}, {"_id": 1, "date": 1}
+        ).limit(batch_size).to_list(batch_size)
+        if not batch:
+            break
+        ops = [
+            UpdateOne({"_id": doc["_id"]}, {"$set": due_fields(parse_due_at(doc.get("date")))})
+            for doc in batch
+        ]
+        result = await db.reminders.bulk_write(ops, ordered=False)
+        updated += result.modified_count
+        if len(batch) < batch_size:
+            break
+    if updated:
+        logger.info(f"Backfilled due_at on {updated} reminders")
+    return updated
+
+
+async def build_avatar_thumbnails(db, batch_size: int = BATCH_SIZE) -> int:
+    """Replace full-size avatar blobs with thumbnails and a hashed avatar URL."""
+    store = create_blob_store(db)
+    built = 0
+    while True:
+        batch = await db.users.find(
+            {"avatar_blob_id": {"$exists": True}}, {"_id": 1, "username": 1, "avatar_blob_id": 1}
+        ).limit(batch_size).to_list(batch_size)
+        for doc in batch:
+            manifest = await store.get_manifest(doc["avatar_blob_id"])
+            data = await store.read(doc["avatar_blob_id"]) if manifest else None
+            try:
+                if data is None:
+                    raise ValueError("Avatar blob missing")
+                fields = await store_avatar(store, doc["username"], data)
+                update = {"$set": fields, "$unset": {"avatar_blob_id": ""}}
+            except ValueError as exc:
+                # nothing displayable; drop it rather than retry on every start
+                logger.warning(f"Dropping avatar of user {doc['username']}: {exc}")
+                update = {"$unset": {"avatar": "", "avatar_blob_id": ""}}
+            await db.users.update_one({"_id": doc["_id"]}, update)
+            built += 1
+        if len(batch) < batch_size:
+            break
+    if built:
+        logger.info(f"Built avatar thumbnails for {built} users")
+    return built
+
+
+async def collect_orphan_chunks(db, batch_size: int = BATCH_SIZE) -> int:
+    """Drop chunks stored by uploads that failed (see ``BlobStore.put_stream``)."""
+    deleted = await create_blob_store(db).collect_orphan_chunks(batch_size=batch_size)
+    if deleted:
+        logger.info(f"Deleted {deleted} orphaned blob chunks")
+    return deleted
+
+
+MIGRATIONS = [
+    convert_iso_dates,
+    backfill_note_month_day,
+    move_inline_blobs,
+    backfill_message_conversation_id,
+    backfill_checklist_item_ids,
+    backfill_sync_seq,
+    backfill_note_search,
+    backfill_reminder_due_at,
+    build_avatar_thumbnails,
+    collect_orphan_chunks,
+]
+
+
+async def run_migrations(db, migrations=None) -> list:
+    """Run ``migrations`` (default: all) in order; returns the ones worth retrying.
+
+    A migration that lost the database is returned so the caller can run it
+    again later; any other failure is a bug a rerun won't fix, so it is only
+    logged.
+    """
+    retry = []
+    for migration in MIGRATIONS if migrations is None else migrations:
+        try:
+            await migration(db)
+        except ConnectionFailure as exc:
+            logger.error(f"Migration {migration.__name__} interrupted, database unavailable: {exc}")
+            retry.append(migration)
+        except Exception:
+            logger.exception(f"Migration {migration.__name__} failed")
+    return retry
+
+
+if __name__ == "__main__":
+    import os
+    from motor.motor_asyncio import AsyncIOMotorClient
+
+    logging.basicConfig(level=logging.INFO)
+    client = AsyncIOMotorClient(os.environ["MONGO_URL"])
+    asyncio.run(run_migrations(client[os.environ["DB_NAME"]]))
@@ -0,0 +1,110 @@
+"""Bounded worker pool for bcrypt password hashing and verification.
+
+bcrypt is deliberately slow, so running it on the event loop stalls every
+other request and websocket on the worker.  ``PasswordHasher`` moves the work
+onto a thread or process pool, caps how much work may be outstanding and keeps
+simple counters that can be scraped for queue-depth monitoring.
+"""
+import asyncio
+import time
+from concurrent.futures import Executor, ProcessPoolExecutor, ThreadPoolExecutor
+from typing import Optional
+
+from passlib.context import CryptContext
+
+pwd_context = CryptContext(schemes=["bcrypt"], deprecated="auto")
+
+
+def _hash(password: str) -> str:
+    return pwd_context.hash(password)
+
+
+def _verify(plain_password: str, hashed_password: str) -> bool:
+    return pwd_context.verify(plain_password, hashed_password)
+
+
+class PasswordPoolSaturated(Exception):
+    """Raised when more password operations are pending than the pool accepts."""
+
+
+class PasswordHasher:
+    """Runs password hashing on a bounded executor.
+
+    ``executor`` is one of ``thread`` (default, bcrypt releases the GIL),
+    ``process`` or ``inline``.  ``inline`` runs on the calling thread and only
+    exists so benchmarks can compare against the old blocking behaviour.
+    ``max_queue`` is the number of operations allowed to wait for a free
+    worker; anything beyond that is rejected with ``PasswordPoolSaturated``.
+    """
+
+    def __init__(self, max_workers: int = 4, executor: str = "thread", max_queue: int = 64):
+        if executor not in ("thread", "process", "inline"):
+            raise ValueError(f"Unknown password executor: {executor}")
+        self.max_workers = max(1, max_workers)
+        self.max_queue = max(0, max_queue)
+        self.kind = executor
+        self._executor: Optional[Executor] = None
+        self._pending = 0
+        self.completed = 0
+        self.rejected = 0
+        self.max_queue_depth_seen = 0
+        self.total_seconds = 0.0
+
+    def _get_executor(self) -> Executor:
+        if self._executor is None:
+            if self.kind == "process":
+                self._executor = ProcessPoolExecutor(max_workers=self.max_workers)
+            else:
+                self._executor = ThreadPoolExecutor(max_workers=self.max_workers, thread_name_prefix="pwhash")
+        return self._executor
+
+    @property
+    def queue_depth(self) -> int:
+        return max(0, self._pending - self.max_workers)
+
+    async def _run(self, fn, *args):
+        if self.kind == "inline":
+            started = time.perf_counter()
+            result = fn(*args)
+            self.total_seconds += time.perf_counter() - started
+            self.completed += 1
+            return result
+
+        if self._pending >= self.max_workers + self.max_queue:
+            self.rejected += 1
+            raise PasswordPoolSaturated()
+
+        self._pending += 1
+        self.max_queue_depth_seen = max(self.max_queue_depth_seen, self.queue_depth)
+        started = time.perf_counter()
+        try:
+            loop = asyncio.get_running_loop()
+            return await loop.run_in_executor(self._get_executor(), fn, *args)
+        finally:
+            self._pending -= 1
+            self.completed += 1
+            self.total_seconds += time.perf_counter() - started
+
+    async def hash(self, password: str) -> str:
+        return await self._run(_hash, password)
+
+    async def verify(self, plain_password: str, hashed_password: str) -> bool:
+        return await self._run(_verify, plain_password, hashed_password)
+
+    def stats(self) -> dict:
+        return {
+            "executor": self.kind,
+            "max_workers": self.max_workers,
+            "max_queue": self.max_queue,
+            "in_flight": min(self._pending, self.max_workers),
+            "queue_depth": self.queue_depth,
+            "max_queue_depth_seen": self.max_queue_depth_seen,
+            "completed": self.completed,
+            "rejected": self.rejected,
+            "total_seconds": round(self.total_seconds, 6),
+        }
+
+    def shutdown(self):
+        if self._executor is not None:
+            self._executor.shutdown(wait=False, cancel_futures=True)
+            self._executor = None
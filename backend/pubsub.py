@@ -0,0 +1,237 @@
+"""Event bus for websocket fan-out across workers and nodes.
+
+Handlers publish ``(user_id, event)`` pairs; every worker runs a subscriber
+that hands each event to ``deliver`` so it reaches the user's sockets on that
+worker.  Backends, selected with ``PUBSUB_BACKEND``:
+
+``memory``  in-process only, the default for a single worker.
+``redis``   Redis (or anything speaking its PUBLISH/SUBSCRIBE protocol) at
+            ``REDIS_URL``; a minimal RESP client is built in, so no extra
+            package is needed.
+``mongo``   inserts into ``pubsub_events`` and tails a change stream; needs
+            a replica set but no extra infrastructure.
+"""
+import asyncio
+import json
+import logging
+import os
+from abc import ABC, abstractmethod
+from datetime import datetime, timezone
+from typing import Awaitable, Callable, Optional
+from urllib.parse import urlparse
+
+logger = logging.getLogger(__name__)
+
+Deliver = Callable[[str, dict], Awaitable[None]]
+
+
+class Broker(ABC):
+    def __init__(self, deliver: Deliver):
+        self._deliver = deliver
+
+    async def start(self):
+        pass
+
+    @abstractmethod
+    async def publish(self, user_id: str, event: dict):
+        """Hand ``event`` to the subscriber of every worker."""
+
+    async def stop(self):
+        pass
+
+
+class InProcessBroker(Broker):
+    async def publish(self, user_id: str, event: dict):
+        await self._deliver(user_id, event)
+
+
+class RespError(Exception):
+    pass
+
+
+def _encode_command(*args) -> bytes:
+    out = [f"*{len(args)}\r\n".encode()]
+    for arg in args:
+        data = arg if isinstance(arg, bytes) else str(arg).encode()
+        out.append(f"${len(data)}\r\n".encode() + data + b"\r\n")
+    return b"".join(out)
+
+
+async def _read_reply(reader: asyncio.StreamReader):
+    line = await reader.readline()
+    if not line:
+        raise ConnectionError("Connection closed")
+    kind, rest = line[:1], line[1:-2]
+    if kind == b"+":
+        return rest.decode()
+    if kind == b"-":
+        raise RespError(rest.decode())
+    if kind == b":":
+        return int(rest)
+    if kind == b"$":
+        length = int(rest)
+        if length < 0:
+            return None
+        data = await reader.readexactly(length + 2)
+        return data[:-2]
+    if kind == b"*":
+        length = int(rest)
+        if length < 0:
+            return None
+        return [await _read_reply(reader) for _ in range(length)]
+    raise RespError(f"Unexpected reply: {line!r}")
+
+
+class RedisBroker(Broker):
+    def __init__(self, deliver: Deliver, url: str, channel: str = "memora:events", reconnect_delay: float = 1.0):
+        super().__init__(deliver)
+        self.url = urlparse(url)
+        self.channel = channel
+        self.reconnect_delay = reconnect_delay
+        self._pub: Optional[tuple] = None
+        self._pub_lock = asyncio.Lock()
+        self._listener: Optional[asyncio.Task] = None
+        self._subscribed = asyncio.Event()
+
+    async def _connect(self):
+        reader, writer = await asyncio.open_connection(self.url.hostname or "localhost", self.url.port or 6379)
+        if self.url.password:
+            args = ("AUTH", self.url.username, self.url.password) if self.url.username else ("AUTH", self.url.password)
+            writer.write(_encode_command(*args))
+            await _read_reply(reader)
+        db_index = (self.url.path or "/").lstrip("/")
+        if db_index:
+            writer.write(_encode_command("SELECT", db_index))
+            await _read_reply(reader)
+        return reader, writer
+
+    async def start(self):
+        self._listener = asyncio.create_task(self._listen())
+        # Don't report ready until events published from now on will be seen
+        await asyncio.wait_for(self._subscribed.wait(), timeout=10)
+
+    async def publish(self, user_id: str, event: dict):
+        payload = json.dumps({"user_id": user_id, "event": event}, default=str)
+        async with self._pub_lock:
+            for attempt in (1, 2):
+                try:
+                    if self._pub is None:
+                        self._pub = await self._connect()
+                    reader, writer = self._pub
+                    writer.write(_encode_command("PUBLISH", self.channel, payload))
+                    await writer.drain()
+                    await _read_reply(reader)
+                    return
+                except (ConnectionError, OSError):
+                    self._close_pub()
+                    if attempt == 2:
+                        raise
+
+    async def _listen(self):
+        while True:
+            writer = None
+            try:
+                reader, writer = await self._connect()
+                writer.write(_encode_command("SUBSCRIBE", self.channel))
+                await writer.drain()
+                while True:
+                    reply = await _read_reply(reader)
+                    if not isinstance(reply, list) or not reply:
+                        continue
+                    kind = reply[0].decode() if isinstance(reply[0], bytes) else reply[0]
+                    if kind == "subscribe":
+                        self._subscribed.set()
+                    elif kind == "message":
+                        message = json.loads(reply[2])
+                        try:
+                            await self._deliver(message["user_id"], message["event"])
+                        except Exception:
+                            logger.exception("Failed to deliver pub/sub event")
+            except asyncio.CancelledError:
+                raise
+            except Exception:
+                logger.warning(f"Redis subscriber disconnected, retrying in {self.reconnect_delay}s")
+                await asyncio.sleep(self.reconnect_delay)
+            finally:
+                if writer is not None:
+                    writer.close()
+
+    def _close_pub(self):
+        if self._pub is not None:
+            self._pub[1].close()
+            self._pub = None
+
+    async def stop(self):
+        if self._listener is not None:
+            self._listener.cancel()
+            try:
+                await self._listener
+            except asyncio.CancelledError:
+                pass
+        self._close_pub()
+
+
+class MongoChangeStreamBroker(Broker):
+    def __init__(self, deliver: Deliver, db, ttl_seconds: int = 300):
+        super().__init__(deliver)
+        self.db = db
+        self.ttl_seconds = ttl_seconds
+        self._listener: Optional[asyncio.Task] = None
+        self._watching = asyncio.Event()
+
+    @property
+    def collection(self):
+        # looked up on use: the server binds its database after constructing the broker
+        return self.db.pubsub_events
+
+    async def start(self):
+        await self.collection.create_index("created_at", name="pubsub_events_ttl", expireAfterSeconds=self.ttl_seconds)
+        self._listener = asyncio.create_task(self._listen())
+        await asyncio.wait_for(self._watching.wait(), timeout=10)
+
+    async def publish(self, user_id: str, event: dict):
+        await self.collection.insert_one({
+            "user_id": user_id,
+            "event": event,
+            "created_at": datetime.now(timezone.utc),
+        })
+
+    async def _listen(self):
+        resume_token = None
+        while True:
+            try:
+                async with self.collection.watch(
+                    [{"$match": {"operationType": "insert"}}], resume_after=resume_token
+                ) as stream:
+                    self._watching.set()
+                    async for change in stream:
+                        resume_token = stream.resume_token
+                        doc = change["fullDocument"]
+                        try:
+                            await self._deliver(doc["user_id"], doc["event"])
+                        except Exception:
+                            logger.exception("Failed to deliver pub/sub event")
+            except asyncio.CancelledError:
+                raise
+            except Exception:
+                logger.warning("Change stream interrupted, resuming in 1s")
+                await asyncio.sleep(1)
+
+    async def stop(self):
+        if self._listener is not None:
+            self._listener.cancel()
+            try:
+                await self._listener
+            except asyncio.CancelledError:
+                pass
+
+
+def create_broker(db, deliver: Deliver) -> Broker:
+    backend = os.environ.get("PUBSUB_BACKEND", "memory")
+    if backend == "memory":
+        return InProcessBroker(deliver)
+    if backend == "redis":
+        return RedisBroker(deliver, os.environ.get("REDIS_URL", "redis://localhost:6379/0"))
+    if backend == "mongo":
+        return MongoChangeStreamBroker(deliver, db)
+    raise ValueError(f"Unknown PUBSUB_BACKEND: {backend}")
@@ -0,0 +1,176 @@
+"""Server-side reminder delivery.
+
+Reminders carry a parsed ``due_at`` next to the free-form ``date`` and a
+``notified_at`` that is unset until the reminder has fired.  The
+``(notified_at, due_at)`` index turns "what is due" into one range read, and
+"when is the next one" into the first key of the same range.
+
+``ReminderScheduler`` runs on every worker, but only the holder of the lease
+document in ``scheduler_leases`` fires reminders; the others just keep
+trying to take the lease over, so a crashed leader is replaced within one
+lease TTL.  Each reminder is claimed with a conditional update before its
+``reminder_due`` event is published, so even two leaders racing across a
+lease hand-over can't both send it.
+"""
+import asyncio
+import logging
+import os
+import uuid
+from datetime import datetime, timedelta, timezone
+from typing import Awaitable, Callable, Optional
+
+from pymongo import ReturnDocument
+from pymongo.errors import DuplicateKeyError
+
+logger = logging.getLogger(__name__)
+
+LEASE_ID = "reminders"
+
+Publish = Callable[[str, dict], Awaitable[None]]
+
+
+def parse_due_at(date: Optional[str]) -> Optional[datetime]:
+    """Best-effort UTC instant for a reminder's ``date`` string.
+
+    Values without an offset are taken as UTC, which is also how browsers
+    read a bare ``YYYY-MM-DD``; clients that know the user's zone send an
+    explicit ``due_at`` instead.
+    """
+    if not date:
+        return None
+    try:
+        parsed = datetime.fromisoformat(date.strip().replace("Z", "+00:00"))
+    except ValueError:
+        return None
+    if parsed.tzinfo is None:
+        return parsed.replace(tzinfo=timezone.utc)
+    return parsed.astimezone(timezone.utc)
+
+
+def due_fields(due_at: Optional[datetime], now: Optional[datetime] = None) -> dict:
+    """``due_at``/``notified_at`` to store for a reminder being written.
+
+    A reminder already in the past is marked notified, so saving an old one
+    doesn't fire it again.
+    """
+    now = now or datetime.now(timezone.utc)
+    return {"due_at": due_at, "notified_at": None if due_at and due_at > now else now}
+
+
+def reminder_event(doc: dict) -> dict:
+    return {
+        "event": "reminder_due",
+        "payload": {
+            "id": doc["id"],
+            "title": doc.get("title"),
+            "note": doc.get("note"),
+            "date": doc.get("date"),
+            "due_at": doc["due_at"].isoformat(),
+        },
+    }
+
+
+class ReminderScheduler:
+    def __init__(self, db, publish: Publish, lease_ttl: float = 30.0, poll_interval: float = 10.0,
+                 batch_size: int = 100, worker_id: Optional[str] = None):
+        self.db = db
+        self.publish = publish
+        self.lease_ttl = lease_ttl
+        # upper bound on how late a reminder created on another worker can fire
+        self.poll_interval = min(poll_interval, lease_ttl / 3)
+        self.batch_size = batch_size
+        self.worker_id = worker_id or f"{os.getpid()}-{uuid.uuid4().hex[:8]}"
+        self.is_leader = False
+        self.fired = 0
+        self._wake = asyncio.Event()
+        self._task: Optional[asyncio.Task] = None
+
+    async def start(self):
+        self._task = asyncio.create_task(self._run())
+
+    async def stop(self):
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+        if self.is_leader:
+            # hand over right away instead of making the next leader wait out the TTL
+            await self.db.scheduler_leases.delete_one({"_id": LEASE_ID, "owner": self.worker_id})
+            self.is_leader = False
+
+    def wake(self):
+        """Re-check the schedule now (a reminder on this worker was written)."""
+        self._wake.set()
+
+    async def acquire_lease(self) -> bool:
+        now = datetime.now(timezone.utc)
+        try:
+            lease = await self.db.scheduler_leases.find_one_and_update(
+                {"_id": LEASE_ID, "$or": [{"owner": self.worker_id}, {"expires_at": {"$lt": now}}]},
+                {"$set": {"owner": self.worker_id, "expires_at": now + timedelta(seconds=self.lease_ttl)}},
+                upsert=True,
+                return_document=ReturnDocument.AFTER,
+            )
+        except DuplicateKeyError:
+            # someone else holds a live lease (the upsert collided with their document)
+            lease = None
+        self.is_leader = bool(lease and lease.get("owner") == self.worker_id)
+        return self.is_leader
+
+    async def fire_due(self) -> int:
+        """Publish every reminder due by now; returns how many were sent."""
+        fired = 0
+        while True:
+            now = datetime.now(timezone.utc)
+            due = await self.db.reminders.find(
+                {"notified_at": None, "due_at": {"$lte": now}},
+                {"_id": 0, "id": 1, "user_id": 1, "title": 1, "note": 1, "date": 1, "due_at": 1},
+            ).sort("due_at", 1).limit(self.batch_size).to_list(self.batch_size)
+            for doc in due:
+                claimed = await self.db.reminders.update_one(
+                    {"id": doc["id"], "notified_at": None, "due_at": doc["due_at"]},
+                    {"$set": {"notified_at": now}},
+                )
+                if not claimed.modified_count:
+                    continue
+                try:
+                    await self.publish(doc["user_id"], reminder_event(doc))
+                    fired += 1
+                except Exception:
+                    logger.exception(f"Failed to publish reminder {doc['id']}")
+            if len(due) < self.batch_size:
+                break
+        self.fired += fired
+        return fired
+
+    async def seconds_until_next(self) -> float:
+        upcoming = await self.db.reminders.find(
+            {"notified_at": None, "due_at": {"$ne": None}}, {"_id": 0, "due_at": 1}
+        ).sort("due_at", 1).limit(1).to_list(1)
+        if not upcoming:
+            return self.poll_interval
+        delay = (upcoming[0]["due_at"] - datetime.now(timezone.utc)).total_seconds()
+        return max(0.0, min(delay, self.poll_interval))
+
+    async def _run(self):
+        while True:
+            delay = self.poll_interval
+            try:
+                if await self.acquire_lease():
+                    await self.fire_due()
+                    delay = await self.seconds_until_next()
+            except asyncio.CancelledError:
+                raise
+            except Exception:
+                logger.exception("Reminder scheduler iteration failed")
+            self._wake.clear()
+            try:
+                await asyncio.wait_for(self._wake.wait(), timeout=delay)
+            except asyncio.TimeoutError:
+                pass
+
+    def stats(self) -> dict:
+        return {"worker_id": self.worker_id, "leader": self.is_leader, "fired": self.fired,
+                "poll_interval": self.poll_interval, "lease_ttl": self.lease_ttl}
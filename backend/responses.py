@@ -0,0 +1,59 @@
+"""JSON response for list endpoints that return projected Mongo rows as-is.
+
+When a handler returns a ``Response`` FastAPI skips ``response_model``
+validation and serialization, which for a list is a Pydantic round-trip per
+row of data the server wrote itself.  The ``response_model`` still documents
+the shape; the Mongo projection (``projection_for``) is what enforces it, and
+``with_defaults`` fills in the optional fields older documents lack.
+orjson is used when installed, the standard library otherwise.
+"""
+import json
+from datetime import datetime
+from functools import lru_cache
+from typing import Any, List, Type
+
+from fastapi.responses import JSONResponse
+from pydantic import BaseModel
+
+try:
+    import orjson
+except ImportError:  # pragma: no cover - optional speedup
+    orjson = None
+
+
+def _default(value):
+    if isinstance(value, datetime):
+        # match orjson's OPT_UTC_Z output
+        return value.isoformat().replace("+00:00", "Z")
+    raise TypeError(f"Object of type {type(value).__name__} is not JSON serializable")
+
+
+class FastJSONResponse(JSONResponse):
+    def render(self, content: Any) -> bytes:
+        if orjson is not None:
+            return orjson.dumps(content, option=orjson.OPT_UTC_Z | orjson.OPT_NON_STR_KEYS)
+        return json.dumps(content, default=_default, ensure_ascii=False, separators=(",", ":")).encode("utf-8")
+
+
+def projection_for(model: Type[BaseModel]) -> dict:
+    """Mongo projection returning exactly the fields of ``model``."""
+    return {"_id": 0, **{name: 1 for name in model.model_fields}}
+
+
+@lru_cache(maxsize=None)
+def _optional_fields(model: Type[BaseModel]) -> tuple:
+    return tuple((name, field) for name, field in model.model_fields.items() if not field.is_required())
+
+
+def with_defaults(model: Type[BaseModel], rows: List[dict]) -> List[dict]:
+    """Give each projected row ``model``'s default for optional fields it lacks.
+
+    Documents written before a field existed don't have it, and a projection
+    only returns what is stored; validation used to fill these in.
+    """
+    fields = _optional_fields(model)
+    for row in rows:
+        for name, field in fields:
+            if name not in row:
+                row[name] = field.get_default(call_default_factory=True)
+    return rows
@@ -1,4 +1,140 @@
+"""Production launcher: ``python -m backend.run_uvicorn``.
+
+Runs ``WEB_CONCURRENCY`` uvicorn workers sharing one listening socket, on
+uvloop and httptools when they are installed.  Settings come from the
+environment, or the matching command-line flags:
+
+``HOST`` / ``PORT``        bind address (default 127.0.0.1:8002)
+``WEB_CONCURRENCY``        worker processes (default: one per CPU with a shared
+                           ``PUBSUB_BACKEND``, otherwise 1)
+``KEEPALIVE_SECONDS``      idle keep-alive; keep it above the load
+                           balancer's idle timeout (default 30)
+``BACKLOG``                pending-connection queue of the socket (default 2048)
+``LIMIT_CONCURRENCY``      per-worker cap on open connections and tasks;
+                           beyond it uvicorn answers 503 (default: no cap)
+``GRACEFUL_TIMEOUT``       seconds in-flight HTTP requests get on shutdown
+                           (default 30)
+``WS_DRAIN_SECONDS``       seconds websocket clients get to reconnect
+                           elsewhere on shutdown (default 20)
+``WS_RECONNECT_SPREAD``    reconnect hints are jittered over this many
+                           seconds (default 5)
+
+On SIGTERM each worker stops accepting, then drains its websockets before
+uvicorn's own shutdown would close them all at once: clients are sent a
+``reconnect`` event with a jittered delay and get ``WS_DRAIN_SECONDS`` to
+leave; stragglers are closed with 1012.  In-flight requests then get
+``GRACEFUL_TIMEOUT`` to finish.
+
+Several workers only see each other's websocket events through a shared
+pub/sub backend, so with more than one worker ``PUBSUB_BACKEND`` must be
+``redis`` or ``mongo``; the launcher refuses to start on the in-process
+``memory`` broker.
+"""
+import argparse
+import asyncio
+import importlib.util
+import logging
+import os
+import sys
+from pathlib import Path
+
 import uvicorn
+from uvicorn.supervisors import Multiprocess
+
+ROOT = Path(__file__).resolve().parent.parent
+if str(ROOT) not in sys.path:
+    sys.path.insert(0, str(ROOT))
+
+logger = logging.getLogger("uvicorn.error")
+
+APP = "backend.server:app"
+
+
+def _available(module: str) -> bool:
+    return importlib.util.find_spec(module) is not None
+
+
+class DrainingServer(uvicorn.Server):
+    """uvicorn server that lets websocket clients leave before shutting down."""
+
+    def __init__(self, config: uvicorn.Config, drain_seconds: float, reconnect_spread: float):
+        super().__init__(config)
+        self.drain_seconds = drain_seconds
+        self.reconnect_spread = reconnect_spread
+
+    async def shutdown(self, sockets=None):
+        # stop accepting first, so reconnecting clients land on other workers
+        for server in self.servers:
+            server.close()
+        from backend.server import connections
+
+        drain = asyncio.create_task(connections.drain(self.drain_seconds, self.reconnect_spread))
+        # a second Ctrl+C skips the wait, like uvicorn's own shutdown
+        while not drain.done() and not self.force_exit:
+            await asyncio.sleep(0.1)
+        if drain.done():
+            closed = drain.result()
+            if closed:
+                logger.info(f"Closed {closed} websocket connections that did not reconnect in time")
+        else:
+            drain.cancel()
+        await super().shutdown(sockets)
+
+
+def shared_broker() -> bool:
+    return os.environ.get("PUBSUB_BACKEND", "memory") != "memory"
+
+
+def default_workers() -> int:
+    return (os.cpu_count() or 1) if shared_broker() else 1
+
+
+def build_config(args) -> uvicorn.Config:
+    return uvicorn.Config(
+        APP,
+        host=args.host,
+        port=args.port,
+        workers=args.workers,
+        loop="uvloop" if _available("uvloop") else "asyncio",
+        http="httptools" if _available("httptools") else "h11",
+        backlog=args.backlog,
+        timeout_keep_alive=args.keepalive,
+        timeout_graceful_shutdown=args.graceful_timeout,
+        limit_concurrency=args.limit_concurrency,
+        proxy_headers=True,
+        log_level=args.log_level,
+    )
+
+
+def main(args):
+    config = build_config(args)
+    if config.workers > 1 and not shared_broker():
+        # each worker would only deliver the websocket events raised in itself
+        raise SystemExit(
+            f"Refusing to start {config.workers} workers on PUBSUB_BACKEND=memory; "
+            "set PUBSUB_BACKEND to redis or mongo, or run one worker"
+        )
+    server = DrainingServer(config, args.ws_drain, args.ws_reconnect_spread)
+    logger.info(f"Starting {config.workers} workers (loop={config.loop}, http={config.http})")
+
+    if config.workers > 1:
+        sock = config.bind_socket()
+        Multiprocess(config, target=server.run, sockets=[sock]).run()
+    else:
+        server.run()
+
 
 if __name__ == '__main__':
-    uvicorn.run("backend.server:app", host='127.0.0.1', port=8002, log_level='info')
+    env = os.environ.get
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--host", default=env("HOST", "127.0.0.1"))
+    parser.add_argument("--port", type=int, default=int(env("PORT", "8002")))
+    parser.add_argument("--workers", type=int, default=int(env("WEB_CONCURRENCY", str(default_workers()))))
+    parser.add_argument("--keepalive", type=int, default=int(env("KEEPALIVE_SECONDS", "30")))
+    parser.add_argument("--backlog", type=int, default=int(env("BACKLOG", "2048")))
+    parser.add_argument("--limit-concurrency", type=int, default=int(env("LIMIT_CONCURRENCY", "0")) or None)
+    parser.add_argument("--graceful-timeout", type=int, default=int(env("GRACEFUL_TIMEOUT", "30")))
+    parser.add_argument("--ws-drain", type=float, default=float(env("WS_DRAIN_SECONDS", "20")))
+    parser.add_argument("--ws-reconnect-spread", type=float, default=float(env("WS_RECONNECT_SPREAD", "5")))
+    parser.add_argument("--log-level", default=env("LOG_LEVEL", "info"))
+    main(parser.parse_args())
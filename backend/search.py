@@ -0,0 +1,137 @@
+"""Note search over a term index kept on each note.
+
+Every note carries a ``search`` field (``terms``: its distinct terms,
+``weights``: term -> weighted frequency, title terms counting
+``TITLE_WEIGHT`` times, ``length``).  Writes set it together with the note,
+so the index is always consistent with the note and a delete removes it.  The
+multikey ``(user_id, search.terms)`` index is the inverted index: an anchored
+``^prefix`` regex on it is a range scan, which Mongo's ``$text`` can't do.
+
+Ranking is BM25 over the notes matching all query terms, read from the
+index range of the rarest term and capped at ``MAX_CANDIDATES``.  Every
+query term is matched as a prefix, with exact matches weighted above
+prefix-only ones.
+"""
+import heapq
+import math
+import re
+import unicodedata
+from typing import Dict, List, Optional, Tuple
+
+TITLE_WEIGHT = 3
+PREFIX_MATCH_WEIGHT = 0.5
+MIN_PREFIX = 2
+MAX_TERM_LENGTH = 40
+MAX_QUERY_TERMS = 8
+# upper bound on notes scored per query
+MAX_CANDIDATES = 5000
+# name of the multikey (user_id, search.terms) index in backend.indexes
+SEARCH_INDEX = "notes_user_search_terms"
+SNIPPET_CHARS = 160
+
+# BM25 parameters
+K1 = 1.2
+B = 0.75
+
+_TOKEN = re.compile(r"\w+")
+
+
+def tokenize(text: Optional[str]) -> List[str]:
+    if not text:
+        return []
+    folded = unicodedata.normalize("NFKD", text.casefold())
+    folded = "".join(ch for ch in folded if not unicodedata.combining(ch))
+    return [token[:MAX_TERM_LENGTH] for token in _TOKEN.findall(folded)]
+
+
+def index_fields(title: Optional[str], content: Optional[str]) -> dict:
+    """The ``search`` field to store on a note with this title and content."""
+    weights: Dict[str, int] = {}
+    for token in tokenize(title):
+        weights[token] = weights.get(token, 0) + TITLE_WEIGHT
+    for token in tokenize(content):
+        weights[token] = weights.get(token, 0) + 1
+    return {
+        "terms": sorted(weights),
+        "weights": weights,
+        "length": sum(weights.values()),
+    }
+
+
+def parse_query(q: str) -> List[str]:
+    terms = list(dict.fromkeys(tokenize(q)))[:MAX_QUERY_TERMS]
+    return [term for term in terms if len(term) >= MIN_PREFIX] or terms[:1]
+
+
+def term_filter(term: str) -> dict:
+    return {"$regex": f"^{re.escape(term)}"}
+
+
+def term_frequency(weights: Dict[str, int], term: str) -> float:
+    return sum(
+        weight if indexed == term else weight * PREFIX_MATCH_WEIGHT
+        for indexed, weight in weights.items()
+        if indexed.startswith(term)
+    )
+
+
+async def search_notes(db, user_id: str, q: str, limit: int) -> Tuple[List[dict], List[str]]:
+    """Return ``(hits, terms)``: the top ``limit`` notes as ``(id, score)`` dicts."""
+    terms = parse_query(q)
+    if not terms:
+        return [], terms
+
+    # One count per term, each a range scan on the (user_id, search.terms) index
+    dfs = {}
+    for term in terms:
+        dfs[term] = await db.notes.count_documents({"user_id": user_id, "search.terms": term_filter(term)})
+    if not all(dfs.values()):
+        return [], terms
+    total = await db.notes.count_documents({"user_id": user_id})
+    idf = {term: math.log(1 + (total - df + 0.5) / (df + 0.5)) for term, df in dfs.items()}
+
+    # Walk the index range of the rarest term (Mongo takes a multikey field's
+    # bounds from one predicate, so it goes first).  When that term matches at
+    # most MAX_CANDIDATES notes every match is scored; past that, the range is
+    # read in key order, which puts exact matches ahead of prefix-only ones.
+    rarest = min(terms, key=dfs.get)
+    query = {"user_id": user_id, "$and": [{"search.terms": term_filter(term)}
+                                          for term in sorted(terms, key=lambda term: term != rarest)]}
+    candidates = await db.notes.find(
+        query, {"_id": 0, "id": 1, "search.weights": 1, "search.length": 1}
+    ).hint(SEARCH_INDEX).limit(MAX_CANDIDATES).to_list(MAX_CANDIDATES)
+    if not candidates:
+        return [], terms
+
+    avg_length = sum(doc["search"]["length"] for doc in candidates) / len(candidates) or 1
+    hits = []
+    for doc in candidates:
+        weights, length = doc["search"]["weights"], doc["search"]["length"]
+        norm = K1 * (1 - B + B * length / avg_length)
+        score = 0.0
+        for term in terms:
+            tf = term_frequency(weights, term)
+            score += idf[term] * tf * (K1 + 1) / (tf + norm)
+        hits.append({"id": doc["id"], "score": round(score, 4)})
+
+    # same order as a stable sort by score, without sorting the whole list
+    return heapq.nlargest(limit, hits, key=lambda hit: hit["score"]), terms
+
+
+def snippet(text: Optional[str], terms: List[str], width: int = SNIPPET_CHARS) -> Tuple[str, List[List[int]]]:
+    """A window of ``text`` around the first match and the match offsets in it."""
+    text = text or ""
+    pattern = re.compile(r"\b(?:" + "|".join(re.escape(term) for term in terms) + r")\w*", re.IGNORECASE)
+    first = pattern.search(text)
+    start = 0
+    if first and first.start() > width // 3:
+        start = first.start() - width // 3
+        # don't cut a word in half
+        space = text.rfind(" ", 0, start)
+        start = space + 1 if space >= 0 and start - space < 20 else start
+    end = min(len(text), start + width)
+    window = text[start:end]
+    prefix = "…" if start > 0 else ""
+    suffix = "…" if end < len(text) else ""
+    highlights = [[m.start() + len(prefix), m.end() + len(prefix)] for m in pattern.finditer(window)]
+    return prefix + window + suffix, highlights
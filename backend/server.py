@@ -1,42 +1,204 @@
-from fastapi import FastAPI, APIRouter, HTTPException, Depends, status, WebSocket, WebSocketDisconnect
+from fastapi import FastAPI, APIRouter, HTTPException, Depends, status, WebSocket, WebSocketDisconnect, Query, Header, Request, Response
 from fastapi.security import HTTPBearer, HTTPAuthorizationCredentials
 from dotenv import load_dotenv
 from starlette.middleware.cors import CORSMiddleware
-from motor.motor_asyncio import AsyncIOMotorClient
-from pymongo.errors import ServerSelectionTimeoutError
-from fastapi.responses import JSONResponse
+from pymongo import InsertOne, UpdateOne, ReturnDocument
+from pymongo.errors import ConnectionFailure, ServerSelectionTimeoutError, DuplicateKeyError, BulkWriteError, WaitQueueTimeoutError
+from fastapi.responses import JSONResponse, StreamingResponse
 import os
+import asyncio
 import logging
+from contextlib import asynccontextmanager
 from pathlib import Path
 from pydantic import BaseModel, Field, ConfigDict
-from typing import List, Optional, Dict
+from typing import List, Optional, Dict, Literal
 import uuid
+import hmac
+import ipaddress
+import base64
+import json
 from datetime import datetime, timezone, timedelta
 import bcrypt
 import jwt
-from passlib.context import CryptContext
+
+from backend.passwords import PasswordHasher, PasswordPoolSaturated
+from backend.indexes import ensure_indexes
+from backend.migrations import month_day_key, run_migrations
+from backend.pubsub import create_broker
+from backend.compression import CompressionMiddleware
+from backend.connections import SERVICE_RESTART_CLOSE_CODE, ConnectionManager
+from backend.database import PoolMonitor, client_options, create_client, ping
+from backend.avatars import DEFAULT_AVATAR_SIZE, pick_size, store_avatar
+from backend.cache import TTLCache
+from backend.etags import document_etag, etag_headers, etag_matches, make_etag, not_modified
+from backend.friends import FriendGraph
+from backend.metrics import Metrics, MetricsMiddleware, MongoCommandListener
+from backend.reminders import ReminderScheduler, due_fields, parse_due_at
+from backend.responses import FastJSONResponse, projection_for, with_defaults
+from backend.search import index_fields, search_notes, snippet
+from backend.sync import changes_since, record_deletes, reserve_seq, settled_seq, stamp, utcnow
+from backend.blobs import (
+    BlobTooLarge, blob_url, create_blob_store, decode_data_url, externalize_attachments, parse_range,
+    served_content_type,
+)
 
 ROOT_DIR = Path(__file__).parent
 load_dotenv(ROOT_DIR / '.env')
 
 mongo_url = os.environ['MONGO_URL']
-client = AsyncIOMotorClient(mongo_url)
-db = client[os.environ['DB_NAME']]
+DB_NAME = os.environ['DB_NAME']
+# Per-route latency and Mongo round trips, served at /metrics
+metrics = Metrics()
+# Open/checked-out/waiting connections, reported by the health endpoints
+pool_monitor = PoolMonitor(client_options()['maxPoolSize'])
+# Bounds the warm-up and readiness pings, independently of server selection
+MONGO_PING_TIMEOUT = float(os.environ.get('MONGO_PING_TIMEOUT', '2'))
+
+# The Motor client is opened by the lifespan handler, which calls
+# bind_database(); importing this module opens no connections.
+client = None
+db = None
+# Attachments and avatars live here; documents only keep blob references
+blob_store = None
+
+# Uploads are decoded in full to thumbnail them, so they get their own cap
+AVATAR_MAX_BYTES = int(os.environ.get('AVATAR_MAX_BYTES', str(10 * 1024 * 1024)))
 
 # External integration config
 FRONTEND_URL = os.environ.get('FRONTEND_URL', 'http://localhost:3000')
 
-app = FastAPI()
+# Index build and backfills started at startup (bootstrap_database); held so
+# the task isn't collected mid-run
+migrations_task: Optional[asyncio.Task] = None
+DB_BOOTSTRAP_RETRY_SECONDS = float(os.environ.get('DB_BOOTSTRAP_RETRY_SECONDS', '5'))
+DB_BOOTSTRAP_MAX_RETRY_SECONDS = float(os.environ.get('DB_BOOTSTRAP_MAX_RETRY_SECONDS', '300'))
+# Set once the pub/sub broker is subscribed; readiness waits for it
+broker_started = False
+BROKER_RETRY_SECONDS = float(os.environ.get('BROKER_RETRY_SECONDS', '5'))
+
+async def start_broker(retry_delay: Optional[float] = None) -> bool:
+    """Start the broker; with ``retry_delay``, keep retrying until it starts."""
+    global broker_started
+    while True:
+        try:
+            await broker.start()
+            broker_started = True
+            return True
+        except Exception:
+            logger.exception("Pub/sub broker failed to start")
+            # drop whatever half-started listener is left before trying again
+            await broker.stop()
+            if retry_delay is None:
+                return False
+        await asyncio.sleep(retry_delay)
+
+async def bootstrap_database(retry_delay: float) -> None:
+    """Build the declared indexes, then run the migrations.
+
+    Either may find the database unavailable; whatever did is retried, with
+    the delay doubling from ``retry_delay`` up to
+    ``DB_BOOTSTRAP_MAX_RETRY_SECONDS``, until both have run.
+    """
+    global index_report
+    pending = None
+    while True:
+        if index_report is None:
+            try:
+                index_report = await ensure_indexes(db)
+            except ConnectionFailure as exc:
+                logger.error(f"Index bootstrap failed, database unavailable: {exc}")
+        # migrations lean on the indexes, so they wait for them
+        if index_report is not None:
+            # batched and idempotent: a rerun resumes where the last one stopped
+            pending = await run_migrations(db, pending)
+            if not pending:
+                return
+        await asyncio.sleep(retry_delay)
+        retry_delay = min(retry_delay * 2, DB_BOOTSTRAP_MAX_RETRY_SECONDS)
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    global client, migrations_task
+    client = create_client(mongo_url, [MongoCommandListener(metrics), pool_monitor])
+    bind_database(client[DB_NAME])
+    if not await ping(client, MONGO_PING_TIMEOUT):
+        logger.error("Mongo unreachable at startup; /health/ready reports not ready until it is")
+    broker_retry = None
+    if not await start_broker():
+        # come up not ready rather than not at all; the broker keeps retrying
+        broker_retry = asyncio.create_task(start_broker(BROKER_RETRY_SECONDS))
+    await reminder_scheduler.start()
+    # don't hold up startup for the index build and backfills
+    migrations_task = asyncio.create_task(bootstrap_database(DB_BOOTSTRAP_RETRY_SECONDS))
+    try:
+        yield
+    finally:
+        if broker_retry is not None:
+            broker_retry.cancel()
+        if migrations_task is not None and not migrations_task.done():
+            # safe to interrupt: every migration resumes where it stopped
+            migrations_task.cancel()
+            try:
+                await migrations_task
+            except asyncio.CancelledError:
+                pass
+        await reminder_scheduler.stop()
+        await broker.stop()
+        client.close()
+        password_hasher.shutdown()
+
+app = FastAPI(lifespan=lifespan)
 api_router = APIRouter(prefix="/api")
 
 JWT_SECRET = os.environ.get('JWT_SECRET', 'memora_secret_key_change_in_production')
 JWT_ALGORITHM = "HS256"
-pwd_context = CryptContext(schemes=["bcrypt"], deprecated="auto")
 security = HTTPBearer()
 
-# In-memory store of active websocket connections keyed by user_id
-# NOTE: For production use, replace with a distributed pub/sub (Redis, etc.)
-connected_users: Dict[str, List[WebSocket]] = {}
+# bcrypt runs on a bounded pool so logins don't block the event loop
+password_hasher = PasswordHasher(
+    max_workers=int(os.environ.get('PASSWORD_HASH_WORKERS', '4')),
+    executor=os.environ.get('PASSWORD_HASH_EXECUTOR', 'thread'),
+    max_queue=int(os.environ.get('PASSWORD_HASH_MAX_QUEUE', '64')),
+)
+
+# Websocket connections held by this worker, each with a bounded send queue.
+# Events are published on the broker so they reach sockets held by any worker.
+connections = ConnectionManager(
+    max_queue=int(os.environ.get('WS_SEND_QUEUE_SIZE', '100')),
+    policy=os.environ.get('WS_SLOW_CONSUMER_POLICY', 'drop_oldest'),
+    send_timeout=float(os.environ.get('WS_SEND_TIMEOUT', '5')),
+)
+
+async def deliver_local(user_id: str, event: dict):
+    if event.get('event') == 'friends_changed':
+        # published by whichever worker changed the friendship; drop our cached set too
+        friend_graph.invalidate(user_id)
+    connections.deliver(user_id, event)
+
+# Per-user friend sets so friendship checks on the messaging path skip Mongo
+friend_graph = FriendGraph(
+    None,
+    maxsize=int(os.environ.get('FRIEND_CACHE_SIZE', '10000')),
+    ttl=float(os.environ.get('FRIEND_CACHE_TTL', '60')),
+)
+
+broker = create_broker(None, deliver_local)
+
+# Fires reminder_due events; every worker runs one, the lease holder does the work
+reminder_scheduler = ReminderScheduler(
+    None,
+    broker.publish,
+    lease_ttl=float(os.environ.get('REMINDER_LEASE_SECONDS', '30')),
+    poll_interval=float(os.environ.get('REMINDER_POLL_SECONDS', '10')),
+)
+
+def bind_database(database):
+    """Point the module and its long-lived components at ``database``."""
+    global db, blob_store
+    db = database
+    blob_store = create_blob_store(db)
+    for component in (friend_graph, broker, reminder_scheduler):
+        component.db = db
 
 # Models
 class SignupRequest(BaseModel):
@@ -89,10 +251,60 @@ class NoteListItem(BaseModel):
     title: str
     created_at: datetime
 
+MAX_BATCH_OPERATIONS = 500
+
+class NoteBatchOperation(BaseModel):
+    op: Literal['create', 'update', 'delete']
+    id: Optional[str] = None
+    note: Optional[NoteCreate] = None
+
+class NoteBatchRequest(BaseModel):
+    operations: List[NoteBatchOperation] = Field(..., max_length=MAX_BATCH_OPERATIONS)
+
+class NoteBatchResult(BaseModel):
+    index: int
+    op: str
+    id: Optional[str] = None
+    status: str
+    note: Optional[Note] = None
+    detail: Optional[str] = None
+
+class NoteMultiGetRequest(BaseModel):
+    ids: List[str] = Field(..., max_length=MAX_BATCH_OPERATIONS)
+
+class NoteMultiGetResponse(BaseModel):
+    notes: List[Note]
+    missing: List[str]
+
+class NoteSearchHit(BaseModel):
+    id: str
+    title: str
+    created_at: datetime
+    score: float
+    snippet: str
+    # [start, end) offsets of matched words within snippet
+    highlights: List[List[int]]
+
+class NoteSearchResponse(BaseModel):
+    items: List[NoteSearchHit]
+    terms: List[str]
+
+class SyncResponse(BaseModel):
+    changes: Dict[str, List[dict]]
+    deleted: Dict[str, List[dict]]
+    cursor: int
+    has_more: bool
+
+class NoteListPage(BaseModel):
+    items: List[NoteListItem]
+    next_cursor: Optional[str] = None
+
 class ReminderCreate(BaseModel):
     title: str
     date: str
     note: Optional[str] = None
+    # the instant to fire at; derived from ``date`` (naive = UTC) when omitted
+    due_at: Optional[datetime] = None
 
 class Reminder(BaseModel):
     model_config = ConfigDict(extra="ignore")
@@ -101,8 +313,23 @@ class Reminder(BaseModel):
     title: str
     date: str
     note: Optional[str] = None
+    due_at: Optional[datetime] = None
     created_at: datetime = Field(default_factory=lambda: datetime.now(timezone.utc))
 
+# Lean list rows: list endpoints project exactly these fields and return
+# them without re-validation (see backend.responses)
+class ReminderListItem(BaseModel):
+    id: str
+    title: str
+    date: str
+    note: Optional[str] = None
+    due_at: Optional[datetime] = None
+    created_at: datetime
+
+class ReminderPage(BaseModel):
+    items: List[ReminderListItem]
+    next_cursor: Optional[str] = None
+
 class FriendRequest(BaseModel):
     friend_username: str
 
@@ -113,6 +340,11 @@ class Friend(BaseModel):
     friend_username: str
     added_at: datetime = Field(default_factory=lambda: datetime.now(timezone.utc))
 
+class FriendListItem(BaseModel):
+    id: str
+    friend_username: str
+    added_at: datetime
+
 class FriendRequest(BaseModel):
     model_config = ConfigDict(extra="ignore")
     id: str = Field(default_factory=lambda: str(uuid.uuid4()))
@@ -137,6 +369,21 @@ class Message(BaseModel):
     read_by: List[str] = Field(default_factory=list)
     created_at: datetime = Field(default_factory=lambda: datetime.now(timezone.utc))
 
+class MessageListItem(BaseModel):
+    id: str
+    from_user_id: str
+    to_user_id: str
+    content: str
+    read_by: List[str] = Field(default_factory=list)
+    created_at: datetime
+
+class ConversationPage(BaseModel):
+    items: List[MessageListItem]
+    # pass as ?before= for older messages; None once the start is reached
+    before_cursor: Optional[str] = None
+    # pass as ?after= to poll for newer messages
+    after_cursor: Optional[str] = None
+
 class PublicUser(BaseModel):
     username: str
     user_id: str
@@ -144,9 +391,36 @@ class PublicUser(BaseModel):
     created_at: datetime
 
 class ChecklistItemInput(BaseModel):
+    id: Optional[str] = None
+    text: str
+    checked: bool = False
+
+class ChecklistItem(BaseModel):
+    id: str = Field(default_factory=lambda: str(uuid.uuid4()))
     text: str
     checked: bool = False
 
+class ChecklistItemCreate(BaseModel):
+    text: str
+    checked: bool = False
+    # index to insert at; appended when omitted
+    position: Optional[int] = Field(default=None, ge=0)
+    expected_version: Optional[int] = None
+
+class ChecklistItemPatch(BaseModel):
+    text: Optional[str] = None
+    checked: Optional[bool] = None
+    expected_version: Optional[int] = None
+
+class ChecklistItemMove(BaseModel):
+    position: int = Field(..., ge=0)
+    expected_version: Optional[int] = None
+
+class ChecklistItemDelta(BaseModel):
+    item: Optional[ChecklistItem] = None
+    item_id: str
+    version: int
+
 class CheckboxNoteCreate(BaseModel):
     title: str
     items: List[ChecklistItemInput]
@@ -157,28 +431,146 @@ class CheckboxNote(BaseModel):
     user_id: str
     title: str
     items: List[dict]
+    # bumped on every change; item endpoints accept it as expected_version
+    version: int = 1
     created_at: datetime = Field(default_factory=lambda: datetime.now(timezone.utc))
 
+class CheckboxNoteListItem(BaseModel):
+    id: str
+    title: str
+    items: List[dict]
+    version: int = 1
+    created_at: datetime
+
+class CheckboxNotePage(BaseModel):
+    items: List[CheckboxNoteListItem]
+    next_cursor: Optional[str] = None
+
+def conversation_id(user_a: str, user_b: str) -> str:
+    """Canonical key shared by both directions of a conversation."""
+    return ':'.join(sorted((user_a, user_b)))
+
+# Pagination helpers
+DEFAULT_PAGE_SIZE = 50
+MAX_PAGE_SIZE = 200
+
+def encode_cursor(sort_value, doc_id: str) -> str:
+    if isinstance(sort_value, datetime):
+        sort_value = {'$date': sort_value.isoformat()}
+    raw = json.dumps([sort_value, doc_id], separators=(',', ':')).encode()
+    return base64.urlsafe_b64encode(raw).decode().rstrip('=')
+
+def decode_cursor(cursor: str):
+    try:
+        padded = cursor + '=' * (-len(cursor) % 4)
+        sort_value, doc_id = json.loads(base64.urlsafe_b64decode(padded.encode()))
+        if isinstance(sort_value, dict):
+            sort_value = datetime.fromisoformat(sort_value['$date'])
+        return sort_value, doc_id
+    except Exception:
+        raise HTTPException(status_code=400, detail="Invalid cursor")
+
+async def fetch_page(collection, query: dict, projection: dict, sort_field: str, direction: int,
+                     limit: int, cursor: Optional[str] = None):
+    """Keyset pagination over ``(sort_field, id)``.
+
+    Reads at most ``limit + 1`` documents from the index position after the
+    cursor, so every page costs the same no matter how deep it is.
+    """
+    query = dict(query)
+    if cursor:
+        sort_value, doc_id = decode_cursor(cursor)
+        op = '$lt' if direction < 0 else '$gt'
+        query['$or'] = [
+            {sort_field: {op: sort_value}},
+            {sort_field: sort_value, 'id': {op: doc_id}},
+        ]
+    docs = await collection.find(query, projection).sort(
+        [(sort_field, direction), ('id', direction)]
+    ).limit(limit + 1).to_list(limit + 1)
+
+    next_cursor = None
+    if len(docs) > limit:
+        docs = docs[:limit]
+        last = docs[-1]
+        next_cursor = encode_cursor(last[sort_field], last['id'])
+    return docs, next_cursor
+
+async def list_etag(collection: str, user_id: str, limit: int, cursor: Optional[str]) -> Optional[str]:
+    """ETag for a page of the user's ``collection``, None while a write may be in flight."""
+    seq = await settled_seq(db, user_id)
+    if seq is None:
+        return None
+    return make_etag(collection, user_id, seq, limit, cursor or "")
+
+# Blob helpers
+ATTACHMENT_ERRORS = (BlobTooLarge, ValueError)
+
+def attachment_error(exc: Exception) -> HTTPException:
+    if isinstance(exc, BlobTooLarge):
+        return HTTPException(status_code=413, detail="Attachment too large")
+    return HTTPException(status_code=400, detail="Invalid attachment data")
+
+async def store_attachments(attachments: Optional[List[dict]]) -> List[dict]:
+    """Move inline attachment data into the blob store; raises one of ATTACHMENT_ERRORS."""
+    return await externalize_attachments(blob_store, attachments)
+
 # Auth helpers
-def hash_password(password: str) -> str:
-    return pwd_context.hash(password)
+async def hash_password(password: str) -> str:
+    return await password_hasher.hash(password)
 
-def verify_password(plain_password: str, hashed_password: str) -> bool:
-    return pwd_context.verify(plain_password, hashed_password)
+async def verify_password(plain_password: str, hashed_password: str) -> bool:
+    return await password_hasher.verify(plain_password, hashed_password)
 
 def create_token(user_id: str, username: str) -> str:
     payload = {"user_id": user_id, "username": username}
     return jwt.encode(payload, JWT_SECRET, algorithm=JWT_ALGORITHM)
 
+# Verified tokens -> {"user_id", "username"}, and username -> {"id", "username"}.
+# Both are dropped by invalidate_user when a user's profile changes or the user is deleted.
+token_cache = TTLCache(
+    maxsize=int(os.environ.get('AUTH_CACHE_SIZE', '10000')),
+    ttl=float(os.environ.get('AUTH_CACHE_TTL', '300')),
+)
+user_cache = TTLCache(
+    maxsize=int(os.environ.get('USER_CACHE_SIZE', '10000')),
+    ttl=float(os.environ.get('USER_CACHE_TTL', '300')),
+)
+
+def decode_token(token: str) -> dict:
+    """Verify a JWT, skipping the HMAC check for tokens verified recently."""
+    cached = token_cache.get(token)
+    if cached is not None:
+        return cached
+    payload = jwt.decode(token, JWT_SECRET, algorithms=[JWT_ALGORITHM])
+    user_id = payload.get("user_id")
+    if not user_id:
+        raise jwt.InvalidTokenError("missing user_id")
+    user = {"user_id": user_id, "username": payload.get("username")}
+    ttl = None
+    if payload.get("exp"):
+        ttl = payload["exp"] - datetime.now(timezone.utc).timestamp()
+    token_cache.set(token, user, ttl=ttl)
+    return user
+
+async def resolve_user(username: str) -> Optional[dict]:
+    """Look up {"id", "username"} for a username; only hits Mongo on a cache miss."""
+    user = user_cache.get(username)
+    if user is None:
+        user = await db.users.find_one({'username': username}, {'_id': 0, 'id': 1, 'username': 1})
+        if user:
+            user_cache.set(username, user)
+    return user
+
+def invalidate_user(user_id: str, username: Optional[str] = None):
+    if username:
+        user_cache.pop(username)
+    user_cache.discard_where(lambda _, user: user['id'] == user_id)
+    token_cache.discard_where(lambda _, user: user['user_id'] == user_id)
+
 async def get_current_user(credentials: HTTPAuthorizationCredentials = Depends(security)):
     try:
-        token = credentials.credentials
-        payload = jwt.decode(token, JWT_SECRET, algorithms=[JWT_ALGORITHM])
-        user_id = payload.get("user_id")
-        username = payload.get("username")
-        if not user_id:
-            raise HTTPException(status_code=401, detail="Invalid token")
-        return {"user_id": user_id, "username": username}
+        return decode_token(credentials.credentials)
     except jwt.ExpiredSignatureError:
         raise HTTPException(status_code=401, detail="Token expired")
     except jwt.InvalidTokenError:
@@ -199,19 +591,21 @@ async def signup(req: SignupRequest):
         user = User(
             username=req.username,
             email=req.email,
-            password_hash=hash_password(req.password)
+            password_hash=await hash_password(req.password)
         )
         user_dict = user.model_dump()
-        user_dict['created_at'] = user_dict['created_at'].isoformat()
 
         try:
             await db.users.insert_one(user_dict)
+        except DuplicateKeyError:
+            # unique index on users.username: a concurrent signup won the race
+            raise HTTPException(status_code=400, detail="Username already exists")
         except ServerSelectionTimeoutError:
             raise HTTPException(status_code=503, detail="Database unavailable")
 
         token = create_token(user.id, user.username)
         return AuthResponse(token=token, username=user.username, user_id=user.id)
-    except HTTPException:
+    except (HTTPException, PasswordPoolSaturated):
         raise
     except Exception as e:
         logger.exception("Unhandled exception in signup")
@@ -228,12 +622,12 @@ async def login(req: LoginRequest):
         if not user_dict:
             raise HTTPException(status_code=401, detail="Invalid username or password")
         
-        if not verify_password(req.password, user_dict['password_hash']):
+        if not await verify_password(req.password, user_dict['password_hash']):
             raise HTTPException(status_code=401, detail="Invalid username or password")
         
         token = create_token(user_dict['id'], user_dict['username'])
         return AuthResponse(token=token, username=user_dict['username'], user_id=user_dict['id'])
-    except HTTPException:
+    except (HTTPException, PasswordPoolSaturated):
         raise
     except Exception as e:
         logger.exception("Unhandled exception in login")
@@ -261,106 +655,276 @@ async def upload_avatar(payload: AvatarUpdate, current_user: dict = Depends(get_
     if not avatar_data or not isinstance(avatar_data, str):
         raise HTTPException(status_code=400, detail="Invalid avatar data")
 
-    await db.users.update_one({"id": current_user["user_id"]}, {"$set": {"avatar": avatar_data}})
-    return JSONResponse(status_code=200, content={"status": "ok", "avatar": avatar_data})
+    try:
+        _, data = decode_data_url(avatar_data)
+        if len(data) > AVATAR_MAX_BYTES:
+            raise BlobTooLarge()
+        avatar_fields = await store_avatar(blob_store, current_user["username"], data)
+    except BlobTooLarge:
+        raise HTTPException(status_code=413, detail="Avatar too large")
+    except ValueError:
+        raise HTTPException(status_code=400, detail="Invalid avatar data")
+
+    await db.users.update_one(
+        {"id": current_user["user_id"]},
+        {"$set": avatar_fields, "$unset": {"avatar_blob_id": ""}}
+    )
+    invalidate_user(current_user["user_id"], current_user["username"])
+    return JSONResponse(status_code=200, content={"status": "ok", "avatar": avatar_fields["avatar"]})
 
 
 @api_router.delete("/users/me/avatar")
 async def delete_avatar(current_user: dict = Depends(get_current_user)):
-    await db.users.update_one({"id": current_user["user_id"]}, {"$unset": {"avatar": ""}})
+    await db.users.update_one(
+        {"id": current_user["user_id"]},
+        {"$unset": {"avatar": "", "avatar_blob_id": "", "avatar_thumbs": "", "avatar_hash": ""}}
+    )
+    invalidate_user(current_user["user_id"], current_user["username"])
     return JSONResponse(status_code=200, content={"status": "deleted"})
 
 # Notes routes
-@api_router.post("/notes", response_model=Note)
-async def create_note(note: NoteCreate, current_user: dict = Depends(get_current_user)):
+async def build_note(user_id: str, note: NoteCreate):
+    """Return the Note model and the document to insert for a new note."""
     new_note = Note(
-        user_id=current_user["user_id"],
+        user_id=user_id,
         title=note.title,
         content=note.content,
         theme=note.theme,
         font=note.font,
-        attachments=note.attachments or []
+        attachments=await store_attachments(note.attachments)
     )
     note_dict = new_note.model_dump()
-    note_dict['created_at'] = note_dict['created_at'].isoformat()
+    note_dict['month_day'] = month_day_key(note_dict['created_at'])
+    note_dict['search'] = index_fields(note.title, note.content)
+    return new_note, note_dict
+
+async def note_update_fields(note_update: NoteCreate) -> dict:
+    update_payload = {
+        "title": note_update.title,
+        "content": note_update.content,
+        "search": index_fields(note_update.title, note_update.content),
+    }
+    if hasattr(note_update, 'theme'):
+        update_payload['theme'] = note_update.theme
+    if hasattr(note_update, 'font'):
+        update_payload['font'] = note_update.font
+    if hasattr(note_update, 'attachments') and note_update.attachments is not None:
+        update_payload['attachments'] = await store_attachments(note_update.attachments)
+    return update_payload
+
+@api_router.post("/notes", response_model=Note)
+async def create_note(note: NoteCreate, current_user: dict = Depends(get_current_user)):
+    try:
+        new_note, note_dict = await build_note(current_user["user_id"], note)
+    except ATTACHMENT_ERRORS as exc:
+        raise attachment_error(exc)
+    note_dict.update(await stamp(db, current_user["user_id"]))
     await db.notes.insert_one(note_dict)
     return new_note
 
-@api_router.get("/notes", response_model=List[NoteListItem])
-async def get_notes(current_user: dict = Depends(get_current_user)):
-    notes = await db.notes.find(
+@api_router.post("/notes/batch", response_model=List[NoteBatchResult])
+async def batch_notes(batch: NoteBatchRequest, current_user: dict = Depends(get_current_user)):
+    """Apply mixed create/update/delete operations with a single bulk_write.
+
+    Updates and deletes of notes the user doesn't own come back as not_found;
+    one failing item doesn't stop the others.  Writes are unordered, so a note
+    may only be targeted once per batch.
+    """
+    user_id = current_user["user_id"]
+    results: List[Optional[dict]] = [None] * len(batch.operations)
+
+    # (index, op, note id, document or $set fields) for every valid item
+    pending, seen = [], set()
+    for index, item in enumerate(batch.operations):
+        result = {"index": index, "op": item.op, "id": item.id}
+        if item.op == 'create':
+            if item.note is None:
+                results[index] = {**result, "status": "invalid", "detail": "note is required"}
+                continue
+            try:
+                new_note, note_dict = await build_note(user_id, item.note)
+            except ATTACHMENT_ERRORS as exc:
+                results[index] = {**result, "status": "invalid", "detail": attachment_error(exc).detail}
+                continue
+            pending.append((index, 'create', new_note.id, note_dict))
+            results[index] = {**result, "id": new_note.id, "status": "created", "note": new_note}
+        else:
+            if not item.id or (item.op == 'update' and item.note is None):
+                results[index] = {**result, "status": "invalid", "detail": "id and note are required"}
+                continue
+            if item.id in seen:
+                results[index] = {**result, "status": "invalid", "detail": "note already targeted in this batch"}
+                continue
+            if item.op == 'update':
+                try:
+                    fields = await note_update_fields(item.note)
+                except ATTACHMENT_ERRORS as exc:
+                    results[index] = {**result, "status": "invalid", "detail": attachment_error(exc).detail}
+                    continue
+                pending.append((index, 'update', item.id, fields))
+                results[index] = {**result, "status": "updated"}
+            else:
+                pending.append((index, 'delete', item.id, {}))
+                results[index] = {**result, "status": "deleted"}
+            seen.add(item.id)
+
+    # note id -> (result index, seq) of every update and delete sent
+    requests, request_index, targets = [], [], {}
+    if pending:
+        # one block of sequence numbers for the writes that will actually be sent
+        first_seq, updated_at = await reserve_seq(db, user_id, len(pending)), utcnow()
+        for offset, (index, op, note_id, payload) in enumerate(pending):
+            sync_fields = {"seq": first_seq + offset, "updated_at": updated_at}
+            if op == 'create':
+                requests.append(InsertOne({**payload, **sync_fields}))
+            else:
+                # a delete only stamps the note here; the stamp shows which notes this batch matched
+                requests.append(UpdateOne({"id": note_id, "user_id": user_id}, {"$set": {**payload, **sync_fields}}))
+                targets[note_id] = (index, sync_fields["seq"])
+            request_index.append(index)
+
+    if requests:
+        try:
+            matched = (await db.notes.bulk_write(requests, ordered=False)).matched_count
+        except BulkWriteError as exc:
+            matched = exc.details.get('nMatched', 0)
+            for error in exc.details.get('writeErrors', []):
+                index = request_index[error['index']]
+                results[index] = {**results[index], "status": "error", "note": None, "detail": error.get('errmsg')}
+        targets = {note_id: target for note_id, target in targets.items() if results[target[0]]['status'] != 'error'}
+        if matched < len(targets):
+            # some notes were missing, someone else's or deleted meanwhile: find which by their stamp
+            docs = await db.notes.find(
+                {"id": {"$in": list(targets)}, "user_id": user_id}, {"_id": 0, "id": 1, "seq": 1}
+            ).to_list(None)
+            stamped = {doc['id'] for doc in docs if doc.get('seq', 0) >= targets[doc['id']][1]}
+            for note_id, (index, _) in targets.items():
+                if note_id not in stamped:
+                    results[index] = {**results[index], "status": "not_found"}
+        deleted = [result['id'] for result in results if result['status'] == 'deleted']
+        if deleted:
+            await db.notes.delete_many({"id": {"$in": deleted}, "user_id": user_id})
+            await record_deletes(db, user_id, "notes", deleted)
+    return results
+
+@api_router.post("/notes/batch/get", response_model=NoteMultiGetResponse)
+async def get_notes_by_ids(req: NoteMultiGetRequest, current_user: dict = Depends(get_current_user)):
+    """Fetch several full notes in one query, in the order requested."""
+    docs = await db.notes.find(
+        {"id": {"$in": req.ids}, "user_id": current_user["user_id"]}, {"_id": 0, "search": 0}
+    ).to_list(None)
+    by_id = {doc['id']: doc for doc in docs}
+    return {
+        "notes": [by_id[note_id] for note_id in dict.fromkeys(req.ids) if note_id in by_id],
+        "missing": [note_id for note_id in dict.fromkeys(req.ids) if note_id not in by_id],
+    }
+
+@api_router.get("/notes", response_model=NoteListPage)
+async def get_notes(
+    limit: int = Query(DEFAULT_PAGE_SIZE, ge=1, le=MAX_PAGE_SIZE),
+    cursor: Optional[str] = None,
+    if_none_match: Optional[str] = Header(None),
+    current_user: dict = Depends(get_current_user),
+):
+    etag = await list_etag("notes", current_user["user_id"], limit, cursor)
+    if etag and etag_matches(if_none_match, etag):
+        return not_modified(etag)
+    notes, next_cursor = await fetch_page(
+        db.notes,
         {"user_id": current_user["user_id"]},
-        {"_id": 0, "id": 1, "title": 1, "created_at": 1}
-    ).sort("created_at", -1).to_list(1000)
-    
-    for note in notes:
-        if isinstance(note['created_at'], str):
-            note['created_at'] = datetime.fromisoformat(note['created_at'])
-    
-    return notes
+        projection_for(NoteListItem),
+        "created_at", -1, limit, cursor,
+    )
+
+    return FastJSONResponse(
+        {"items": with_defaults(NoteListItem, notes), "next_cursor": next_cursor}, headers=etag_headers(etag)
+    )
+
+@api_router.get("/notes/search", response_model=NoteSearchResponse)
+async def search_notes_endpoint(
+    q: str = Query(..., min_length=1, max_length=200),
+    limit: int = Query(20, ge=1, le=100),
+    current_user: dict = Depends(get_current_user),
+):
+    """Rank the user's notes against ``q``; every word also matches as a prefix."""
+    hits, terms = await search_notes(db, current_user["user_id"], q, limit)
+    if not hits:
+        return {"items": [], "terms": terms}
+    docs = await db.notes.find(
+        {"id": {"$in": [hit['id'] for hit in hits]}, "user_id": current_user["user_id"]},
+        {"_id": 0, "id": 1, "title": 1, "content": 1, "created_at": 1},
+    ).to_list(None)
+    by_id = {doc['id']: doc for doc in docs}
+
+    items = []
+    for hit in hits:
+        doc = by_id.get(hit['id'])
+        if not doc:
+            continue
+        text, highlights = snippet(doc.get('content'), terms)
+        items.append({
+            "id": doc['id'],
+            "title": doc['title'],
+            "created_at": doc['created_at'],
+            "score": hit['score'],
+            "snippet": text,
+            "highlights": highlights,
+        })
+    return {"items": items, "terms": terms}
 
 @api_router.get("/notes/{note_id}", response_model=Note)
-async def get_note(note_id: str, current_user: dict = Depends(get_current_user)):
-    note = await db.notes.find_one({"id": note_id, "user_id": current_user["user_id"]}, {"_id": 0})
+async def get_note(
+    note_id: str,
+    response: Response,
+    if_none_match: Optional[str] = Header(None),
+    current_user: dict = Depends(get_current_user),
+):
+    note_filter = {"id": note_id, "user_id": current_user["user_id"]}
+    if if_none_match:
+        # revalidation: check the version before reading the content
+        current = await db.notes.find_one(note_filter, {"_id": 0, "id": 1, "seq": 1, "updated_at": 1, "created_at": 1})
+        if not current:
+            raise HTTPException(status_code=404, detail="Note not found")
+        if etag_matches(if_none_match, document_etag(current)):
+            return not_modified(document_etag(current))
+
+    note = await db.notes.find_one(note_filter, {"_id": 0, "search": 0})
     if not note:
         raise HTTPException(status_code=404, detail="Note not found")
-    
-    if isinstance(note['created_at'], str):
-        note['created_at'] = datetime.fromisoformat(note['created_at'])
-    
+
+    response.headers.update(etag_headers(document_etag(note)))
     return note
 
 @api_router.get("/notes/on-this-day/list", response_model=List[NoteListItem])
 async def get_on_this_day_notes(current_user: dict = Depends(get_current_user)):
     now = datetime.now(timezone.utc)
-    current_month = now.month
-    current_day = now.day
-    current_year = now.year
-    
-    all_notes = await db.notes.find(
-        {"user_id": current_user["user_id"]},
-        {"_id": 0}
-    ).to_list(10000)
-    
-    matching_notes = []
-    for note in all_notes:
-        created_at = note['created_at']
-        if isinstance(created_at, str):
-            created_at = datetime.fromisoformat(created_at)
-        
-        if created_at.month == current_month and created_at.day == current_day and created_at.year != current_year:
-            matching_notes.append({
-                "id": note['id'],
-                "title": note['title'],
-                "created_at": created_at
-            })
-    
-    matching_notes.sort(key=lambda x: x['created_at'], reverse=True)
-    return matching_notes
+    start_of_year = datetime(now.year, 1, 1, tzinfo=timezone.utc)
+
+    # Served by the (user_id, month_day, created_at) index; earlier years only
+    matching_notes = await db.notes.find(
+        {"user_id": current_user["user_id"], "month_day": month_day_key(now), "created_at": {"$lt": start_of_year}},
+        projection_for(NoteListItem)
+    ).sort("created_at", -1).to_list(1000)
+
+    return FastJSONResponse(with_defaults(NoteListItem, matching_notes))
 
 # Update an existing note
 @api_router.put("/notes/{note_id}", response_model=Note)
 async def update_note(note_id: str, note_update: NoteCreate, current_user: dict = Depends(get_current_user)):
-    existing_note = await db.notes.find_one({"id": note_id, "user_id": current_user["user_id"]}, {"_id": 0})
-    if not existing_note:
-        raise HTTPException(status_code=404, detail="Note not found")
-
-    update_payload = {"title": note_update.title, "content": note_update.content}
-    if hasattr(note_update, 'theme'):
-        update_payload['theme'] = note_update.theme
-    if hasattr(note_update, 'font'):
-        update_payload['font'] = note_update.font
-    if hasattr(note_update, 'attachments') and note_update.attachments is not None:
-        update_payload['attachments'] = note_update.attachments
+    try:
+        update_payload = await note_update_fields(note_update)
+    except ATTACHMENT_ERRORS as exc:
+        raise attachment_error(exc)
 
-    await db.notes.update_one(
-        {"id": note_id},
-        {"$set": update_payload}
+    # Ownership check, write and re-read in one atomic round-trip
+    updated_note = await db.notes.find_one_and_update(
+        {"id": note_id, "user_id": current_user["user_id"]},
+        {"$set": {**update_payload, **await stamp(db, current_user["user_id"])}},
+        projection={"_id": 0, "search": 0},
+        return_document=ReturnDocument.AFTER,
     )
-
-    updated_note = await db.notes.find_one({"id": note_id}, {"_id": 0})
-    if isinstance(updated_note['created_at'], str):
-        updated_note['created_at'] = datetime.fromisoformat(updated_note['created_at'])
+    if not updated_note:
+        raise HTTPException(status_code=404, detail="Note not found")
 
     # Ensure attachments and theme fields exist
     updated_note.setdefault('attachments', [])
@@ -371,11 +935,12 @@ async def update_note(note_id: str, note_update: NoteCreate, current_user: dict
 # Delete an existing note
 @api_router.delete("/notes/{note_id}")
 async def delete_note(note_id: str, current_user: dict = Depends(get_current_user)):
-    existing_note = await db.notes.find_one({"id": note_id, "user_id": current_user["user_id"]}, {"_id": 0})
+    existing_note = await db.notes.find_one({"id": note_id, "user_id": current_user["user_id"]}, {"_id": 1})
     if not existing_note:
         raise HTTPException(status_code=404, detail="Note not found")
 
     await db.notes.delete_one({"id": note_id})
+    await record_deletes(db, current_user["user_id"], "notes", [note_id])
 
     return JSONResponse(status_code=200, content={"status": "deleted"})
 
@@ -389,76 +954,182 @@ async def delete_note_post(note_id: str, current_user: dict = Depends(get_curren
     return await delete_note(note_id, current_user)
     return matching_notes
 
+# Blob routes
+@api_router.post("/blobs")
+async def upload_blob(request: Request, current_user: dict = Depends(get_current_user)):
+    """Stream the raw request body into the blob store."""
+    content_type = request.headers.get("content-type", "application/octet-stream")
+    declared = request.headers.get("content-length")
+    if declared and declared.isdigit() and blob_store.max_bytes is not None and int(declared) > blob_store.max_bytes:
+        # refuse before a single chunk is stored
+        raise HTTPException(status_code=413, detail="Upload too large")
+    try:
+        manifest = await blob_store.put_stream(request.stream(), content_type)
+    except BlobTooLarge:
+        raise HTTPException(status_code=413, detail="Upload too large")
+    return {"blob_id": manifest['id'], "url": blob_url(manifest['id']), "size": manifest['size'],
+            "content_type": manifest['content_type']}
+
+@api_router.get("/blobs/{blob_id}")
+async def download_blob(blob_id: str, request: Request):
+    # Unauthenticated so <img>/<video> tags can load it; ids are sha256 content hashes
+    manifest = await blob_store.get_manifest(blob_id)
+    if not manifest:
+        raise HTTPException(status_code=404, detail="Blob not found")
+
+    size = manifest['size']
+    etag = f'"{blob_id}"'
+    # the uploader picked the content type; never let it make the API origin run script
+    media_type, inline = served_content_type(manifest['content_type'])
+    headers = {
+        "ETag": etag,
+        "Accept-Ranges": "bytes",
+        "Cache-Control": "private, max-age=31536000, immutable",
+        "X-Content-Type-Options": "nosniff",
+    }
+    if not inline:
+        headers["Content-Disposition"] = "attachment"
+    if etag_matches(request.headers.get("if-none-match"), etag):
+        return Response(status_code=304, headers=headers)
+
+    try:
+        byte_range = parse_range(request.headers.get("range"), size)
+    except ValueError:
+        return Response(status_code=416, headers={**headers, "Content-Range": f"bytes */{size}"})
+    if request.headers.get("if-range") not in (None, etag):
+        byte_range = None
+
+    if size == 0:
+        return Response(content=b"", media_type=media_type, headers=headers)
+    if byte_range is None:
+        start, end, status_code = 0, size - 1, 200
+    else:
+        (start, end), status_code = byte_range, 206
+        headers["Content-Range"] = f"bytes {start}-{end}/{size}"
+    headers["Content-Length"] = str(end - start + 1)
+    return StreamingResponse(
+        blob_store.iter_range(manifest, start, end),
+        status_code=status_code,
+        media_type=media_type,
+        headers=headers,
+    )
+
+@api_router.get("/users/{username}/avatar")
+async def get_avatar(
+    username: str,
+    request: Request,
+    size: int = Query(DEFAULT_AVATAR_SIZE, ge=1, le=1024),
+    v: Optional[str] = None,
+):
+    # Unauthenticated like /blobs so <img> tags can load it
+    user = await db.users.find_one({"username": username}, {"_id": 0, "avatar_thumbs": 1, "avatar_hash": 1})
+    chosen = pick_size((user or {}).get("avatar_thumbs") or {}, size)
+    if chosen is None:
+        raise HTTPException(status_code=404, detail="Avatar not found")
+
+    blob_id = user["avatar_thumbs"][chosen]
+    etag = f'"{blob_id}"'
+    # only the hashed URL handed out in profiles is immutable; a bare or stale one must revalidate
+    cache_control = "public, max-age=31536000, immutable" if v == user.get("avatar_hash") else "public, no-cache"
+    headers = {"ETag": etag, "Cache-Control": cache_control}
+    if etag_matches(request.headers.get("if-none-match"), etag):
+        return Response(status_code=304, headers=headers)
+
+    manifest = await blob_store.get_manifest(blob_id)
+    if not manifest:
+        raise HTTPException(status_code=404, detail="Avatar not found")
+    # thumbnails are always WebP, but one stored under some other type must not render as a page
+    media_type, _ = served_content_type(manifest["content_type"])
+    headers["Content-Length"] = str(manifest["size"])
+    headers["X-Content-Type-Options"] = "nosniff"
+    return StreamingResponse(
+        blob_store.iter_range(manifest, 0, manifest["size"] - 1),
+        media_type=media_type,
+        headers=headers,
+    )
+
 # Reminders routes
+def reminder_due_at(reminder: ReminderCreate) -> Optional[datetime]:
+    if reminder.due_at is None:
+        return parse_due_at(reminder.date)
+    if reminder.due_at.tzinfo is None:
+        return reminder.due_at.replace(tzinfo=timezone.utc)
+    return reminder.due_at.astimezone(timezone.utc)
+
 @api_router.post("/reminders", response_model=Reminder)
 async def create_reminder(reminder: ReminderCreate, current_user: dict = Depends(get_current_user)):
     new_reminder = Reminder(
         user_id=current_user["user_id"],
         title=reminder.title,
         date=reminder.date,
-        note=reminder.note
+        note=reminder.note,
+        due_at=reminder_due_at(reminder),
     )
     reminder_dict = new_reminder.model_dump()
-    reminder_dict['created_at'] = reminder_dict['created_at'].isoformat()
+    reminder_dict.update(due_fields(new_reminder.due_at))
+    reminder_dict.update(await stamp(db, current_user["user_id"]))
     await db.reminders.insert_one(reminder_dict)
+    reminder_scheduler.wake()
     return new_reminder
 
-@api_router.get("/reminders", response_model=List[Reminder])
-async def get_reminders(current_user: dict = Depends(get_current_user)):
-    reminders = await db.reminders.find(
+@api_router.get("/reminders", response_model=ReminderPage)
+async def get_reminders(
+    limit: int = Query(DEFAULT_PAGE_SIZE, ge=1, le=MAX_PAGE_SIZE),
+    cursor: Optional[str] = None,
+    if_none_match: Optional[str] = Header(None),
+    current_user: dict = Depends(get_current_user),
+):
+    etag = await list_etag("reminders", current_user["user_id"], limit, cursor)
+    if etag and etag_matches(if_none_match, etag):
+        return not_modified(etag)
+    reminders, next_cursor = await fetch_page(
+        db.reminders,
         {"user_id": current_user["user_id"]},
-        {"_id": 0}
-    ).sort("date", 1).to_list(1000)
-    
-    for reminder in reminders:
-        if isinstance(reminder['created_at'], str):
-            reminder['created_at'] = datetime.fromisoformat(reminder['created_at'])
-    
-    return reminders
+        projection_for(ReminderListItem),
+        "date", 1, limit, cursor,
+    )
+
+    return FastJSONResponse(
+        {"items": with_defaults(ReminderListItem, reminders), "next_cursor": next_cursor}, headers=etag_headers(etag)
+    )
 
 @api_router.put("/reminders/{reminder_id}", response_model=Reminder)
 async def update_reminder(reminder_id: str, reminder_update: ReminderCreate, current_user: dict = Depends(get_current_user)):
-    existing = await db.reminders.find_one({"id": reminder_id, "user_id": current_user["user_id"]}, {"_id": 0})
-    if not existing:
-        raise HTTPException(status_code=404, detail="Reminder not found")
-
     update_payload = {"title": reminder_update.title, "date": reminder_update.date, "note": reminder_update.note}
-    await db.reminders.update_one({"id": reminder_id}, {"$set": update_payload})
-
-    updated = await db.reminders.find_one({"id": reminder_id}, {"_id": 0})
-    if isinstance(updated['created_at'], str):
-        updated['created_at'] = datetime.fromisoformat(updated['created_at'])
+    update_payload.update(due_fields(reminder_due_at(reminder_update)))
+    updated = await db.reminders.find_one_and_update(
+        {"id": reminder_id, "user_id": current_user["user_id"]},
+        {"$set": {**update_payload, **await stamp(db, current_user["user_id"])}},
+        projection={"_id": 0},
+        return_document=ReturnDocument.AFTER,
+    )
+    if not updated:
+        raise HTTPException(status_code=404, detail="Reminder not found")
+    reminder_scheduler.wake()
 
     return updated
 
 @api_router.delete("/reminders/{reminder_id}")
 async def delete_reminder(reminder_id: str, current_user: dict = Depends(get_current_user)):
-    logger.info(f"delete_reminder called: id={reminder_id} user={current_user}")
-    existing = await db.reminders.find_one({"id": reminder_id, "user_id": current_user["user_id"]}, {"_id": 0})
-    logger.info(f"delete lookup result: {existing}")
-    if not existing:
+    result = await db.reminders.delete_one({"id": reminder_id, "user_id": current_user["user_id"]})
+    if not result.deleted_count:
         raise HTTPException(status_code=404, detail="Reminder not found")
 
-    await db.reminders.delete_one({"id": reminder_id})
-    logger.info(f"deleted reminder {reminder_id}")
+    await record_deletes(db, current_user["user_id"], "reminders", [reminder_id])
     return JSONResponse(status_code=200, content={"status": "deleted"})
 
 # Friends routes
 @api_router.post("/friends", response_model=Friend)
 async def add_friend(friend_req: FriendRequest, current_user: dict = Depends(get_current_user)):
     """Compatibility endpoint: instead of immediately creating a friend link, create a FriendRequest so the recipient can accept."""
-    recipient = await db.users.find_one({"username": friend_req.friend_username}, {"_id": 0})
+    recipient = await resolve_user(friend_req.friend_username)
     if not recipient:
         raise HTTPException(status_code=404, detail="User not found")
 
     if recipient['id'] == current_user['user_id']:
         raise HTTPException(status_code=400, detail="Cannot add yourself as friend")
 
-    existing_friend = await db.friends.find_one({
-        "user_id": current_user["user_id"],
-        "friend_username": friend_req.friend_username
-    }, {"_id": 0})
-    if existing_friend:
+    if await friend_graph.is_friend(current_user["user_id"], friend_req.friend_username):
         raise HTTPException(status_code=400, detail="Friend already added")
 
     # If request already exists (pending), return it
@@ -473,34 +1144,85 @@ async def add_friend(friend_req: FriendRequest, current_user: dict = Depends(get
         to_username=recipient['username'],
     )
     req_dict = new_req.model_dump()
-    req_dict['created_at'] = req_dict['created_at'].isoformat()
     await db.friend_requests.insert_one(req_dict)
     logger.info(f"Friend request created from {current_user['username']} to {recipient['username']}")
     return JSONResponse(status_code=200, content={"status": "request_sent"})
 
 @api_router.get('/users/{username}', response_model=PublicUser)
 async def get_public_user(username: str, current_user: dict = Depends(get_current_user)):
-    lg = logging.getLogger(__name__)
-    lg.info(f"get_public_user requested by user_id={current_user.get('user_id')} for username={username}")
-    user = await db.users.find_one({'username': username}, {'_id': 0, 'password_hash': 0})
+    user = await db.users.find_one(
+        {'username': username}, {'_id': 0, 'id': 1, 'username': 1, 'avatar': 1, 'created_at': 1}
+    )
     if not user:
-        lg.warning(f"get_public_user: user not found username={username} requested_by={current_user.get('user_id')}")
         raise HTTPException(status_code=404, detail='User not found')
-    lg.info(f"get_public_user: found username={username}")
-    user.setdefault('avatar', None)
-    if isinstance(user['created_at'], str):
-        user['created_at'] = datetime.fromisoformat(user['created_at'])
     return PublicUser(username=user['username'], user_id=user['id'], avatar=user.get('avatar'), created_at=user['created_at'])
 
+# Unread counters: one document per recipient, {_id: user_id, counts: {sender_id: n},
+# usernames: {sender_id: username}}, kept up to date by send_message and mark-read.
+async def increment_unread(recipient_id: str, sender_id: str, sender_username: str):
+    await db.unread_counters.update_one(
+        {'_id': recipient_id},
+        {'$inc': {f'counts.{sender_id}': 1}, '$set': {f'usernames.{sender_id}': sender_username}},
+        upsert=True,
+    )
+
+async def mark_conversation_read(user_id: str, friend_id: str) -> int:
+    """Mark everything friend_id sent to user_id as read and update the counter."""
+    result = await db.messages.update_many(
+        {'from_user_id': friend_id, 'to_user_id': user_id, 'read_by': {'$ne': user_id}},
+        {'$addToSet': {'read_by': user_id}}
+    )
+    if result.modified_count:
+        # Decrement rather than reset so a message landing mid-update stays counted
+        await db.unread_counters.update_one(
+            {'_id': user_id}, {'$inc': {f'counts.{friend_id}': -result.modified_count}}
+        )
+        await db.unread_counters.update_one(
+            {'_id': user_id, f'counts.{friend_id}': {'$lte': 0}},
+            {'$unset': {f'counts.{friend_id}': '', f'usernames.{friend_id}': ''}}
+        )
+    return result.modified_count
+
+async def rebuild_unread_counter(user_id: str) -> dict:
+    """Recount unread messages for a user with one aggregate and one batched user lookup."""
+    pipeline = [
+        {'$match': {'to_user_id': user_id, 'read_by': {'$ne': user_id}}},
+        {'$group': {'_id': '$from_user_id', 'count': {'$sum': 1}}}
+    ]
+    agg = await db.messages.aggregate(pipeline).to_list(None)
+    users = await db.users.find(
+        {'id': {'$in': [row['_id'] for row in agg]}}, {'_id': 0, 'id': 1, 'username': 1}
+    ).to_list(None)
+    usernames = {u['id']: u['username'] for u in users}
+    counter = {
+        'counts': {row['_id']: row['count'] for row in agg if row['_id'] in usernames},
+        'usernames': usernames,
+        'initialized': True,
+    }
+    await db.unread_counters.update_one({'_id': user_id}, {'$set': counter}, upsert=True)
+    return counter
+
+@api_router.get('/messages/unread_counts')
+async def get_unread_counts(current_user: dict = Depends(get_current_user)):
+    counter = await db.unread_counters.find_one({'_id': current_user['user_id']})
+    if not counter or not counter.get('initialized'):
+        # First read for this user (or counter created by an $inc upsert): seed it from messages
+        counter = await rebuild_unread_counter(current_user['user_id'])
+    usernames = counter.get('usernames', {})
+    return [
+        {'friend_user_id': friend_id, 'friend_username': usernames.get(friend_id), 'count': count}
+        for friend_id, count in counter.get('counts', {}).items()
+        if count > 0
+    ]
+
 @api_router.post('/messages', response_model=Message)
 async def send_message(payload: MessageCreate, current_user: dict = Depends(get_current_user)):
     # Only allow messaging between friends (current_user has added recipient)
-    recipient = await db.users.find_one({'username': payload.to_username}, {'_id': 0})
+    recipient = await resolve_user(payload.to_username)
     if not recipient:
         raise HTTPException(status_code=404, detail='Recipient not found')
 
-    friend_link = await db.friends.find_one({'user_id': current_user['user_id'], 'friend_username': payload.to_username}, {'_id': 0})
-    if not friend_link:
+    if not await friend_graph.is_friend(current_user['user_id'], payload.to_username):
         raise HTTPException(status_code=403, detail='You can only message users you have added as friends')
 
     new_msg = Message(
@@ -510,116 +1232,92 @@ async def send_message(payload: MessageCreate, current_user: dict = Depends(get_
         read_by=[]
     )
     msg_dict = new_msg.model_dump()
-    msg_dict['created_at'] = msg_dict['created_at'].isoformat()
     msg_dict['read_by'] = []
+    msg_dict['conversation_id'] = conversation_id(current_user['user_id'], recipient['id'])
     await db.messages.insert_one(msg_dict)
+    await increment_unread(recipient['id'], current_user['user_id'], current_user['username'])
 
     # Broadcast the new message to any connected websocket sessions of the recipient
     try:
-        recipient_id = recipient['id']
-        event_payload = {"event": "new_message", "payload": msg_dict}
-        for ws in connected_users.get(recipient_id, []):
-            try:
-                await ws.send_json(event_payload)
-            except Exception:
-                # ignore per-connection failures; they'll be cleaned on disconnect
-                pass
+        payload = {**new_msg.model_dump(mode='json'), 'conversation_id': msg_dict['conversation_id']}
+        await broker.publish(recipient['id'], {"event": "new_message", "payload": payload})
     except Exception:
         logger.exception("Failed to broadcast message via websocket")
 
     return new_msg
 
-@api_router.get('/messages/{friend_username}', response_model=List[Message])
-async def get_conversation(friend_username: str, current_user: dict = Depends(get_current_user)):
-    friend_user = await db.users.find_one({'username': friend_username}, {'_id': 0})
+@api_router.get('/messages/{friend_username}', response_model=ConversationPage)
+async def get_conversation(
+    friend_username: str,
+    before: Optional[str] = None,
+    after: Optional[str] = None,
+    limit: int = Query(DEFAULT_PAGE_SIZE, ge=1, le=MAX_PAGE_SIZE),
+    current_user: dict = Depends(get_current_user),
+):
+    if before and after:
+        raise HTTPException(status_code=400, detail="Use either before or after, not both")
+
+    friend_user = await resolve_user(friend_username)
     if not friend_user:
         raise HTTPException(status_code=404, detail='User not found')
 
     # Ensure friendship exists (current_user has added friend)
-    friend_link = await db.friends.find_one({'user_id': current_user['user_id'], 'friend_username': friend_username}, {'_id': 0})
-    if not friend_link:
+    if not await friend_graph.is_friend(current_user['user_id'], friend_username):
         raise HTTPException(status_code=403, detail='Messages not available for non-friends')
 
-    msgs = await db.messages.find({
-        '$or': [
-            {'from_user_id': current_user['user_id'], 'to_user_id': friend_user['id']},
-            {'from_user_id': friend_user['id'], 'to_user_id': current_user['user_id']},
-        ]
-    }, {'_id': 0}).sort('created_at', 1).to_list(1000)
-
-    for m in msgs:
-        if isinstance(m['created_at'], str):
-            try:
-                m['created_at'] = datetime.fromisoformat(m['created_at'])
-            except Exception:
-                # fallback if timezone formatting differs
-                m['created_at'] = datetime.fromisoformat(m['created_at'].replace('Z','+00:00'))
-    return msgs
+    # One range read on (conversation_id, created_at, id); the latest page by default
+    query = {'conversation_id': conversation_id(current_user['user_id'], friend_user['id'])}
+    if after:
+        msgs, _ = await fetch_page(db.messages, query, projection_for(MessageListItem), 'created_at', 1, limit, after)
+        before_cursor = encode_cursor(msgs[0]['created_at'], msgs[0]['id']) if msgs else None
+    else:
+        msgs, before_cursor = await fetch_page(db.messages, query, projection_for(MessageListItem), 'created_at', -1, limit, before)
+        msgs.reverse()
+    after_cursor = encode_cursor(msgs[-1]['created_at'], msgs[-1]['id']) if msgs else after
+    return FastJSONResponse({
+        "items": with_defaults(MessageListItem, msgs), "before_cursor": before_cursor, "after_cursor": after_cursor,
+    })
 
 @api_router.post('/messages/{friend_username}/read')
 async def mark_messages_read(friend_username: str, current_user: dict = Depends(get_current_user)):
-    friend_user = await db.users.find_one({'username': friend_username}, {'_id': 0})
+    friend_user = await resolve_user(friend_username)
     if not friend_user:
         raise HTTPException(status_code=404, detail='User not found')
 
     # Only allow marking messages read if friend relation exists
-    friend_link = await db.friends.find_one({'user_id': current_user['user_id'], 'friend_username': friend_username}, {'_id': 0})
-    if not friend_link:
+    if not await friend_graph.is_friend(current_user['user_id'], friend_username):
         raise HTTPException(status_code=403, detail='Not friends')
 
     # Add current_user to read_by for all messages from friend_user to current_user
-    result = await db.messages.update_many(
-        {'from_user_id': friend_user['id'], 'to_user_id': current_user['user_id'], 'read_by': {'$ne': current_user['user_id']}},
-        {'$addToSet': {'read_by': current_user['user_id']}}
-    )
+    updated = await mark_conversation_read(current_user['user_id'], friend_user['id'])
 
     # Notify friend via websocket that their messages were read
     try:
         notify_payload = {"event": "messages_read", "payload": {"by_user_id": current_user['user_id'], "friend_user_id": friend_user['id']}}
-        for ws in connected_users.get(friend_user['id'], []):
-            try:
-                await ws.send_json(notify_payload)
-            except Exception:
-                pass
+        await broker.publish(friend_user['id'], notify_payload)
     except Exception:
         logger.exception("Failed to notify friend about read status")
 
-    return JSONResponse(status_code=200, content={"updated": result.modified_count})
-
-@api_router.get('/messages/unread_counts')
-async def get_unread_counts(current_user: dict = Depends(get_current_user)):
-    pipeline = [
-        {'$match': {'to_user_id': current_user['user_id'], 'read_by': {'$ne': current_user['user_id']}}},
-        {'$group': {'_id': '$from_user_id', 'count': {'$sum': 1}}}
-    ]
-    agg = await db.messages.aggregate(pipeline).to_list(1000)
-    result = []
-    for row in agg:
-        user = await db.users.find_one({'id': row['_id']}, {'_id': 0, 'username': 1})
-        if user:
-            result.append({'friend_user_id': row['_id'], 'friend_username': user['username'], 'count': row['count']})
-    return result
-
+    return JSONResponse(status_code=200, content={"updated": updated})
 
 @app.websocket('/ws')
 async def websocket_endpoint(websocket: WebSocket, token: Optional[str] = None):
     # Expect client to connect with ws://.../ws?token=<jwt>
     await websocket.accept()
+    if connections.draining:
+        # this worker is shutting down; the client retries and lands on another one
+        await websocket.close(code=SERVICE_RESTART_CLOSE_CODE)
+        return
     try:
         if not token:
             await websocket.close(code=1008)
             return
-        payload = jwt.decode(token, JWT_SECRET, algorithms=[JWT_ALGORITHM])
-        user_id = payload.get('user_id')
-        if not user_id:
-            await websocket.close(code=1008)
-            return
+        user_id = decode_token(token)['user_id']
     except Exception:
         await websocket.close(code=1008)
         return
 
-    conns = connected_users.setdefault(user_id, [])
-    conns.append(websocket)
+    conn = connections.register(user_id, websocket)
     logger.info(f"WebSocket connected: user={user_id}")
 
     try:
@@ -629,39 +1327,27 @@ async def websocket_endpoint(websocket: WebSocket, token: Optional[str] = None):
             if isinstance(data, dict) and data.get('event') == 'mark_read':
                 friend_id = data.get('friend_user_id')
                 if friend_id:
-                    await db.messages.update_many(
-                        {'from_user_id': friend_id, 'to_user_id': user_id, 'read_by': {'$ne': user_id}},
-                        {'$addToSet': {'read_by': user_id}}
-                    )
+                    await mark_conversation_read(user_id, friend_id)
                     # notify friend
                     notify_payload = {"event": "messages_read", "payload": {"by_user_id": user_id, "friend_user_id": friend_id}}
-                    for ws in connected_users.get(friend_id, []):
-                        try:
-                            await ws.send_json(notify_payload)
-                        except Exception:
-                            pass
+                    await broker.publish(friend_id, notify_payload)
     except WebSocketDisconnect:
         logger.info(f"WebSocket disconnected: user={user_id}")
-        # cleanup
-        if websocket in connected_users.get(user_id, []):
-            connected_users[user_id].remove(websocket)
     except Exception:
-        logger.exception("WebSocket error")
-        if websocket in connected_users.get(user_id, []):
-            connected_users[user_id].remove(websocket)
+        if not conn.closed:
+            logger.exception("WebSocket error")
+    finally:
+        # cleanup
+        connections.unregister(conn)
 
-@api_router.get("/friends", response_model=List[Friend])
+@api_router.get("/friends", response_model=List[FriendListItem])
 async def get_friends(current_user: dict = Depends(get_current_user)):
     friends = await db.friends.find(
         {"user_id": current_user["user_id"]},
-        {"_id": 0}
+        projection_for(FriendListItem)
     ).to_list(1000)
-    
-    for friend in friends:
-        if isinstance(friend['added_at'], str):
-            friend['added_at'] = datetime.fromisoformat(friend['added_at'])
-    
-    return friends
+
+    return FastJSONResponse(with_defaults(FriendListItem, friends))
 
 @api_router.delete('/friends/{friend_username}')
 async def remove_friend(friend_username: str, current_user: dict = Depends(get_current_user)):
@@ -670,18 +1356,23 @@ async def remove_friend(friend_username: str, current_user: dict = Depends(get_c
     lg.info(f"remove_friend requested by user_id={current_user.get('user_id')} target={friend_username}")
 
     # Ensure friend link exists for current user
-    existing = await db.friends.find_one({'user_id': current_user['user_id'], 'friend_username': friend_username}, {'_id': 0})
-    if not existing:
+    if not await friend_graph.is_friend(current_user['user_id'], friend_username):
         lg.warning(f"remove_friend: no existing friend link for user={current_user.get('user_id')} friend={friend_username}")
         raise HTTPException(status_code=404, detail='Friend relationship not found')
 
     # Delete both directions: current->friend and friend->current if present
     try:
-        await db.friends.delete_one({'user_id': current_user['user_id'], 'friend_username': friend_username})
+        removed = await friend_graph.remove(current_user['user_id'], friend_username)
+        if removed:
+            await record_deletes(db, current_user['user_id'], "friends", [removed['id']])
+        await broker.publish(current_user['user_id'], {"event": "friends_changed"})
         # find friend's user id
-        friend_user = await db.users.find_one({'username': friend_username}, {'_id': 0})
+        friend_user = await resolve_user(friend_username)
         if friend_user:
-            await db.friends.delete_one({'user_id': friend_user['id'], 'friend_username': current_user['username']})
+            removed = await friend_graph.remove(friend_user['id'], current_user['username'])
+            if removed:
+                await record_deletes(db, friend_user['id'], "friends", [removed['id']])
+            await broker.publish(friend_user['id'], {"event": "friends_changed"})
         lg.info(f"remove_friend: removed friendship between {current_user.get('user_id')} and {friend_username}")
     except Exception:
         lg.exception('Error removing friend links')
@@ -690,59 +1381,264 @@ async def remove_friend(friend_username: str, current_user: dict = Depends(get_c
     return JSONResponse(status_code=200, content={'status': 'removed'})
 
 # Checkbox notes routes
+def checklist_items(items: List[ChecklistItemInput]) -> List[dict]:
+    """Item dicts for storage, giving new items a stable id."""
+    return [ChecklistItem(**item.model_dump(exclude_none=True)).model_dump() for item in items]
+
+async def checklist_write_failed(note_id: str, user_id: str, item_id: Optional[str]):
+    """Work out why a filtered checklist update matched nothing and raise it."""
+    note = await db.checkbox_notes.find_one(
+        {"id": note_id, "user_id": user_id}, {"_id": 0, "version": 1, "items.id": 1}
+    )
+    if not note:
+        raise HTTPException(status_code=404, detail="Note not found")
+    if item_id is not None and not any(item.get('id') == item_id for item in note.get('items', [])):
+        raise HTTPException(status_code=404, detail="Item not found")
+    raise HTTPException(status_code=409, detail={"message": "Version conflict", "version": note.get('version', 0)})
+
+def checklist_filter(note_id: str, user_id: str, expected_version: Optional[int], item_id: Optional[str] = None) -> dict:
+    query = {"id": note_id, "user_id": user_id}
+    if item_id is not None:
+        query["items.id"] = item_id
+    if expected_version is not None:
+        query["version"] = expected_version
+    return query
+
 @api_router.post("/checkbox-notes", response_model=CheckboxNote)
 async def create_checkbox_note(note: CheckboxNoteCreate, current_user: dict = Depends(get_current_user)):
     new_note = CheckboxNote(
         user_id=current_user["user_id"],
         title=note.title,
-        items=[item.model_dump() for item in note.items]
+        items=checklist_items(note.items)
     )
     note_dict = new_note.model_dump()
-    note_dict['created_at'] = note_dict['created_at'].isoformat()
+    note_dict.update(await stamp(db, current_user["user_id"]))
     await db.checkbox_notes.insert_one(note_dict)
     return new_note
 
-@api_router.get("/checkbox-notes", response_model=List[CheckboxNote])
-async def get_checkbox_notes(current_user: dict = Depends(get_current_user)):
-    notes = await db.checkbox_notes.find(
+@api_router.get("/checkbox-notes", response_model=CheckboxNotePage)
+async def get_checkbox_notes(
+    limit: int = Query(DEFAULT_PAGE_SIZE, ge=1, le=MAX_PAGE_SIZE),
+    cursor: Optional[str] = None,
+    if_none_match: Optional[str] = Header(None),
+    current_user: dict = Depends(get_current_user),
+):
+    etag = await list_etag("checkbox_notes", current_user["user_id"], limit, cursor)
+    if etag and etag_matches(if_none_match, etag):
+        return not_modified(etag)
+    notes, next_cursor = await fetch_page(
+        db.checkbox_notes,
         {"user_id": current_user["user_id"]},
-        {"_id": 0}
-    ).sort("created_at", -1).to_list(1000)
-    
-    for note in notes:
-        if isinstance(note['created_at'], str):
-            note['created_at'] = datetime.fromisoformat(note['created_at'])
-    
-    return notes
+        projection_for(CheckboxNoteListItem),
+        "created_at", -1, limit, cursor,
+    )
+
+    return FastJSONResponse(
+        {"items": with_defaults(CheckboxNoteListItem, notes), "next_cursor": next_cursor}, headers=etag_headers(etag)
+    )
 
 @api_router.put("/checkbox-notes/{note_id}", response_model=CheckboxNote)
 async def update_checkbox_note(note_id: str, note: CheckboxNoteCreate, current_user: dict = Depends(get_current_user)):
-    existing_note = await db.checkbox_notes.find_one({"id": note_id, "user_id": current_user["user_id"]}, {"_id": 0})
-    if not existing_note:
-        raise HTTPException(status_code=404, detail="Note not found")
-    
     update_data = {
         "title": note.title,
-        "items": [item.model_dump() for item in note.items]
+        "items": checklist_items(note.items)
     }
     
-    await db.checkbox_notes.update_one(
+    updated_note = await db.checkbox_notes.find_one_and_update(
         {"id": note_id, "user_id": current_user["user_id"]},
-        {"$set": update_data}
+        {"$set": {**update_data, **await stamp(db, current_user["user_id"])}, "$inc": {"version": 1}},
+        projection={"_id": 0},
+        return_document=ReturnDocument.AFTER,
     )
-    
-    updated_note = await db.checkbox_notes.find_one({"id": note_id}, {"_id": 0})
-    if isinstance(updated_note['created_at'], str):
-        updated_note['created_at'] = datetime.fromisoformat(updated_note['created_at'])
+    if not updated_note:
+        raise HTTPException(status_code=404, detail="Note not found")
     
     return updated_note
 
+# Checklist item deltas: touch one item with positional operators and return only it.
+# Each write returns the pre-image (filter fields like version change under it) and
+# derives the new item and version from that.
+@api_router.post("/checkbox-notes/{note_id}/items", response_model=ChecklistItemDelta)
+async def add_checklist_item(note_id: str, req: ChecklistItemCreate, current_user: dict = Depends(get_current_user)):
+    item = ChecklistItem(text=req.text, checked=req.checked).model_dump()
+    push = {"$each": [item]}
+    if req.position is not None:
+        push["$position"] = req.position
+    updated = await db.checkbox_notes.find_one_and_update(
+        checklist_filter(note_id, current_user["user_id"], req.expected_version),
+        {"$push": {"items": push}, "$set": await stamp(db, current_user["user_id"]), "$inc": {"version": 1}},
+        projection={"_id": 0, "version": 1},
+        return_document=ReturnDocument.BEFORE,
+    )
+    if not updated:
+        await checklist_write_failed(note_id, current_user["user_id"], None)
+    return {"item": item, "item_id": item['id'], "version": updated.get('version', 0) + 1}
+
+@api_router.patch("/checkbox-notes/{note_id}/items/{item_id}", response_model=ChecklistItemDelta)
+async def update_checklist_item(note_id: str, item_id: str, req: ChecklistItemPatch, current_user: dict = Depends(get_current_user)):
+    changes = {f"items.$.{field}": value for field, value in (("text", req.text), ("checked", req.checked)) if value is not None}
+    if not changes:
+        raise HTTPException(status_code=400, detail="Nothing to update")
+    updated = await db.checkbox_notes.find_one_and_update(
+        checklist_filter(note_id, current_user["user_id"], req.expected_version, item_id),
+        {"$set": {**changes, **await stamp(db, current_user["user_id"])}, "$inc": {"version": 1}},
+        projection={"_id": 0, "version": 1, "items": {"$elemMatch": {"id": item_id}}},
+        return_document=ReturnDocument.BEFORE,
+    )
+    if not updated:
+        await checklist_write_failed(note_id, current_user["user_id"], item_id)
+    item = {**updated['items'][0], **{key.split('.')[-1]: value for key, value in changes.items()}}
+    return {"item": item, "item_id": item_id, "version": updated.get('version', 0) + 1}
+
+@api_router.delete("/checkbox-notes/{note_id}/items/{item_id}", response_model=ChecklistItemDelta)
+async def delete_checklist_item(note_id: str, item_id: str, expected_version: Optional[int] = None,
+                                current_user: dict = Depends(get_current_user)):
+    updated = await db.checkbox_notes.find_one_and_update(
+        checklist_filter(note_id, current_user["user_id"], expected_version, item_id),
+        {"$pull": {"items": {"id": item_id}}, "$set": await stamp(db, current_user["user_id"]), "$inc": {"version": 1}},
+        projection={"_id": 0, "version": 1},
+        return_document=ReturnDocument.BEFORE,
+    )
+    if not updated:
+        await checklist_write_failed(note_id, current_user["user_id"], item_id)
+    return {"item_id": item_id, "version": updated.get('version', 0) + 1}
+
+@api_router.post("/checkbox-notes/{note_id}/items/{item_id}/move", response_model=ChecklistItemDelta)
+async def move_checklist_item(note_id: str, item_id: str, req: ChecklistItemMove, current_user: dict = Depends(get_current_user)):
+    # A move can't be expressed as one positional update ($pull and $push on the same
+    # array conflict), so read the order and write it back guarded by version.
+    for _ in range(3):
+        note = await db.checkbox_notes.find_one(
+            checklist_filter(note_id, current_user["user_id"], req.expected_version, item_id),
+            {"_id": 0, "items": 1, "version": 1},
+        )
+        if not note:
+            await checklist_write_failed(note_id, current_user["user_id"], item_id)
+        items = note['items']
+        index = next(i for i, item in enumerate(items) if item.get('id') == item_id)
+        moved = items.pop(index)
+        items.insert(min(req.position, len(items)), moved)
+        version = note.get('version', 0)
+        result = await db.checkbox_notes.update_one(
+            {"id": note_id, "user_id": current_user["user_id"], "version": version} if version
+            else {"id": note_id, "user_id": current_user["user_id"], "version": {"$exists": False}},
+            {"$set": {"items": items, "version": version + 1, **await stamp(db, current_user["user_id"])}},
+        )
+        if result.modified_count:
+            return {"item": moved, "item_id": item_id, "version": version + 1}
+        if req.expected_version is not None:
+            break
+    await checklist_write_failed(note_id, current_user["user_id"], item_id)
+
+# Incremental sync
+SYNC_PAGE_SIZE = 500
+MAX_SYNC_PAGE_SIZE = 2000
+
+@api_router.get("/sync", response_model=SyncResponse)
+async def sync(
+    since: int = Query(0, ge=0),
+    limit: int = Query(SYNC_PAGE_SIZE, ge=1, le=MAX_SYNC_PAGE_SIZE),
+    current_user: dict = Depends(get_current_user),
+):
+    """Documents written and deleted since ``since`` (0 for everything).
+
+    Pass the returned ``cursor`` as the next ``since``; keep going while
+    ``has_more`` is true.
+    """
+    return await changes_since(db, current_user["user_id"], since, limit)
+
 app.include_router(api_router)
 
 @app.exception_handler(ServerSelectionTimeoutError)
 async def mongo_unavailable_handler(request, exc):
     return JSONResponse(status_code=503, content={"detail": "Database unavailable"})
 
+@app.exception_handler(WaitQueueTimeoutError)
+async def mongo_pool_exhausted_handler(request, exc):
+    # every pooled connection stayed busy for waitQueueTimeoutMS
+    return JSONResponse(status_code=503, content={"detail": "Server busy, try again"}, headers={"Retry-After": "1"})
+
+@app.exception_handler(PasswordPoolSaturated)
+async def password_pool_saturated_handler(request, exc):
+    return JSONResponse(status_code=503, content={"detail": "Server busy, try again"}, headers={"Retry-After": "1"})
+
+# Liveness only says the process is serving; it never depends on Mongo, so a
+# database outage doesn't get every worker restarted.
+@app.get("/health/live")
+async def liveness():
+    return {"status": "ok", "pool": pool_monitor.stats()}
+
+# Readiness takes the worker out of rotation while Mongo or the pub/sub broker
+# is unreachable, while the pool has requests queueing behind fully
+# checked-out connections, or once the worker has started draining.
+@app.get("/health/ready")
+async def readiness():
+    pool = pool_monitor.stats()
+    database = "ok" if client is not None and await ping(client, MONGO_PING_TIMEOUT) else "unavailable"
+    saturated = pool["waiting"] > 0 and pool["saturation"] >= 1
+    ready = database == "ok" and broker_started and not saturated and not connections.draining
+    return JSONResponse(
+        status_code=200 if ready else 503,
+        content={"status": "ready" if ready else "not_ready", "database": database, "broker": broker_started,
+                 "pool_saturated": saturated, "draining": connections.draining, "pool": pool},
+    )
+
+@app.get("/metrics")
+async def prometheus_metrics():
+    return Response(metrics.render(), media_type="text/plain; version=0.0.4; charset=utf-8")
+
+# Operational state (cache sizes, worker ids, index drift) for operators only:
+# callers must send INTERNAL_TOKEN in X-Internal-Token.  Without a token every
+# call is refused, unless INTERNAL_ALLOW_LOOPBACK=1 opts in to trusting
+# same-host connections (only safe when no proxy runs on this host).
+INTERNAL_TOKEN = os.environ.get('INTERNAL_TOKEN')
+INTERNAL_ALLOW_LOOPBACK = os.environ.get('INTERNAL_ALLOW_LOOPBACK', '0') == '1'
+
+def is_loopback(host: Optional[str]) -> bool:
+    try:
+        return ipaddress.ip_address(host).is_loopback
+    except (TypeError, ValueError):
+        return False
+
+async def require_internal(request: Request, x_internal_token: Optional[str] = Header(None)):
+    if INTERNAL_TOKEN:
+        if x_internal_token and hmac.compare_digest(x_internal_token.encode(), INTERNAL_TOKEN.encode()):
+            return
+    elif INTERNAL_ALLOW_LOOPBACK and request.client and is_loopback(request.client.host):
+        return
+    raise HTTPException(status_code=403, detail="Forbidden")
+
+internal_router = APIRouter(prefix="/internal", dependencies=[Depends(require_internal)])
+
+@internal_router.get("/auth-cache")
+async def auth_cache_stats():
+    return {"tokens": token_cache.stats(), "users": user_cache.stats()}
+
+@internal_router.get("/friend-cache")
+async def friend_cache_stats():
+    return friend_graph.stats()
+
+@internal_router.get("/reminder-scheduler")
+async def reminder_scheduler_stats():
+    return reminder_scheduler.stats()
+
+@internal_router.get("/websockets")
+async def websocket_stats():
+    return connections.stats()
+
+@internal_router.get("/password-pool")
+async def password_pool_stats():
+    return password_hasher.stats()
+
+# Drift report from the last index bootstrap, None until startup has run
+index_report: Optional[dict] = None
+
+@internal_router.get("/indexes")
+async def index_drift_report():
+    return index_report
+
+app.include_router(internal_router)
+
 app.add_middleware(
     CORSMiddleware,
     allow_credentials=True,
@@ -750,6 +1646,9 @@ app.add_middleware(
     allow_methods=["*"],
     allow_headers=["*"],
 )
+app.add_middleware(CompressionMiddleware, min_size=int(os.environ.get('COMPRESSION_MIN_BYTES', '1024')))
+# Outermost, so the timings include CORS handling and compression
+app.add_middleware(MetricsMiddleware, metrics=metrics)
 
 logging.basicConfig(
     level=logging.INFO,
@@ -757,6 +1656,3 @@ logging.basicConfig(
 )
 logger = logging.getLogger(__name__)
 
-@app.on_event("shutdown")
-async def shutdown_db_client():
-    client.close()
\ No newline at end of file
@@ -0,0 +1,115 @@
+"""Per-user change sequence for incremental sync.
+
+Every write to a user-owned document in ``SYNCED_COLLECTIONS`` stamps it with
+``updated_at`` and ``seq``, the next value of that user's counter in
+``sync_counters``.  Deletes leave a tombstone in ``sync_tombstones`` with its
+own ``seq``.  A client remembers the cursor from its last sync and asks for
+everything above it; applying documents and tombstones in ``seq`` order
+reproduces the server state.
+
+A sequence number is taken just before its write, so two concurrent writes
+by one user can commit out of order.  The returned cursor therefore stops
+short of changes younger than ``SETTLE_SECONDS``: they are sent now and sent
+again next time, by which point anything numbered below them has landed.
+"""
+import heapq
+from datetime import datetime, timedelta, timezone
+from typing import Dict, Iterable, List, Optional
+
+from pymongo import ReturnDocument
+
+SYNCED_COLLECTIONS = ("notes", "reminders", "checkbox_notes", "friends")
+
+SETTLE_SECONDS = 5
+
+
+def utcnow() -> datetime:
+    return datetime.now(timezone.utc)
+
+
+async def reserve_seq(db, user_id: str, count: int = 1) -> int:
+    """Reserve ``count`` consecutive sequence numbers and return the first."""
+    counter = await db.sync_counters.find_one_and_update(
+        {"_id": user_id},
+        {"$inc": {"seq": count}, "$set": {"updated_at": utcnow()}},
+        upsert=True,
+        return_document=ReturnDocument.AFTER,
+    )
+    return counter["seq"] - count + 1
+
+
+async def settled_seq(db, user_id: str) -> Optional[int]:
+    """The user's latest ``seq`` if nothing was reserved in the last
+    ``SETTLE_SECONDS``, else None (a write numbered at or below it may still
+    be in flight)."""
+    counter = await db.sync_counters.find_one({"_id": user_id}, {"seq": 1, "updated_at": 1})
+    if counter is None:
+        return 0
+    reserved_at = counter.get("updated_at")
+    if isinstance(reserved_at, datetime) and reserved_at > utcnow() - timedelta(seconds=SETTLE_SECONDS):
+        return None
+    return counter["seq"]
+
+
+async def stamp(db, user_id: str) -> dict:
+    """Fields to ``$set`` on (or include in) a document being written."""
+    return {"seq": await reserve_seq(db, user_id), "updated_at": utcnow()}
+
+
+async def record_deletes(db, user_id: str, collection: str, ids: Iterable[str], first_seq: Optional[int] = None):
+    """Leave tombstones for deleted documents of ``collection``."""
+    ids = list(ids)
+    if not ids:
+        return
+    if first_seq is None:
+        first_seq = await reserve_seq(db, user_id, len(ids))
+    updated_at = utcnow()
+    await db.sync_tombstones.insert_many([
+        {"user_id": user_id, "collection": collection, "id": doc_id, "seq": first_seq + offset, "updated_at": updated_at}
+        for offset, doc_id in enumerate(ids)
+    ])
+
+
+async def changes_since(db, user_id: str, since: int, limit: int) -> dict:
+    """Documents and tombstones with ``seq > since``, at most ``limit`` of them.
+
+    Each source is read in ``seq`` order off its (user_id, seq) index and the
+    streams are merged, so the page is exactly the ``limit`` lowest changes.
+    """
+    query = {"user_id": user_id, "seq": {"$gt": since}}
+    streams = []
+    for collection in SYNCED_COLLECTIONS:
+        docs = await db[collection].find(query, {"_id": 0, "search": 0}).sort("seq", 1).limit(limit).to_list(limit)
+        streams.append([(doc["seq"], collection, doc) for doc in docs])
+    tombstones = await db.sync_tombstones.find(
+        query, {"_id": 0, "collection": 1, "id": 1, "seq": 1, "updated_at": 1}
+    ).sort("seq", 1).limit(limit).to_list(limit)
+    streams.append([(doc["seq"], None, doc) for doc in tombstones])
+
+    merged = list(heapq.merge(*streams, key=lambda change: change[0]))
+    has_more = len(merged) > limit
+    page = merged[:limit]
+
+    changes: Dict[str, List[dict]] = {collection: [] for collection in SYNCED_COLLECTIONS}
+    deleted: Dict[str, List[dict]] = {collection: [] for collection in SYNCED_COLLECTIONS}
+    settled = utcnow() - timedelta(seconds=SETTLE_SECONDS)
+    cursor, advancing = since, True
+    for seq, collection, doc in page:
+        if collection is None:
+            deleted[doc["collection"]].append({"id": doc["id"], "seq": seq})
+        else:
+            changes[collection].append(doc)
+        updated_at = doc.get("updated_at")
+        # anything not yet migrated to a BSON date predates this window
+        if advancing and (not isinstance(updated_at, datetime) or updated_at <= settled):
+            cursor = seq
+        else:
+            advancing = False
+
+    return {
+        "changes": changes,
+        "deleted": deleted,
+        "cursor": cursor,
+        # only worth asking again straight away if this page moved the cursor
+        "has_more": has_more and cursor == page[-1][0],
+    }
@@ -0,0 +1,196 @@
+"""Shared helpers for the benchmark scripts.
+
+The benchmarks drive ``backend.server:app`` in-process through httpx's ASGI
+transport, against whatever Mongo ``MONGO_URL``/``DB_NAME`` point at; the
+app's lifespan opens that client, so ``server.db`` is only usable inside
+``make_client``.  Use a
+throwaway database: scripts seed and delete their own documents.
+``use_mongomock`` swaps in an in-memory stand-in instead, for runs that need
+no server at all.
+"""
+import os
+import sys
+import time
+import uuid
+from contextlib import asynccontextmanager
+from inspect import isawaitable
+from pathlib import Path
+
+ROOT = Path(__file__).resolve().parent.parent
+if str(ROOT) not in sys.path:
+    sys.path.insert(0, str(ROOT))
+
+os.environ.setdefault('MONGO_URL', 'mongodb://localhost:27017')
+os.environ.setdefault('DB_NAME', 'memora_bench')
+
+import httpx  # noqa: E402
+
+
+def percentile(samples, pct):
+    if not samples:
+        return 0.0
+    ordered = sorted(samples)
+    k = (len(ordered) - 1) * pct / 100.0
+    lo = int(k)
+    hi = min(lo + 1, len(ordered) - 1)
+    return ordered[lo] + (ordered[hi] - ordered[lo]) * (k - lo)
+
+
+def summarize(samples):
+    """Return count and p50/p95/p99 in milliseconds for a list of seconds."""
+    ms = [s * 1000 for s in samples]
+    return {
+        "count": len(ms),
+        "p50_ms": round(percentile(ms, 50), 2),
+        "p95_ms": round(percentile(ms, 95), 2),
+        "p99_ms": round(percentile(ms, 99), 2),
+    }
+
+
+@asynccontextmanager
+async def make_client(app, lifespan=True):
+    """httpx client for ``app``; ``lifespan`` runs its startup (Mongo client, indexes) around it."""
+    transport = httpx.ASGITransport(app=app)
+    async with httpx.AsyncClient(transport=transport, base_url="http://bench") as client:
+        if not lifespan:
+            yield client
+            return
+        async with app.router.lifespan_context(app):
+            yield client
+
+
+def unique_name(prefix):
+    return f"{prefix}_{uuid.uuid4().hex[:10]}"
+
+
+async def timed(coro):
+    started = time.perf_counter()
+    resp = await coro
+    return resp, time.perf_counter() - started
+
+
+async def signup(client, username, password="bench-pass"):
+    resp = await client.post("/api/auth/signup", json={"username": username, "password": password})
+    resp.raise_for_status()
+    data = resp.json()
+    return data["token"], data["user_id"]
+
+
+class CommandCounter:
+    """pymongo command listener that counts round-trips.
+
+    Must be registered (``pymongo.monitoring.register``) before the Motor
+    client is created, i.e. before ``backend.server`` is imported.
+    """
+
+    def __init__(self):
+        self.count = 0
+        self.by_command = {}
+
+    def started(self, event):
+        self.count += 1
+        self.by_command[event.command_name] = self.by_command.get(event.command_name, 0) + 1
+
+    def succeeded(self, event):
+        pass
+
+    def failed(self, event):
+        pass
+
+    def reset(self):
+        self.count = 0
+        self.by_command = {}
+
+
+class _InstrumentedCursor:
+    def __init__(self, cursor, report, name):
+        self._cursor = cursor
+        self._report = report
+        self._name = name
+
+    def __getattr__(self, attr):
+        value = getattr(self._cursor, attr)
+        if attr == "to_list":
+            async def to_list(*args, **kwargs):
+                started = time.perf_counter()
+                try:
+                    return await value(*args, **kwargs)
+                finally:
+                    self._report(self._name, time.perf_counter() - started)
+            return to_list
+        if not callable(value):
+            return value
+
+        def chained(*args, **kwargs):
+            result = value(*args, **kwargs)
+            return self if result is self._cursor else result
+        return chained
+
+    def __aiter__(self):
+        self._report(self._name, 0.0)
+        return self._cursor.__aiter__()
+
+
+class _InstrumentedCollection:
+    def __init__(self, collection, report):
+        self._collection = collection
+        self._report = report
+
+    def __getattr__(self, attr):
+        value = getattr(self._collection, attr)
+        if not callable(value):
+            return value
+
+        def call(*args, **kwargs):
+            result = value(*args, **kwargs)
+            if attr in ("find", "aggregate"):
+                return _InstrumentedCursor(result, self._report, attr)
+            if not isawaitable(result):
+                return result
+
+            async def timed_call():
+                started = time.perf_counter()
+                try:
+                    return await result
+                finally:
+                    self._report(attr, time.perf_counter() - started)
+            return timed_call()
+        return call
+
+
+class InstrumentedDatabase:
+    """Wraps a mongomock database so each collection call is reported as a
+    Mongo command, the way the driver's command listener would for a real
+    server.  Commands are named after the collection method (``find_one``,
+    ``bulk_write``), and a ``find`` counts once however many batches it
+    would have taken.
+    """
+
+    def __init__(self, db, report):
+        self._db = db
+        self._report = report
+
+    def __getattr__(self, attr):
+        if attr.startswith("_"):
+            raise AttributeError(attr)
+        return _InstrumentedCollection(getattr(self._db, attr), self._report)
+
+    def __getitem__(self, name):
+        return _InstrumentedCollection(self._db[name], self._report)
+
+
+def use_mongomock(server):
+    """Point ``server`` at a fresh in-memory database and return it.
+
+    Collection calls feed ``server.metrics`` like the real command listener,
+    so ``/metrics`` and per-route Mongo op counts work the same on the
+    stand-in.
+    """
+    from mongomock_motor import AsyncMongoMockClient
+
+    raw = AsyncMongoMockClient(tz_aware=True)[os.environ["DB_NAME"]]
+    db = InstrumentedDatabase(raw, server.metrics.mongo_command)
+    server.bind_database(db)
+    server.token_cache.clear()
+    server.user_cache.clear()
+    return db
@@ -0,0 +1,73 @@
+"""Count Mongo round-trips per messaging request with the auth caches on and off.
+
+Sets up two friends, then sends messages, reads the conversation and marks it
+read, reporting average Mongo commands per request and latency for each mode.
+
+    python -m benchmarks.bench_auth_cache --requests 200
+"""
+import argparse
+import asyncio
+import json
+import time
+
+from pymongo import monitoring
+
+from benchmarks._common import CommandCounter, make_client, signup, summarize, unique_name
+
+counter = CommandCounter()
+monitoring.register(counter)
+
+from backend import server  # noqa: E402  (listener must exist before the client)
+from backend.cache import TTLCache  # noqa: E402
+
+
+async def befriend(user_a, user_b):
+    await server.db.friends.insert_many([
+        {"id": unique_name("f"), "user_id": user_a[1], "friend_username": user_b[2]},
+        {"id": unique_name("f"), "user_id": user_b[1], "friend_username": user_a[2]},
+    ])
+
+
+async def run_mode(client, alice, bob, requests):
+    headers = {"Authorization": f"Bearer {alice[0]}"}
+    calls = [
+        lambda: client.post("/api/messages", json={"to_username": bob[2], "content": "hi"}, headers=headers),
+        lambda: client.get(f"/api/messages/{bob[2]}", params={"limit": 20}, headers=headers),
+        lambda: client.post(f"/api/messages/{bob[2]}/read", headers=headers),
+    ]
+    counter.reset()
+    samples = []
+    for i in range(requests):
+        started = time.perf_counter()
+        resp = await calls[i % len(calls)]()
+        samples.append(time.perf_counter() - started)
+        resp.raise_for_status()
+    return {"mongo_ops_per_request": round(counter.count / requests, 2), "by_command": counter.by_command,
+            **summarize(samples)}
+
+
+async def main(args):
+    results = {}
+    async with make_client(server.app) as client:
+        alice_name, bob_name = unique_name("bench_alice"), unique_name("bench_bob")
+        alice = (*await signup(client, alice_name), alice_name)
+        bob = (*await signup(client, bob_name), bob_name)
+        await befriend(alice, bob)
+        try:
+            server.token_cache, server.user_cache = TTLCache(ttl=0), TTLCache(ttl=0)
+            results["cache_off"] = await run_mode(client, alice, bob, args.requests)
+            server.token_cache, server.user_cache = TTLCache(), TTLCache()
+            results["cache_on"] = await run_mode(client, alice, bob, args.requests)
+        finally:
+            ids = [alice[1], bob[1]]
+            await server.db.messages.delete_many({"from_user_id": {"$in": ids}})
+            await server.db.friends.delete_many({"user_id": {"$in": ids}})
+            await server.db.unread_counters.delete_many({"_id": {"$in": ids}})
+            await server.db.users.delete_many({"id": {"$in": ids}})
+    print(json.dumps(results, indent=2))
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--requests", type=int, default=300)
+    asyncio.run(main(parser.parse_args()))
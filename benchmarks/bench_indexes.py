@@ -0,0 +1,110 @@
+"""Compare query plans and latency of the API's hot queries with and without
+the declared index set.
+
+Seeds a scratch database, drops the declared indexes, explains and times each
+query, then runs ``ensure_indexes`` and repeats.  Needs a real Mongo at
+``MONGO_URL`` (explain output is what this benchmark is about).
+
+    python -m benchmarks.bench_indexes --users 50 --notes-per-user 200
+"""
+import argparse
+import asyncio
+import json
+import os
+import time
+import uuid
+from datetime import datetime, timedelta, timezone
+
+from benchmarks._common import summarize
+
+from motor.motor_asyncio import AsyncIOMotorClient
+
+from backend.indexes import INDEXES, ensure_indexes
+
+
+def _plan_stage(plan):
+    stage = plan.get("stage")
+    child = plan.get("inputStage") or (plan.get("inputStages") or [None])[0]
+    if child:
+        return f"{stage}<{_plan_stage(child)}"
+    return stage
+
+
+async def seed(db, users, notes_per_user):
+    now = datetime.now(timezone.utc)
+    user_ids = [str(uuid.uuid4()) for _ in range(users)]
+    await db.users.insert_many([{"id": uid, "username": f"user{i}"} for i, uid in enumerate(user_ids)])
+    for uid in user_ids:
+        await db.notes.insert_many([
+            {"id": str(uuid.uuid4()), "user_id": uid, "title": f"n{j}", "content": "x" * 100,
+             "created_at": now - timedelta(days=j)}
+            for j in range(notes_per_user)
+        ])
+        await db.reminders.insert_many([
+            {"id": str(uuid.uuid4()), "user_id": uid, "title": "r", "date": f"2026-01-{(j % 28) + 1:02d}"}
+            for j in range(notes_per_user // 4)
+        ])
+        await db.messages.insert_many([
+            {"id": str(uuid.uuid4()), "from_user_id": uid, "to_user_id": user_ids[0], "content": "hi",
+             "read_by": [], "created_at": now - timedelta(minutes=j)}
+            for j in range(notes_per_user // 4)
+        ])
+    return user_ids
+
+
+def queries(db, user_ids):
+    uid, other = user_ids[-1], user_ids[0]
+    return {
+        "users.by_username": lambda: db.users.find({"username": "user7"}),
+        "notes.list": lambda: db.notes.find({"user_id": uid}, {"_id": 0, "id": 1, "title": 1, "created_at": 1}).sort("created_at", -1),
+        "reminders.list": lambda: db.reminders.find({"user_id": uid}).sort("date", 1),
+        "messages.conversation": lambda: db.messages.find({"$or": [
+            {"from_user_id": uid, "to_user_id": other},
+            {"from_user_id": other, "to_user_id": uid},
+        ]}).sort("created_at", 1),
+    }
+
+
+async def measure(db, user_ids, repeat):
+    out = {}
+    for name, make_cursor in queries(db, user_ids).items():
+        explain = await make_cursor().explain()
+        stats = explain.get("executionStats", {})
+        samples = []
+        for _ in range(repeat):
+            started = time.perf_counter()
+            await make_cursor().to_list(1000)
+            samples.append(time.perf_counter() - started)
+        out[name] = {
+            "plan": _plan_stage(explain["queryPlanner"]["winningPlan"]),
+            "docs_examined": stats.get("totalDocsExamined"),
+            **summarize(samples),
+        }
+    return out
+
+
+async def main(args):
+    client = AsyncIOMotorClient(os.environ["MONGO_URL"])
+    db = client[f"memora_bench_indexes_{uuid.uuid4().hex[:6]}"]
+    try:
+        user_ids = await seed(db, args.users, args.notes_per_user)
+        for spec in INDEXES:
+            try:
+                await db[spec.collection].drop_index(spec.name)
+            except Exception:
+                pass
+        before = await measure(db, user_ids, args.repeat)
+        report = await ensure_indexes(db)
+        after = await measure(db, user_ids, args.repeat)
+        print(json.dumps({"before": before, "after": after, "bootstrap": report}, indent=2))
+    finally:
+        await client.drop_database(db.name)
+        client.close()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--users", type=int, default=50)
+    parser.add_argument("--notes-per-user", type=int, default=200)
+    parser.add_argument("--repeat", type=int, default=50)
+    asyncio.run(main(parser.parse_args()))
@@ -0,0 +1,352 @@
+"""Mixed-workload load test: throughput, latency and Mongo ops per request.
+
+Boots ``backend.server:app`` in-process, by default against an in-memory
+Mongo stand-in (``--backend mongomock``) so it runs anywhere; pass
+``--backend mongo`` to use ``MONGO_URL``/``DB_NAME`` instead.  Seeds users,
+notes, friendships and messages, then runs each workload for a fixed time
+with ``--concurrency`` virtual users:
+
+``login``  login storm against the bounded bcrypt pool
+``notes``  note CRUD: list, get, create, update, delete
+``chat``   send/read messages and unread counts, with WebSocket listeners
+           connected for part of the users; also reports send-to-delivery
+           latency as seen by the listener
+``mixed``  all of the above, weighted like normal app traffic
+
+Per workload it reports req/s, p50/p95/p99 per operation and per-route
+Mongo ops per request from ``server.metrics``.  Results are written as JSON
+(``--out``, default ``benchmarks/results/load-<commit>.json``); pass
+``--compare`` an earlier file to print the req/s and p95 change.
+
+    python -m benchmarks.bench_load --users 200 --duration 10 --concurrency 32
+    python -m benchmarks.bench_load --compare benchmarks/results/load-abc1234.json
+"""
+import argparse
+import asyncio
+import json
+import platform
+import random
+import subprocess
+import time
+import uuid
+from datetime import datetime, timedelta, timezone
+from pathlib import Path
+
+from benchmarks._common import ROOT, make_client, summarize, use_mongomock
+
+from backend import server
+from backend.search import index_fields
+
+PASSWORD = "bench-pass"
+SEED_BATCH = 1000
+
+WORKLOADS = {
+    "login": {"login": 1},
+    "notes": {"list_notes": 4, "get_note": 2, "create_note": 2, "update_note": 1.5, "delete_note": 0.5},
+    "chat": {"send_message": 4, "get_conversation": 3, "unread_counts": 3},
+    "mixed": {
+        "login": 0.2, "list_notes": 3, "get_note": 1.5, "create_note": 1, "update_note": 1, "delete_note": 0.3,
+        "send_message": 1.5, "get_conversation": 1.5, "unread_counts": 2,
+    },
+}
+
+
+class BenchUser:
+    def __init__(self, doc, token):
+        self.id = doc["id"]
+        self.username = doc["username"]
+        self.headers = {"Authorization": f"Bearer {token}"}
+        self.note_ids = []
+        self.friends = []
+
+
+async def seed(args, rng):
+    """Insert the synthetic dataset directly, in the shape the server writes."""
+    password_hash = await server.hash_password(PASSWORD)
+    now = datetime.now(timezone.utc)
+    tag = uuid.uuid4().hex[:6]
+    users = []
+    for i in range(args.users):
+        doc = server.User(username=f"bench_{tag}_{i}", password_hash=password_hash).model_dump()
+        users.append(BenchUser(doc, server.create_token(doc["id"], doc["username"])))
+        await _buffered("users", doc)
+
+    body = "Went for a long walk by the river and wrote down everything I saw. " * 4
+    for user in users:
+        for i in range(args.notes):
+            note = server.Note(user_id=user.id, title=f"note {i}", content=body).model_dump()
+            note["created_at"] = now - timedelta(hours=i)
+            note["month_day"] = server.month_day_key(note["created_at"])
+            note["search"] = index_fields(note["title"], note["content"])
+            user.note_ids.append(note["id"])
+            await _buffered("notes", note)
+
+    by_id = {user.id: user for user in users}
+    pairs = set()
+    for user in users:
+        for other in rng.sample(users, min(args.friends, len(users) - 1) + 1):
+            if other is not user:
+                pairs.add(tuple(sorted((user.id, other.id))))
+    for a, b in sorted(pairs):
+        for user, friend in ((by_id[a], by_id[b]), (by_id[b], by_id[a])):
+            user.friends.append(friend)
+            await _buffered("friends", server.Friend(user_id=user.id, friend_username=friend.username).model_dump())
+        for i in range(args.messages):
+            sender, recipient = (by_id[a], by_id[b]) if i % 2 else (by_id[b], by_id[a])
+            msg = server.Message(from_user_id=sender.id, to_user_id=recipient.id,
+                                 content=f"message {i}", read_by=[recipient.id]).model_dump()
+            msg["created_at"] = now - timedelta(minutes=args.messages - i)
+            msg["conversation_id"] = server.conversation_id(a, b)
+            await _buffered("messages", msg)
+    for name in _pending:
+        await _flush(name)
+    return users, len(pairs)
+
+
+# keyed by collection name: under --backend mongomock, server.db hands out a
+# new collection wrapper on every attribute access
+_pending = {}
+
+
+async def _buffered(name, doc):
+    _pending.setdefault(name, []).append(doc)
+    if len(_pending[name]) >= SEED_BATCH:
+        await _flush(name)
+
+
+async def _flush(name):
+    docs = _pending.get(name)
+    if docs:
+        _pending[name] = []
+        await server.db[name].insert_many(docs, ordered=False)
+
+
+class WebSocketListener:
+    """A /ws client driven straight through the ASGI interface, on this loop."""
+
+    def __init__(self, app, user, on_event):
+        self.app = app
+        self.user = user
+        self.on_event = on_event
+        self._inbox = asyncio.Queue()
+        self._accepted = asyncio.Event()
+        self._task = None
+
+    async def start(self):
+        token = self.user.headers["Authorization"].split()[1]
+        scope = {
+            "type": "websocket", "asgi": {"version": "3.0"}, "http_version": "1.1", "scheme": "ws",
+            "path": "/ws", "raw_path": b"/ws", "root_path": "", "query_string": f"token={token}".encode(),
+            "headers": [(b"host", b"bench")], "server": ("bench", 80), "client": ("127.0.0.1", 0),
+            "subprotocols": [],
+        }
+        await self._inbox.put({"type": "websocket.connect"})
+        self._task = asyncio.create_task(self.app(scope, self._inbox.get, self._send))
+        await asyncio.wait_for(self._accepted.wait(), timeout=5)
+
+    async def _send(self, message):
+        if message["type"] == "websocket.accept":
+            self._accepted.set()
+        elif message["type"] == "websocket.send":
+            self.on_event(self.user, json.loads(message.get("text") or message["bytes"]))
+
+    async def stop(self):
+        await self._inbox.put({"type": "websocket.disconnect", "code": 1000})
+        await asyncio.wait_for(self._task, timeout=5)
+
+
+class Workload:
+    def __init__(self, client, users, rng):
+        self.client = client
+        self.users = users
+        self.chatty = [user for user in users if user.friends]
+        self.rng = rng
+        self.created = {user.id: [] for user in users}
+        self.sent_at = {}
+        self.delivery = []
+
+    def on_event(self, user, event):
+        if event.get("event") == "new_message":
+            started = self.sent_at.pop(event["payload"]["content"], None)
+            if started is not None:
+                self.delivery.append(time.perf_counter() - started)
+
+    async def login(self, user):
+        return await self.client.post("/api/auth/login", json={"username": user.username, "password": PASSWORD})
+
+    async def list_notes(self, user):
+        return await self.client.get("/api/notes", headers=user.headers)
+
+    async def get_note(self, user):
+        return await self.client.get(f"/api/notes/{self.rng.choice(user.note_ids)}", headers=user.headers)
+
+    async def create_note(self, user):
+        resp = await self.client.post("/api/notes", json={"title": "load", "content": "written under load"},
+                                      headers=user.headers)
+        if resp.status_code == 200:
+            self.created[user.id].append(resp.json()["id"])
+        return resp
+
+    async def update_note(self, user):
+        note_id = self.rng.choice(user.note_ids)
+        return await self.client.put(f"/api/notes/{note_id}", json={"title": "edited", "content": "edited under load"},
+                                     headers=user.headers)
+
+    async def delete_note(self, user):
+        # only delete what this run created, so reads never hit a missing note
+        if not self.created[user.id]:
+            return await self.create_note(user)
+        return await self.client.delete(f"/api/notes/{self.created[user.id].pop()}", headers=user.headers)
+
+    async def send_message(self, user):
+        user = self.rng.choice(self.chatty)
+        content = uuid.uuid4().hex
+        self.sent_at[content] = time.perf_counter()
+        return await self.client.post("/api/messages", headers=user.headers,
+                                      json={"to_username": self.rng.choice(user.friends).username, "content": content})
+
+    async def get_conversation(self, user):
+        user = self.rng.choice(self.chatty)
+        friend = self.rng.choice(user.friends)
+        return await self.client.get(f"/api/messages/{friend.username}", headers=user.headers)
+
+    async def unread_counts(self, user):
+        return await self.client.get("/api/messages/unread_counts", headers=user.headers)
+
+
+def _route_snapshot():
+    """(count, sum) of Mongo commands per request, per route, so far."""
+    return {
+        key[0]: (hist.count, hist.sum)
+        for key, hist in server.metrics.commands_per_request.items()
+    }
+
+
+def _mongo_ops_per_request(before, after):
+    result = {}
+    for route, (count, total) in after.items():
+        prev_count, prev_total = before.get(route, (0, 0))
+        if count > prev_count:
+            result[route] = round((total - prev_total) / (count - prev_count), 2)
+    return dict(sorted(result.items()))
+
+
+async def run_workload(workload, mix, args):
+    ops, weights = list(mix), list(mix.values())
+    samples = {op: [] for op in ops}
+    errors = {}
+    deadline = time.perf_counter() + args.duration
+    before = _route_snapshot()
+    workload.delivery.clear()
+
+    async def virtual_user():
+        while time.perf_counter() < deadline:
+            op = workload.rng.choices(ops, weights=weights)[0]
+            user = workload.rng.choice(workload.users)
+            started = time.perf_counter()
+            resp = await getattr(workload, op)(user)
+            samples[op].append(time.perf_counter() - started)
+            if resp.status_code >= 400:
+                errors[f"{op}:{resp.status_code}"] = errors.get(f"{op}:{resp.status_code}", 0) + 1
+
+    started = time.perf_counter()
+    await asyncio.gather(*(virtual_user() for _ in range(args.concurrency)))
+    elapsed = time.perf_counter() - started
+    # let queued websocket sends drain before reading delivery latency
+    await asyncio.sleep(0.2)
+
+    total = sum(len(s) for s in samples.values())
+    result = {
+        "requests": total,
+        "seconds": round(elapsed, 2),
+        "req_per_s": round(total / elapsed, 1),
+        "latency": summarize([s for op_samples in samples.values() for s in op_samples]),
+        "ops": {op: summarize(op_samples) for op, op_samples in samples.items() if op_samples},
+        "errors": errors,
+        "mongo_ops_per_request": _mongo_ops_per_request(before, _route_snapshot()),
+    }
+    if workload.delivery:
+        result["ws_delivery"] = summarize(workload.delivery)
+    return result
+
+
+def git_commit():
+    try:
+        return subprocess.run(["git", "rev-parse", "--short", "HEAD"], cwd=ROOT, capture_output=True,
+                              text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return "unknown"
+
+
+def compare(previous, current):
+    lines = [f"{'workload':<10} {'req/s':>20} {'p95 ms':>20}"]
+    for name, result in current["workloads"].items():
+        old = previous.get("workloads", {}).get(name)
+        if not old:
+            continue
+        rps = f"{old['req_per_s']} -> {result['req_per_s']}"
+        p95 = f"{old['latency']['p95_ms']} -> {result['latency']['p95_ms']}"
+        lines.append(f"{name:<10} {rps:>20} {p95:>20}")
+    return "\n".join(lines)
+
+
+async def main(args):
+    rng = random.Random(args.seed)
+    if args.backend == "mongomock":
+        use_mongomock(server)
+
+    # the stand-in is bound directly; a real Mongo needs the app's lifespan
+    async with make_client(server.app, lifespan=args.backend == "mongo") as client:
+        started = time.perf_counter()
+        users, friendships = await seed(args, rng)
+        seed_seconds = round(time.perf_counter() - started, 1)
+
+        results = {
+            "commit": git_commit(),
+            "created_at": datetime.now(timezone.utc).isoformat(),
+            "python": platform.python_version(),
+            "config": {**vars(args), "friendships": friendships},
+            "seed_seconds": seed_seconds,
+            "workloads": {},
+        }
+        workload = Workload(client, users, rng)
+        listeners = [WebSocketListener(server.app, user, workload.on_event)
+                     for user in rng.sample(users, min(args.listeners, len(users)))]
+        for listener in listeners:
+            await listener.start()
+        try:
+            for name in args.workloads:
+                results["workloads"][name] = await run_workload(workload, WORKLOADS[name], args)
+        finally:
+            for listener in listeners:
+                await listener.stop()
+            if args.backend == "mongo":
+                ids = [user.id for user in users]
+                for collection, field in (("notes", "user_id"), ("friends", "user_id"), ("messages", "from_user_id"),
+                                          ("unread_counters", "_id"), ("users", "id")):
+                    await server.db[collection].delete_many({field: {"$in": ids}})
+
+    out = Path(args.out or ROOT / "benchmarks" / "results" / f"load-{results['commit']}.json")
+    out.parent.mkdir(parents=True, exist_ok=True)
+    out.write_text(json.dumps(results, indent=2, default=str))
+    print(json.dumps(results["workloads"], indent=2))
+    print(f"results written to {out}")
+    if args.compare:
+        print(compare(json.loads(Path(args.compare).read_text()), results))
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--backend", choices=("mongomock", "mongo"), default="mongomock")
+    parser.add_argument("--users", type=int, default=200)
+    parser.add_argument("--notes", type=int, default=50, help="notes per user")
+    parser.add_argument("--friends", type=int, default=5, help="friends per user, roughly")
+    parser.add_argument("--messages", type=int, default=20, help="messages per friendship")
+    parser.add_argument("--listeners", type=int, default=50, help="users with an open websocket")
+    parser.add_argument("--concurrency", type=int, default=32)
+    parser.add_argument("--duration", type=float, default=10.0, help="seconds per workload")
+    parser.add_argument("--workloads", nargs="+", choices=list(WORKLOADS), default=list(WORKLOADS))
+    parser.add_argument("--seed", type=int, default=1)
+    parser.add_argument("--out", help="where to write the JSON results")
+    parser.add_argument("--compare", help="earlier results file to compare against")
+    asyncio.run(main(parser.parse_args()))
@@ -0,0 +1,66 @@
+"""Measure GET /api/notes latency while a burst of logins is in flight.
+
+Runs the same workload twice: once with bcrypt inline on the event loop (the
+old behaviour) and once on the bounded password pool, and prints p50/p95/p99
+of the notes requests for both.
+
+    python -m benchmarks.bench_login_latency --logins 40 --reads 200
+"""
+import argparse
+import asyncio
+import json
+
+from benchmarks._common import make_client, signup, summarize, timed, unique_name
+
+from backend import server
+from backend.passwords import PasswordHasher
+
+
+async def run_workload(client, token, username, logins, reads):
+    headers = {"Authorization": f"Bearer {token}"}
+
+    async def login():
+        await client.post("/api/auth/login", json={"username": username, "password": "bench-pass"})
+
+    async def read_notes():
+        samples = []
+        for _ in range(reads):
+            _, elapsed = await timed(client.get("/api/notes", headers=headers))
+            samples.append(elapsed)
+        return samples
+
+    login_tasks = [asyncio.create_task(login()) for _ in range(logins)]
+    samples = await read_notes()
+    await asyncio.gather(*login_tasks)
+    return summarize(samples)
+
+
+async def main(args):
+    results = {}
+    async with make_client(server.app) as client:
+        username = unique_name("bench_login")
+        token, user_id = await signup(client, username)
+        headers = {"Authorization": f"Bearer {token}"}
+        for i in range(20):
+            await client.post("/api/notes", json={"title": f"note {i}", "content": "x" * 200}, headers=headers)
+
+        try:
+            for mode in ("inline", args.executor):
+                server.password_hasher.shutdown()
+                server.password_hasher = PasswordHasher(max_workers=args.workers, executor=mode, max_queue=args.logins)
+                results[mode] = await run_workload(client, token, username, args.logins, args.reads)
+                results[mode]["password_pool"] = server.password_hasher.stats()
+        finally:
+            await server.db.notes.delete_many({"user_id": user_id})
+            await server.db.users.delete_many({"id": user_id})
+
+    print(json.dumps(results, indent=2))
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--logins", type=int, default=40)
+    parser.add_argument("--reads", type=int, default=200)
+    parser.add_argument("--workers", type=int, default=4)
+    parser.add_argument("--executor", choices=["thread", "process"], default="thread")
+    asyncio.run(main(parser.parse_args()))
@@ -0,0 +1,84 @@
+"""Compare N single note calls against one /api/notes/batch request.
+
+Creates N notes one request at a time, then N more in one batch, then updates
+and deletes both sets the same two ways, reporting wall time and Mongo
+round-trips for each.
+
+    python -m benchmarks.bench_notes_batch --count 500
+"""
+import argparse
+import asyncio
+import json
+import time
+
+from pymongo import monitoring
+
+from benchmarks._common import CommandCounter, make_client, signup, unique_name
+
+counter = CommandCounter()
+monitoring.register(counter)
+
+from backend import server  # noqa: E402  (listener must exist before the client)
+
+
+async def measure(label, results, fn):
+    counter.reset()
+    started = time.perf_counter()
+    value = await fn()
+    results[label] = {"seconds": round(time.perf_counter() - started, 3), "mongo_ops": counter.count}
+    return value
+
+
+async def main(args):
+    results = {}
+    note = {"title": "bench", "content": "x" * 300}
+    async with make_client(server.app) as client:
+        token, user_id = await signup(client, unique_name("bench_batch"))
+        headers = {"Authorization": f"Bearer {token}"}
+        try:
+            async def single_creates():
+                ids = []
+                for _ in range(args.count):
+                    resp = await client.post("/api/notes", json=note, headers=headers)
+                    ids.append(resp.json()["id"])
+                return ids
+
+            async def batch_creates():
+                ops = [{"op": "create", "note": note} for _ in range(args.count)]
+                resp = await client.post("/api/notes/batch", json={"operations": ops}, headers=headers)
+                return [r["id"] for r in resp.json()]
+
+            single_ids = await measure("create_single", results, single_creates)
+            batch_ids = await measure("create_batch", results, batch_creates)
+
+            async def single_updates():
+                for note_id in single_ids:
+                    await client.put(f"/api/notes/{note_id}", json={**note, "title": "edited"}, headers=headers)
+
+            async def batch_updates():
+                ops = [{"op": "update", "id": i, "note": {**note, "title": "edited"}} for i in batch_ids]
+                await client.post("/api/notes/batch", json={"operations": ops}, headers=headers)
+
+            await measure("update_single", results, single_updates)
+            await measure("update_batch", results, batch_updates)
+
+            async def single_deletes():
+                for note_id in single_ids:
+                    await client.delete(f"/api/notes/{note_id}", headers=headers)
+
+            async def batch_deletes():
+                ops = [{"op": "delete", "id": i} for i in batch_ids]
+                await client.post("/api/notes/batch", json={"operations": ops}, headers=headers)
+
+            await measure("delete_single", results, single_deletes)
+            await measure("delete_batch", results, batch_deletes)
+        finally:
+            await server.db.notes.delete_many({"user_id": user_id})
+            await server.db.users.delete_many({"id": user_id})
+    print(json.dumps(results, indent=2))
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--count", type=int, default=500)
+    asyncio.run(main(parser.parse_args()))
@@ -0,0 +1,129 @@
+"""Latency of /api/notes/search over a large synthetic corpus.
+
+Seeds one user with N notes whose words follow a Zipf distribution (so
+there are both rare and very common terms), builds the declared indexes, and
+times rare, common, prefix and multi-word queries through the API.  Each
+query is also run as the unindexed alternative, a case-insensitive
+``$regex`` over title and content, for comparison.
+
+    python -m benchmarks.bench_search --notes 100000 --repeat 20
+"""
+import argparse
+import asyncio
+import json
+import random
+import re
+import string
+import time
+import uuid
+from datetime import datetime, timedelta, timezone
+
+from benchmarks._common import make_client, signup, summarize, unique_name
+
+from backend import server
+from backend.indexes import ensure_indexes
+from backend.search import index_fields
+
+VOCABULARY = 20000
+SEED_BATCH = 5000
+
+
+def make_vocabulary(rng):
+    words = set()
+    while len(words) < VOCABULARY:
+        words.add("".join(rng.choice(string.ascii_lowercase) for _ in range(rng.randint(3, 10))))
+    words = sorted(words, key=lambda _: rng.random())
+    cum_weights, total = [], 0.0
+    for rank in range(1, len(words) + 1):
+        total += 1.0 / rank
+        cum_weights.append(total)
+    return words, cum_weights
+
+
+async def seed(user_id, count, rng):
+    words, cum_weights = make_vocabulary(rng)
+    now = datetime.now(timezone.utc)
+    for offset in range(0, count, SEED_BATCH):
+        docs = []
+        for i in range(offset, min(count, offset + SEED_BATCH)):
+            title = " ".join(rng.choices(words, cum_weights=cum_weights, k=rng.randint(2, 6)))
+            content = " ".join(rng.choices(words, cum_weights=cum_weights, k=rng.randint(30, 200)))
+            created_at = now - timedelta(minutes=i)
+            docs.append({
+                "id": str(uuid.uuid4()), "user_id": user_id, "title": title, "content": content,
+                "created_at": created_at, "month_day": f"{created_at.month:02d}-{created_at.day:02d}",
+                "search": index_fields(title, content),
+            })
+        await server.db.notes.insert_many(docs, ordered=False)
+    return words
+
+
+def queries(words):
+    common, mid, rare = words[0], words[len(words) // 50], words[-1]
+    return {
+        "common_word": common,
+        "mid_word": mid,
+        "rare_word": rare,
+        "prefix_2": mid[:2],
+        "prefix_3": rare[:3],
+        "two_words": f"{common} {mid}",
+    }
+
+
+async def time_api(client, headers, q, repeat):
+    samples, hits = [], 0
+    for _ in range(repeat):
+        started = time.perf_counter()
+        resp = await client.get("/api/notes/search", params={"q": q}, headers=headers)
+        samples.append(time.perf_counter() - started)
+        resp.raise_for_status()
+        hits = len(resp.json()["items"])
+    return {**summarize(samples), "hits": hits}
+
+
+async def time_regex_scan(user_id, q, repeat):
+    clauses = [
+        {"$or": [{"title": {"$regex": re.escape(word), "$options": "i"}},
+                 {"content": {"$regex": re.escape(word), "$options": "i"}}]}
+        for word in q.split()
+    ]
+    samples = []
+    for _ in range(repeat):
+        started = time.perf_counter()
+        await server.db.notes.find(
+            {"user_id": user_id, "$and": clauses}, {"_id": 0, "id": 1}
+        ).limit(20).to_list(20)
+        samples.append(time.perf_counter() - started)
+    return summarize(samples)
+
+
+async def main(args):
+    rng = random.Random(args.seed)
+    results = {"notes": args.notes}
+    async with make_client(server.app) as client:
+        token, user_id = await signup(client, unique_name("bench_search"))
+        headers = {"Authorization": f"Bearer {token}"}
+        try:
+            started = time.perf_counter()
+            words = await seed(user_id, args.notes, rng)
+            results["seed_seconds"] = round(time.perf_counter() - started, 1)
+            await ensure_indexes(server.db)
+
+            for name, q in queries(words).items():
+                results[name] = {
+                    "q": q,
+                    "search": await time_api(client, headers, q, args.repeat),
+                    "regex_scan": await time_regex_scan(user_id, q, max(1, args.repeat // 4)),
+                }
+        finally:
+            await server.db.notes.delete_many({"user_id": user_id})
+            await server.db.users.delete_many({"id": user_id})
+    print(json.dumps(results, indent=2))
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--notes", type=int, default=100000)
+    parser.add_argument("--repeat", type=int, default=20)
+    parser.add_argument("--seed", type=int, default=1)
+    asyncio.run(main(parser.parse_args()))
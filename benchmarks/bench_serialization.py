@@ -0,0 +1,118 @@
+"""Serialization cost per 1000 list rows, before and after lean list responses.
+
+"before" is what the list endpoints used to do: full documents (``{"_id": 0}``)
+validated and serialized through the full ``response_model`` by FastAPI's own
+``serialize_response``, then rendered by ``JSONResponse`` (notes were already
+projected, so only their validation pass is saved).  "after" is the
+projected rows rendered directly by ``FastJSONResponse``.  No database is
+involved; rows are synthesized in the shape the server stores them.
+
+    python -m benchmarks.bench_serialization --rows 1000 --repeat 50
+"""
+import argparse
+import asyncio
+import json
+import time
+import uuid
+from datetime import datetime, timedelta, timezone
+from typing import List, Optional
+
+from fastapi.responses import JSONResponse
+from fastapi.routing import serialize_response
+from fastapi.utils import create_response_field
+from pydantic import create_model
+
+from benchmarks._common import summarize
+
+from backend import server
+from backend.responses import FastJSONResponse, orjson, projection_for
+from backend.search import index_fields
+
+
+def _stored(i, **fields):
+    created_at = datetime.now(timezone.utc) - timedelta(minutes=i)
+    return {"id": str(uuid.uuid4()), "user_id": "u1", "created_at": created_at,
+            "seq": i + 1, "updated_at": created_at, **fields}
+
+
+def datasets(rows):
+    content = "Went for a long walk by the river and wrote down everything I saw. " * 6
+    return {
+        "notes": (server.NoteListItem, server.NoteListItem, [
+            _stored(i, title=f"note {i}", content=content, theme="sepia", font="serif", attachments=[],
+                    month_day="01-01", search=index_fields(f"note {i}", content))
+            for i in range(rows)
+        ]),
+        "reminders": (server.Reminder, server.ReminderListItem, [
+            _stored(i, title=f"reminder {i}", date="2026-01-01", note="bring the tickets")
+            for i in range(rows)
+        ]),
+        "checkbox_notes": (server.CheckboxNote, server.CheckboxNoteListItem, [
+            _stored(i, title=f"list {i}", version=3,
+                    items=[{"id": str(uuid.uuid4()), "text": f"item {j}", "checked": j % 2 == 0} for j in range(8)])
+            for i in range(rows)
+        ]),
+        "messages": (server.Message, server.MessageListItem, [
+            {**_stored(i, from_user_id="u1", to_user_id="u2", content="see you at eight", read_by=["u2"]),
+             "conversation_id": "u1:u2"}
+            for i in range(rows)
+        ]),
+    }
+
+
+def page_model(item_model):
+    return create_model(f"{item_model.__name__}Page", items=(List[item_model], ...), next_cursor=(Optional[str], None))
+
+
+async def before(field, docs):
+    content = await serialize_response(field=field, response_content={"items": docs, "next_cursor": None})
+    return JSONResponse(content).body
+
+
+def after(projection, docs):
+    # stands in for the Mongo-side projection, so "after" is slightly overstated
+    rows = [{key: doc[key] for key in projection if key in doc} for doc in docs]
+    return FastJSONResponse({"items": rows, "next_cursor": None}).body
+
+
+async def measure(fn, repeat):
+    samples, body = [], b""
+    for _ in range(repeat):
+        started = time.perf_counter()
+        body = fn()
+        if asyncio.iscoroutine(body):
+            body = await body
+        samples.append(time.perf_counter() - started)
+    return summarize(samples), len(body)
+
+
+async def main(args):
+    results = {"rows": args.rows, "orjson": orjson is not None}
+    for name, (full_model, lean_model, docs) in datasets(args.rows).items():
+        projection = projection_for(lean_model)
+        if full_model is lean_model:
+            full = [{key: doc[key] for key in projection if key in doc} for doc in docs]
+        else:
+            # what {"_id": 0} handed the old code: everything but _id
+            full = [{k: v for k, v in doc.items() if k != "_id"} for doc in docs]
+        field = create_response_field(name="response", type_=page_model(full_model))
+
+        before_stats, before_bytes = await measure(lambda: before(field, full), args.repeat)
+        after_stats, after_bytes = await measure(lambda: after(projection, docs), args.repeat)
+        scale = 1000 / args.rows
+        results[name] = {
+            "before": {**before_stats, "bytes": before_bytes},
+            "after": {**after_stats, "bytes": after_bytes},
+            "p50_ms_per_1000_rows": {
+                "before": round(before_stats["p50_ms"] * scale, 2),
+                "after": round(after_stats["p50_ms"] * scale, 2),
+            },
+        }
+    print(json.dumps(results, indent=2))
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--rows", type=int, default=1000)
+    parser.add_argument("--repeat", type=int, default=50)
+    asyncio.run(main(parser.parse_args()))
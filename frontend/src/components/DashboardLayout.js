@@ -6,6 +6,7 @@ import { ScrollArea } from "../components/ui/scroll-area";
 import { PenLine, FileText, Calendar, Clock, Users, CheckSquare, LogOut, BookHeart, Camera } from "lucide-react";
 import { toast } from "sonner";
 import axios from "axios";
+import { avatarUrl } from "../lib/media";
 import {
   Dialog,
   DialogContent,
@@ -161,7 +162,7 @@ export default function DashboardLayout() {
                   aria-label="View profile photo"
                 >
                   {avatar ? (
-                    <img src={avatar} alt="Profile" className="w-16 h-16 rounded-full object-cover border" />
+                    <img src={avatarUrl(avatar, 128)} alt="Profile" className="w-16 h-16 rounded-full object-cover border" />
                   ) : (
                     <div className="w-16 h-16 rounded-full bg-muted flex items-center justify-center text-lg text-muted-foreground">{usernameInitials}</div>
                   )}
@@ -187,7 +188,7 @@ export default function DashboardLayout() {
 
                     <div className="flex items-center justify-center py-4">
                       {avatar ? (
-                        <img src={avatar} alt="Profile large" className="max-w-full max-h-[48vh] rounded-lg object-contain" />
+                        <img src={avatarUrl(avatar, 256)} alt="Profile large" className="max-w-full max-h-[48vh] rounded-lg object-contain" />
                       ) : (
                         <div className="w-48 h-48 rounded-lg bg-muted flex items-center justify-center text-3xl text-muted-foreground">{usernameInitials}</div>
                       )}
@@ -0,0 +1,15 @@
+const BACKEND_URL = process.env.REACT_APP_BACKEND_URL;
+
+// Blob references come back as server-relative paths (/api/blobs/<id>);
+// data: and absolute URLs are passed through unchanged.
+export function mediaUrl(url) {
+  if (url && url.startsWith("/api/")) return `${BACKEND_URL}${url}`;
+  return url;
+}
+
+// Avatar URLs (/api/users/<name>/avatar?v=<hash>) take the thumbnail edge in
+// pixels; ask for twice the rendered size so it stays sharp on HiDPI screens.
+export function avatarUrl(url, size) {
+  if (url && url.startsWith("/api/users/")) return `${mediaUrl(url)}&size=${size}`;
+  return mediaUrl(url);
+}
@@ -0,0 +1,15 @@
+import axios from "axios";
+
+// Walks a cursor-paginated list endpoint ({ items, next_cursor }) to the end.
+export async function fetchAllPages(url, config = {}, pageSize = 200) {
+  const items = [];
+  let cursor = null;
+  do {
+    const params = { ...(config.params || {}), limit: pageSize };
+    if (cursor) params.cursor = cursor;
+    const res = await axios.get(url, { ...config, params });
+    items.push(...res.data.items);
+    cursor = res.data.next_cursor;
+  } while (cursor);
+  return items;
+}
@@ -14,6 +14,7 @@ import {
 import { Checkbox } from "../components/ui/checkbox";
 
 import axios from "axios";
+import { fetchAllPages } from "../lib/pagination";
 import { toast } from "sonner";
 import { CheckSquare, Plus, X } from "lucide-react";
 
@@ -35,10 +36,10 @@ export default function CheckboxNotesPage() {
   const fetchNotes = async () => {
     try {
       const token = localStorage.getItem("memora_token");
-      const response = await axios.get(`${API}/checkbox-notes`, {
+      const notes = await fetchAllPages(`${API}/checkbox-notes`, {
         headers: { Authorization: `Bearer ${token}` },
       });
-      setNotes(response.data);
+      setNotes(notes);
     } catch (error) {
       toast.error("Failed to fetch checkbox notes");
     }
@@ -90,22 +91,55 @@ export default function CheckboxNotesPage() {
   };
 
   const handleToggleItem = async (noteId, itemIndex, currentItems) => {
-    try {
-      const token = localStorage.getItem("memora_token");
-      const updatedItems = currentItems.map((item, i) =>
-        i === itemIndex ? { ...item, checked: !item.checked } : item
-      );
+    const note = notes.find((n) => n.id === noteId);
+    const item = currentItems[itemIndex];
+    const token = localStorage.getItem("memora_token");
+    const headers = { Authorization: `Bearer ${token}` };
 
-      const note = notes.find((n) => n.id === noteId);
-      await axios.put(
-        `${API}/checkbox-notes/${noteId}`,
-        { title: note.title, items: updatedItems },
-        { headers: { Authorization: `Bearer ${token}` } }
+    if (!item.id) {
+      try {
+        const updatedItems = currentItems.map((it, i) =>
+          i === itemIndex ? { ...it, checked: !it.checked } : it
+        );
+        await axios.put(
+          `${API}/checkbox-notes/${noteId}`,
+          { title: note.title, items: updatedItems },
+          { headers }
+        );
+        fetchNotes();
+      } catch (error) {
+        toast.error("Failed to update item");
+      }
+      return;
+    }
+
+    // Optimistic toggle; only the changed item and the new version come back
+    const applyItem = (changed, version) =>
+      setNotes((prev) =>
+        prev.map((n) =>
+          n.id === noteId
+            ? {
+                ...n,
+                version,
+                items: n.items.map((it) => (it.id === changed.id ? changed : it)),
+              }
+            : n
+        )
       );
+    applyItem({ ...item, checked: !item.checked }, note.version);
 
-      fetchNotes();
+    try {
+      const res = await axios.patch(
+        `${API}/checkbox-notes/${noteId}/items/${item.id}`,
+        { checked: !item.checked, expected_version: note.version },
+        { headers }
+      );
+      applyItem(res.data.item, res.data.version);
     } catch (error) {
-      toast.error("Failed to update item");
+      if (error.response?.status !== 409) {
+        toast.error("Failed to update item");
+      }
+      fetchNotes();
     }
   };
 
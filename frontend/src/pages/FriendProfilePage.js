@@ -75,7 +75,7 @@ export default function FriendProfilePage() {
       const res = await axios.get(`${API}/messages/${username}`, {
         headers: { Authorization: `Bearer ${token}` },
       });
-      setMessages(res.data);
+      setMessages(res.data.items);
 
       setTimeout(
         () => messagesEndRef.current?.scrollIntoView({ behavior: "smooth" }),
@@ -123,6 +123,7 @@ export default function FriendProfilePage() {
         const wsProto = BACKEND_URL.startsWith("https") ? "wss" : "ws";
         const host = new URL(BACKEND_URL).host;
         const ws = new WebSocket(`${wsProto}://${host}/ws?token=${token}`);
+        let retryDelay = 3000;
         wsRef.current = ws;
 
         ws.onopen = () => {
@@ -137,6 +138,12 @@ export default function FriendProfilePage() {
         ws.onmessage = (ev) => {
           try {
             const data = JSON.parse(ev.data);
+            // The server is restarting: reconnect after the jittered delay it asked for
+            if (data.event === "reconnect") {
+              retryDelay = data.payload?.retry_after_ms ?? 3000;
+              ws.close();
+              return;
+            }
             if (data.event === "new_message" && data.payload) {
               setMessages((prev) => [...prev, data.payload]);
               setTimeout(
@@ -151,7 +158,7 @@ export default function FriendProfilePage() {
         };
 
         ws.onclose = () => {
-          if (mounted) setTimeout(start, 3000);
+          if (mounted) setTimeout(start, retryDelay);
         };
       } catch {}
     };
@@ -14,6 +14,7 @@ import {
 } from "../components/ui/card";
 
 import axios from "axios";
+import { mediaUrl } from "../lib/media";
 import { toast } from "sonner";
 import { useNavigate } from "react-router-dom";
 import { Sparkles } from "lucide-react";
@@ -65,13 +66,27 @@ export default function NewNotePage() {
     reader.readAsDataURL(file);
   });
 
+  // Stream the raw file to the blob store; fall back to an inline data URL
+  // (the server moves those into the blob store on save) if that fails.
+  const uploadFile = async (f) => {
+    try {
+      const token = localStorage.getItem("memora_token");
+      const res = await axios.post(`${API}/blobs`, f, {
+        headers: { Authorization: `Bearer ${token}`, "Content-Type": f.type || "application/octet-stream" },
+      });
+      return { url: res.data.url, blob_id: res.data.blob_id };
+    } catch {
+      return { url: await readFileAsDataUrl(f) };
+    }
+  };
+
   const handleFiles = async (fileList) => {
     const files = Array.from(fileList || []);
     const results = await Promise.all(
       files.map(async (f) => {
-        const url = await readFileAsDataUrl(f);
+        const uploaded = await uploadFile(f);
         const type = f.type.startsWith("image") ? "image" : f.type.startsWith("video") ? "video" : "other";
-        return { type, name: f.name, url };
+        return { type, name: f.name, ...uploaded };
       }),
     );
     setAttachments((prev) => [...prev, ...results]);
@@ -142,9 +157,9 @@ export default function NewNotePage() {
                     {attachments.map((a, i) => (
                       <div key={i} className="rounded overflow-hidden border">
                         {a.type === 'image' ? (
-                          <img src={a.url} alt={a.name} className="w-full h-24 object-cover" />
+                          <img src={mediaUrl(a.url)} alt={a.name} className="w-full h-24 object-cover" />
                         ) : a.type === 'video' ? (
-                          <video src={a.url} className="w-full h-24 object-cover" controls />
+                          <video src={mediaUrl(a.url)} className="w-full h-24 object-cover" controls />
                         ) : (
                           <div className="p-3 text-sm">{a.name}</div>
                         )}
@@ -239,9 +254,9 @@ export default function NewNotePage() {
                 {attachments.map((a, i) => (
                   <div key={i} className="relative rounded-lg overflow-hidden border">
                     {a.type === 'image' ? (
-                      <img src={a.url} alt={a.name} className="w-full h-24 object-cover" />
+                      <img src={mediaUrl(a.url)} alt={a.name} className="w-full h-24 object-cover" />
                     ) : a.type === 'video' ? (
-                      <video src={a.url} className="w-full h-24 object-cover" controls />
+                      <video src={mediaUrl(a.url)} className="w-full h-24 object-cover" controls />
                     ) : (
                       <div className="p-4">{a.name}</div>
                     )}
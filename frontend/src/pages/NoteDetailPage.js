@@ -5,6 +5,7 @@ import { Card, CardContent } from "../components/ui/card";
 import { Button } from "../components/ui/button";
 
 import axios from "axios";
+import { mediaUrl } from "../lib/media";
 import { toast } from "sonner";
 import { useParams, useNavigate } from "react-router-dom";
 import { ArrowLeft, Calendar } from "lucide-react";
@@ -124,10 +125,10 @@ export default function NoteDetailPage() {
               {note.attachments.map((a, i) => (
                 <div key={i}>
                   {a.type === "image" && (
-                    <img src={a.url} alt={a.name} className="w-full rounded-md" />
+                    <img src={mediaUrl(a.url)} alt={a.name} className="w-full rounded-md" />
                   )}
                   {a.type === "video" && (
-                    <video src={a.url} controls className="w-full rounded-md" />
+                    <video src={mediaUrl(a.url)} controls className="w-full rounded-md" />
                   )}
                 </div>
               ))}
@@ -2,9 +2,10 @@ import React, { useState, useEffect } from "react";
 import { motion } from "framer-motion";
 import { Card, CardContent } from "../components/ui/card";
 import axios from "axios";
+import { fetchAllPages } from "../lib/pagination";
 import { toast } from "sonner";
 import { useNavigate } from "react-router-dom";
-import { FileText, Calendar, Edit, Trash } from "lucide-react";
+import { FileText, Calendar, Edit, Trash, Search } from "lucide-react";
 import { format } from "date-fns";
 import { Button } from "../components/ui/button";
 import { Input } from "../components/ui/input";
@@ -33,6 +34,18 @@ import {
 const BACKEND_URL = process.env.REACT_APP_BACKEND_URL;
 const API = `${BACKEND_URL}/api`;
 
+function Highlighted({ text, ranges }) {
+  const parts = [];
+  let last = 0;
+  ranges.forEach(([start, end], i) => {
+    parts.push(text.slice(last, start));
+    parts.push(<mark key={i} className="bg-primary/20 text-foreground rounded-sm">{text.slice(start, end)}</mark>);
+    last = end;
+  });
+  parts.push(text.slice(last));
+  return <>{parts}</>;
+}
+
 export default function PastNotesPage() {
   const [notes, setNotes] = useState([]);
   const [loading, setLoading] = useState(true);
@@ -50,17 +63,45 @@ export default function PastNotesPage() {
   const [deletingNoteId, setDeletingNoteId] = useState(null);
   const [deleteLoading, setDeleteLoading] = useState(false);
 
+  // Search state
+  const [query, setQuery] = useState("");
+  const [results, setResults] = useState(null);
+
   useEffect(() => {
     fetchNotes();
   }, []);
 
+  useEffect(() => {
+    if (!query.trim()) {
+      setResults(null);
+      return;
+    }
+    let cancelled = false;
+    const timer = setTimeout(async () => {
+      try {
+        const token = localStorage.getItem("memora_token");
+        const res = await axios.get(`${API}/notes/search`, {
+          params: { q: query },
+          headers: { Authorization: `Bearer ${token}` },
+        });
+        if (!cancelled) setResults(res.data.items);
+      } catch (error) {
+        if (!cancelled) toast.error("Search failed");
+      }
+    }, 250);
+    return () => {
+      cancelled = true;
+      clearTimeout(timer);
+    };
+  }, [query]);
+
   const fetchNotes = async () => {
     try {
       const token = localStorage.getItem("memora_token");
-      const response = await axios.get(`${API}/notes`, {
+      const notes = await fetchAllPages(`${API}/notes`, {
         headers: { Authorization: `Bearer ${token}` },
       });
-      setNotes(response.data);
+      setNotes(notes);
     } catch (error) {
       toast.error("Failed to fetch notes");
     } finally {
@@ -147,7 +188,46 @@ export default function PastNotesPage() {
         <p className="text-muted-foreground">Your collection of memories</p>
       </div>
 
-      {loading ? (
+      <div className="mb-6 relative">
+        <Search className="w-4 h-4 text-muted-foreground absolute left-3 top-1/2 -translate-y-1/2" />
+        <Input
+          data-testid="notes-search"
+          value={query}
+          onChange={(e) => setQuery(e.target.value)}
+          placeholder="Search your notes"
+          className="pl-9"
+        />
+      </div>
+
+      {results !== null ? (
+        results.length === 0 ? (
+          <p className="text-center py-12 text-muted-foreground">No notes match "{query}"</p>
+        ) : (
+          <div data-testid="search-results" className="grid gap-4">
+            {results.map((hit) => (
+              <Card
+                key={hit.id}
+                data-testid={`search-hit-${hit.id}`}
+                className="glass-card border-none shadow-[0_8px_30px_rgb(0,0,0,0.04)] hover:shadow-[0_12px_40px_rgb(0,0,0,0.08)] transition-all cursor-pointer"
+                onClick={() => navigate(`/dashboard/note/${hit.id}`)}
+              >
+                <CardContent className="p-6">
+                  <h3 className="text-xl font-serif font-semibold text-foreground mb-2">{hit.title}</h3>
+                  {hit.snippet && (
+                    <p className="text-sm text-muted-foreground mb-2">
+                      <Highlighted text={hit.snippet} ranges={hit.highlights} />
+                    </p>
+                  )}
+                  <div className="flex items-center gap-2 text-sm text-muted-foreground">
+                    <Calendar className="w-4 h-4" />
+                    <span>{format(new Date(hit.created_at), "MMMM d, yyyy")}</span>
+                  </div>
+                </CardContent>
+              </Card>
+            ))}
+          </div>
+        )
+      ) : loading ? (
         <div className="text-center py-12">
           <p className="text-muted-foreground">Loading your notes...</p>
         </div>
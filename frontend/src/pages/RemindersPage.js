@@ -20,6 +20,7 @@ import {
   CardTitle,
 } from "../components/ui/card";
 import axios from "axios";
+import { fetchAllPages } from "../lib/pagination";
 import { toast } from "sonner";
 import { Clock, Plus, Calendar } from "lucide-react";
 import { format } from "date-fns";
@@ -39,6 +40,9 @@ export default function RemindersPage() {
 
   const timersRef = useRef({});
   const acknowledgedRef = useRef(new Set());
+  // ids already alarmed, so a local timer and the server's reminder_due don't both fire
+  const firedRef = useRef(new Set());
+  const wsRef = useRef(null);
   const alarmIntervalRef = useRef(null);
   const activeAlarmRef = useRef(null);
   const [activeAlarm, setActiveAlarm] = useState(null);
@@ -92,6 +96,8 @@ export default function RemindersPage() {
   const triggerReminder = useCallback((rem) => {
     if (acknowledgedRef.current.has(rem.id)) return;
     if (activeAlarmRef.current?.id === rem.id) return;
+    if (firedRef.current.has(rem.id)) return;
+    firedRef.current.add(rem.id);
 
     if (window.Notification && Notification.permission === "granted") {
       try {
@@ -112,7 +118,7 @@ export default function RemindersPage() {
     list.forEach((rem) => {
       if (!rem.date) return;
 
-      const runAt = new Date(rem.date).getTime();
+      const runAt = new Date(rem.due_at || rem.date).getTime();
       const ms = runAt - now;
 
       if (ms <= 0) {
@@ -130,11 +136,11 @@ export default function RemindersPage() {
   const fetchReminders = useCallback(async () => {
     try {
       const token = localStorage.getItem("memora_token");
-      const res = await axios.get(`${API}/reminders`, {
+      const reminders = await fetchAllPages(`${API}/reminders`, {
         headers: { Authorization: `Bearer ${token}` },
       });
-      setReminders(res.data);
-      scheduleAllReminders(res.data);
+      setReminders(reminders);
+      scheduleAllReminders(reminders);
     } catch {
       toast.error("Failed to fetch reminders");
     }
@@ -146,15 +152,59 @@ export default function RemindersPage() {
     }
 
     fetchReminders();
-    const interval = setInterval(fetchReminders, 60000);
 
     return () => {
-      clearInterval(interval);
       clearTimers();
       stopAlarm();
     };
   }, [fetchReminders, clearTimers, stopAlarm]);
 
+  // Due reminders are pushed by the server, so they fire even if this tab's timers were throttled
+  useEffect(() => {
+    let mounted = true;
+
+    const connect = () => {
+      try {
+        const token = localStorage.getItem("memora_token");
+        if (!token) return;
+
+        const wsProto = BACKEND_URL.startsWith("https") ? "wss" : "ws";
+        const host = new URL(BACKEND_URL).host;
+        const ws = new WebSocket(`${wsProto}://${host}/ws?token=${token}`);
+        let retryDelay = 3000;
+        wsRef.current = ws;
+
+        ws.onmessage = (ev) => {
+          try {
+            const data = JSON.parse(ev.data);
+            // The server is restarting: reconnect after the jittered delay it asked for
+            if (data.event === "reconnect") {
+              retryDelay = data.payload?.retry_after_ms ?? 3000;
+              ws.close();
+              return;
+            }
+            if (data.event === "reminder_due" && data.payload) {
+              triggerReminder(data.payload);
+            }
+          } catch {}
+        };
+
+        ws.onclose = () => {
+          if (mounted) setTimeout(connect, retryDelay);
+        };
+      } catch {}
+    };
+
+    connect();
+
+    return () => {
+      mounted = false;
+      try {
+        wsRef.current?.close();
+      } catch {}
+    };
+  }, [triggerReminder]);
+
   const handleSubmit = async (e) => {
     e.preventDefault();
     setLoading(true);
@@ -162,18 +212,20 @@ export default function RemindersPage() {
     try {
       const token = localStorage.getItem("memora_token");
       const reminderDate = time ? `${date}T${time}` : date;
+      // the date is in the user's zone; send the instant so the server fires it on time
+      const dueAt = new Date(reminderDate).toISOString();
 
       if (editingId) {
         await axios.put(
           `${API}/reminders/${editingId}`,
-          { title, date: reminderDate, note: note || null },
+          { title, date: reminderDate, due_at: dueAt, note: note || null },
           { headers: { Authorization: `Bearer ${token}` } }
         );
         toast.success("Reminder updated!");
       } else {
         await axios.post(
           `${API}/reminders`,
-          { title, date: reminderDate, note: note || null },
+          { title, date: reminderDate, due_at: dueAt, note: note || null },
           { headers: { Authorization: `Bearer ${token}` } }
         );
         toast.success("Reminder created!");
@@ -183,6 +235,7 @@ export default function RemindersPage() {
       setDate("");
       setTime("");
       setNote("");
+      if (editingId) firedRef.current.delete(editingId);
       setEditingId(null);
       setShowForm(false);
       fetchReminders();
@@ -0,0 +1,37 @@
+import os
+
+import pytest
+
+os.environ.setdefault("MONGO_URL", "mongodb://localhost:27017")
+os.environ.setdefault("DB_NAME", "memora_test")
+
+
+@pytest.fixture
+def mock_db(monkeypatch):
+    """Point ``backend.server`` at an in-memory mongomock database."""
+    mongomock_motor = pytest.importorskip("mongomock_motor")
+    from backend import server
+    from backend.blobs import create_blob_store
+    from backend.friends import FriendGraph
+
+    db = mongomock_motor.AsyncMongoMockClient(tz_aware=True)["memora_test"]
+    monkeypatch.setattr(server, "db", db)
+    monkeypatch.setattr(server, "blob_store", create_blob_store(db))
+    monkeypatch.setattr(server, "friend_graph", FriendGraph(db))
+    server.token_cache.clear()
+    server.user_cache.clear()
+    return db
+
+
+@pytest.fixture
+def login_as():
+    """Override auth so requests run as the given user without a real token."""
+    from backend import server
+
+    def _login(user_id, username=None):
+        server.app.dependency_overrides[server.get_current_user] = lambda: {
+            "user_id": user_id, "username": username or user_id,
+        }
+
+    yield _login
+    server.app.dependency_overrides.clear()
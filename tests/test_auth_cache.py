@@ -0,0 +1,47 @@
+import asyncio
+
+from fastapi.testclient import TestClient
+
+from backend import server
+from backend.cache import TTLCache
+
+client = TestClient(server.app)
+
+
+def test_ttl_cache_expires_and_evicts():
+    now = [0.0]
+    cache = TTLCache(maxsize=2, ttl=10, clock=lambda: now[0])
+    cache.set("a", 1)
+    cache.set("b", 2)
+    cache.set("c", 3)
+    assert cache.get("a") is None and cache.evictions == 1
+    now[0] = 11
+    assert cache.get("b") is None
+    assert cache.stats()["misses"] == 2
+
+
+def test_token_is_verified_once(mock_db):
+    token = server.create_token("u1", "alice")
+    headers = {"Authorization": f"Bearer {token}"}
+    hits_before = server.token_cache.hits
+    for _ in range(3):
+        assert client.get("/api/auth/me", headers=headers).json()["user_id"] == "u1"
+    assert server.token_cache.hits - hits_before == 2
+
+
+def test_resolve_user_caches_and_invalidates(mock_db):
+    asyncio.run(mock_db.users.insert_one({"id": "u1", "username": "alice"}))
+
+    async def lookups():
+        first = await server.resolve_user("alice")
+        second = await server.resolve_user("alice")
+        return first, second
+
+    first, second = asyncio.run(lookups())
+    assert first == second == {"id": "u1", "username": "alice"}
+    assert len(server.user_cache) == 1
+
+    server.token_cache.set("tok", {"user_id": "u1", "username": "alice"})
+    server.invalidate_user("u1", "alice")
+    assert len(server.user_cache) == 0
+    assert server.token_cache.get("tok") is None
@@ -0,0 +1,106 @@
+import asyncio
+import base64
+import io
+
+from fastapi.testclient import TestClient
+from PIL import Image
+
+from backend import server
+from backend.avatars import pick_size
+from backend.migrations import build_avatar_thumbnails
+from backend.server import app
+
+client = TestClient(app)
+
+
+def _png(width=600, height=400):
+    out = io.BytesIO()
+    Image.new("RGB", (width, height), (200, 40, 40)).save(out, "PNG")
+    return out.getvalue()
+
+
+def _data_url(data):
+    return "data:image/png;base64," + base64.b64encode(data).decode()
+
+
+def _upload(mock_db, login_as):
+    asyncio.run(mock_db.users.insert_one({"id": "u1", "username": "alice", "created_at": None}))
+    login_as("u1", "alice")
+    resp = client.post("/api/users/me/avatar", json={"avatar": _data_url(_png())})
+    assert resp.status_code == 200
+    return resp.json()["avatar"]
+
+
+def test_upload_stores_square_thumbnails(mock_db, login_as):
+    url = _upload(mock_db, login_as)
+    assert url.startswith("/api/users/alice/avatar?v=")
+
+    user = asyncio.run(mock_db.users.find_one({"id": "u1"}))
+    assert sorted(user["avatar_thumbs"]) == ["128", "256", "64"]
+    assert "avatar_blob_id" not in user
+
+    resp = client.get(url + "&size=64")
+    assert resp.status_code == 200 and resp.headers["content-type"] == "image/webp"
+    assert resp.headers["x-content-type-options"] == "nosniff"
+    assert Image.open(io.BytesIO(resp.content)).size == (64, 64)
+    assert resp.headers["cache-control"] == "public, max-age=31536000, immutable"
+
+
+def test_avatar_sizes_and_revalidation(mock_db, login_as):
+    url = _upload(mock_db, login_as)
+    assert Image.open(io.BytesIO(client.get(url + "&size=100").content)).size == (128, 128)
+    assert Image.open(io.BytesIO(client.get(url + "&size=1000").content)).size == (256, 256)
+
+    bare = client.get("/api/users/alice/avatar")
+    assert bare.headers["cache-control"] == "public, no-cache"
+    assert client.get("/api/users/alice/avatar", headers={"If-None-Match": bare.headers["etag"]}).status_code == 304
+    assert client.get("/api/users/bob/avatar").status_code == 404
+
+
+def test_profile_carries_only_the_url(mock_db, login_as):
+    url = _upload(mock_db, login_as)
+    assert client.get("/api/users/me/profile").json()["avatar"] == url
+
+    client.delete("/api/users/me/avatar")
+    assert client.get("/api/users/alice/avatar").status_code == 404
+
+
+def test_undecodable_avatar_is_rejected(mock_db, login_as):
+    login_as("u1", "alice")
+    resp = client.post("/api/users/me/avatar", json={"avatar": _data_url(b"not an image")})
+    assert resp.status_code == 400
+
+
+def test_thumbnail_stored_under_an_active_type_is_not_rendered(mock_db):
+    async def run():
+        manifest = await server.blob_store.put_bytes(b"<script>alert(1)</script>", "text/html")
+        await mock_db.users.insert_one(
+            {"id": "u1", "username": "alice", "avatar_thumbs": {"128": manifest["id"]}, "avatar_hash": "h"}
+        )
+
+    asyncio.run(run())
+    resp = client.get("/api/users/alice/avatar")
+    assert resp.headers["content-type"] == "application/octet-stream"
+    assert resp.headers["x-content-type-options"] == "nosniff"
+
+
+def test_migration_thumbnails_existing_avatars(mock_db):
+    async def run():
+        manifest = await server.blob_store.put_bytes(_png(300, 300), "image/png")
+        await mock_db.users.insert_many([
+            {"id": "u1", "username": "alice", "avatar": "/api/blobs/x", "avatar_blob_id": manifest["id"]},
+            {"id": "u2", "username": "bob", "avatar": "/api/blobs/y", "avatar_blob_id": "missing"},
+        ])
+        assert await build_avatar_thumbnails(mock_db) == 2
+        assert await build_avatar_thumbnails(mock_db) == 0
+        return {doc["id"]: doc async for doc in mock_db.users.find({}, {"_id": 0})}
+
+    users = asyncio.run(run())
+    assert users["u1"]["avatar"].startswith("/api/users/alice/avatar?v=") and len(users["u1"]["avatar_thumbs"]) == 3
+    assert "avatar" not in users["u2"]
+
+
+def test_pick_size():
+    assert pick_size({"64": "a", "128": "b"}, 65) == "128"
+    assert pick_size({"64": "a", "128": "b"}, 500) == "128"
+    assert pick_size({}, 64) is None
@@ -0,0 +1,147 @@
+import asyncio
+import base64
+import hashlib
+from datetime import datetime, timedelta, timezone
+
+from fastapi.testclient import TestClient
+
+from backend.blobs import BlobStore, BlobTooLarge, MongoChunkStore, parse_range, served_content_type
+from backend.migrations import move_inline_blobs
+from backend.server import app
+
+client = TestClient(app)
+
+
+def test_identical_content_is_stored_once(mock_db):
+    store = BlobStore(mock_db, MongoChunkStore(mock_db.blob_chunks), chunk_size=4)
+
+    async def run():
+        a = await store.put_bytes(b"abcdabcdxy", "text/plain")
+        b = await store.put_bytes(b"abcdabcdxy", "text/plain")
+        return a, b, await mock_db.blob_chunks.count_documents({}), await store.read(a["id"])
+
+    a, b, chunk_count, data = asyncio.run(run())
+    assert a["id"] == b["id"]
+    assert a["chunks"][0] == a["chunks"][1]
+    assert chunk_count == 2
+    assert data == b"abcdabcdxy"
+
+
+def test_parse_range():
+    assert parse_range(None, 10) is None
+    assert parse_range("bytes=2-4", 10) == (2, 4)
+    assert parse_range("bytes=7-", 10) == (7, 9)
+    assert parse_range("bytes=-3", 10) == (7, 9)
+
+
+def test_note_attachment_moves_to_blob_store(mock_db, login_as):
+    login_as("u1")
+    payload = b"\x89PNG fake image bytes" * 50
+    data_url = "data:image/png;base64," + base64.b64encode(payload).decode()
+    resp = client.post("/api/notes", json={
+        "title": "t", "content": "c",
+        "attachments": [{"type": "image", "name": "a.png", "url": data_url}],
+    })
+    assert resp.status_code == 200
+    attachment = resp.json()["attachments"][0]
+    assert attachment["url"].startswith("/api/blobs/")
+
+    resp = client.get(attachment["url"])
+    assert resp.status_code == 200 and resp.content == payload
+    etag = resp.headers["etag"]
+
+    resp = client.get(attachment["url"], headers={"If-None-Match": etag})
+    assert resp.status_code == 304
+
+    resp = client.get(attachment["url"], headers={"Range": "bytes=5-9"})
+    assert resp.status_code == 206
+    assert resp.content == payload[5:10]
+    assert resp.headers["content-range"] == f"bytes 5-9/{len(payload)}"
+
+    resp = client.get(attachment["url"], headers={"Range": f"bytes={len(payload)}-"})
+    assert resp.status_code == 416
+
+
+def test_streaming_upload(mock_db, login_as):
+    login_as("u1")
+    resp = client.post("/api/blobs", content=b"hello world", headers={"Content-Type": "text/plain"})
+    assert resp.status_code == 200
+    body = resp.json()
+    assert body["size"] == 11
+    assert client.get(body["url"]).content == b"hello world"
+
+
+def test_chunks_of_failed_uploads_are_collected_later(mock_db):
+    store = BlobStore(mock_db, MongoChunkStore(mock_db.blob_chunks), chunk_size=4, max_bytes=12)
+
+    async def pieces(*chunks):
+        for piece in chunks:
+            yield piece
+
+    async def chunk_ids():
+        return sorted([doc["_id"] async for doc in mock_db.blob_chunks.find({}, {"_id": 1})])
+
+    async def run():
+        await store.put_bytes(b"abcd", "text/plain")
+        for _ in range(2):
+            try:
+                await store.put_stream(pieces(b"abcd", b"wxyz", b"more", b"1234"))
+            except BlobTooLarge:
+                pass
+            else:
+                raise AssertionError("expected BlobTooLarge")
+        # nothing is deleted while an upload sharing the chunks could still be running
+        before = await chunk_ids()
+        assert await store.collect_orphan_chunks() == 0
+        # a later upload now references one of the failed upload's chunks
+        await store.put_bytes(b"more", "text/plain")
+        an_hour_ago = datetime.now(timezone.utc) - timedelta(hours=1, seconds=1)
+        await mock_db.blob_orphans.update_many({}, {"$set": {"created_at": an_hour_ago}})
+        deleted = await store.collect_orphan_chunks()
+        return before, deleted, await chunk_ids(), await mock_db.blob_orphans.count_documents({})
+
+    before, deleted, after, orphans = asyncio.run(run())
+    digest = lambda data: hashlib.sha256(data).hexdigest()  # noqa: E731
+    assert len(before) == 3 and deleted == 1 and orphans == 0
+    assert after == sorted([digest(b"abcd"), digest(b"more")])
+
+
+def test_bad_inline_blobs_are_dropped_by_the_migration(mock_db):
+    good = "data:text/plain;base64," + base64.b64encode(b"hi").decode()
+
+    async def run():
+        await mock_db.notes.insert_one({"id": "n1", "attachments": [{"url": "data:nocomma"}, {"url": good}]})
+        await mock_db.users.insert_one({"id": "u1", "avatar": "data:image/png"})
+        assert await move_inline_blobs(mock_db) == 2
+        assert await move_inline_blobs(mock_db) == 0
+        return await mock_db.notes.find_one({"id": "n1"}), await mock_db.users.find_one({"id": "u1"})
+
+    note, user = asyncio.run(run())
+    assert [attachment["size"] for attachment in note["attachments"]] == [2]
+    assert "avatar" not in user
+
+
+def test_active_content_is_served_as_a_download(mock_db, login_as):
+    login_as("u1")
+    page = client.post("/api/blobs", content=b"<script>alert(1)</script>", headers={"Content-Type": "text/html"}).json()
+    resp = client.get(page["url"])
+    assert resp.headers["content-type"] == "application/octet-stream"
+    assert resp.headers["content-disposition"] == "attachment"
+    assert resp.headers["x-content-type-options"] == "nosniff"
+
+    image = client.post("/api/blobs", content=b"\x89PNG...", headers={"Content-Type": "image/png"}).json()
+    resp = client.get(image["url"])
+    assert resp.headers["content-type"] == "image/png" and "content-disposition" not in resp.headers
+    assert resp.headers["x-content-type-options"] == "nosniff"
+
+    assert served_content_type("image/svg+xml") == ("application/octet-stream", False)
+    assert served_content_type("Application/PDF; x=1") == ("application/pdf", True)
+
+
+def test_blob_revalidation_compares_whole_tags(mock_db, login_as):
+    login_as("u1")
+    url = client.post("/api/blobs", content=b"data", headers={"Content-Type": "image/png"}).json()["url"]
+    etag = client.get(url).headers["etag"]
+    assert client.get(url, headers={"If-None-Match": f'"x", {etag}'}).status_code == 304
+    assert client.get(url, headers={"If-None-Match": f'W/{etag}'}).status_code == 304
+    assert client.get(url, headers={"If-None-Match": f'"x{etag[1:]}'}).status_code == 200
@@ -0,0 +1,108 @@
+import asyncio
+
+from fastapi.testclient import TestClient
+
+from backend.migrations import backfill_checklist_item_ids
+from backend.server import app
+
+client = TestClient(app)
+
+
+def _checklist(*texts):
+    return client.post("/api/checkbox-notes", json={"title": "c", "items": [{"text": t} for t in texts]}).json()
+
+
+def test_items_get_stable_ids_and_version(mock_db, login_as):
+    login_as("u1")
+    note = _checklist("a", "b")
+    assert note["version"] == 1
+    assert all(item["id"] for item in note["items"])
+
+    ids = [item["id"] for item in note["items"]]
+    resp = client.put(f"/api/checkbox-notes/{note['id']}",
+                      json={"title": "c", "items": [{"id": ids[0], "text": "a2"}, {"text": "new"}]})
+    items = resp.json()["items"]
+    assert items[0]["id"] == ids[0] and items[1]["id"] not in ids
+    assert resp.json()["version"] == 2
+
+
+def test_toggle_returns_only_the_changed_item(mock_db, login_as):
+    login_as("u1")
+    note = _checklist("a", "b")
+    item = note["items"][1]
+
+    resp = client.patch(f"/api/checkbox-notes/{note['id']}/items/{item['id']}", json={"checked": True})
+    assert resp.status_code == 200
+    assert resp.json() == {"item": {**item, "checked": True}, "item_id": item["id"], "version": 2}
+
+    stored = client.get("/api/checkbox-notes").json()["items"][0]
+    assert [i["checked"] for i in stored["items"]] == [False, True]
+
+
+def test_insert_move_and_remove(mock_db, login_as):
+    login_as("u1")
+    note = _checklist("a", "b")
+    url = f"/api/checkbox-notes/{note['id']}/items"
+
+    inserted = client.post(url, json={"text": "first", "position": 0}).json()
+    assert inserted["version"] == 2
+    appended = client.post(url, json={"text": "last"}).json()
+
+    def texts():
+        return [i["text"] for i in client.get("/api/checkbox-notes").json()["items"][0]["items"]]
+
+    assert texts() == ["first", "a", "b", "last"]
+
+    moved = client.post(f"{url}/{appended['item_id']}/move", json={"position": 1}).json()
+    assert moved["version"] == 4
+    assert texts() == ["first", "last", "a", "b"]
+
+    removed = client.delete(f"{url}/{inserted['item_id']}").json()
+    assert removed == {"item": None, "item_id": inserted["item_id"], "version": 5}
+    assert texts() == ["last", "a", "b"]
+
+
+def test_stale_version_is_409_and_missing_targets_are_404(mock_db, login_as):
+    login_as("u1")
+    note = _checklist("a")
+    item_id = note["items"][0]["id"]
+    url = f"/api/checkbox-notes/{note['id']}/items/{item_id}"
+
+    assert client.patch(url, json={"checked": True, "expected_version": 1}).status_code == 200
+    stale = client.patch(url, json={"checked": False, "expected_version": 1})
+    assert stale.status_code == 409
+    assert stale.json()["detail"]["version"] == 2
+    assert client.post(f"{url}/move", json={"position": 0, "expected_version": 1}).status_code == 409
+
+    assert client.patch(f"/api/checkbox-notes/{note['id']}/items/missing", json={"checked": True}).status_code == 404
+    login_as("u2")
+    assert client.patch(url, json={"checked": True}).status_code == 404
+
+
+def test_backfill_assigns_item_ids(mock_db):
+    asyncio.run(mock_db.checkbox_notes.insert_one({"id": "n1", "items": [{"text": "a", "checked": False}]}))
+    assert asyncio.run(backfill_checklist_item_ids(mock_db)) == 1
+    doc = asyncio.run(mock_db.checkbox_notes.find_one({"id": "n1"}))
+    assert doc["version"] == 1 and doc["items"][0]["id"]
+    assert asyncio.run(backfill_checklist_item_ids(mock_db)) == 0
+
+
+def test_backfill_does_not_overwrite_a_concurrent_edit(mock_db, monkeypatch):
+    collection = type(mock_db.checkbox_notes)
+    bulk_write = collection.bulk_write
+    edited = []
+
+    async def edit_then_write(self, ops, **kwargs):
+        if not edited:
+            # the user saves the note between the migration's read and its write
+            edited.append(await mock_db.checkbox_notes.update_one({"id": "n1"}, {"$set": {
+                "items": [{"id": "i1", "text": "a", "checked": True}, {"id": "i2", "text": "b", "checked": False}],
+                "version": 1,
+            }}))
+        return await bulk_write(self, ops, **kwargs)
+
+    monkeypatch.setattr(collection, "bulk_write", edit_then_write)
+    asyncio.run(mock_db.checkbox_notes.insert_one({"id": "n1", "items": [{"text": "a", "checked": False}]}))
+    assert asyncio.run(backfill_checklist_item_ids(mock_db)) == 0
+    doc = asyncio.run(mock_db.checkbox_notes.find_one({"id": "n1"}))
+    assert doc["version"] == 1 and [item["id"] for item in doc["items"]] == ["i1", "i2"]
@@ -0,0 +1,118 @@
+import pytest
+from fastapi.testclient import TestClient
+
+from backend import compression, sync
+from backend.compression import choose_encoding, revalidated_variant
+from backend.etags import etag_matches
+from backend.server import app
+
+client = TestClient(app)
+
+
+@pytest.fixture
+def settled(monkeypatch):
+    monkeypatch.setattr(sync, "SETTLE_SECONDS", 0)
+
+
+def test_note_etag_revalidates_to_304(mock_db, login_as):
+    login_as("u1")
+    note = client.post("/api/notes", json={"title": "a", "content": "b"}).json()
+
+    first = client.get(f"/api/notes/{note['id']}")
+    etag = first.headers["etag"]
+    assert first.headers["cache-control"] == "private, no-cache"
+
+    cached = client.get(f"/api/notes/{note['id']}", headers={"If-None-Match": etag})
+    assert cached.status_code == 304 and cached.content == b"" and cached.headers["etag"] == etag
+
+    client.put(f"/api/notes/{note['id']}", json={"title": "a2", "content": "b"})
+    changed = client.get(f"/api/notes/{note['id']}", headers={"If-None-Match": etag})
+    assert changed.status_code == 200 and changed.json()["title"] == "a2"
+    assert changed.headers["etag"] != etag
+
+    assert client.get("/api/notes/missing", headers={"If-None-Match": etag}).status_code == 404
+
+
+@pytest.mark.parametrize("path,body", [
+    ("/api/notes", {"title": "a", "content": "b"}),
+    ("/api/reminders", {"title": "r", "date": "2026-01-01"}),
+    ("/api/checkbox-notes", {"title": "c", "items": [{"text": "x"}]}),
+])
+def test_list_etag_changes_with_any_write(mock_db, login_as, settled, path, body):
+    login_as("u1")
+    client.post(path, json=body)
+
+    etag = client.get(path).headers["etag"]
+    assert client.get(path, headers={"If-None-Match": etag}).status_code == 304
+    # pages are tagged separately
+    assert client.get(path, params={"limit": 1}).headers["etag"] != etag
+
+    client.post(path, json=body)
+    fresh = client.get(path, headers={"If-None-Match": etag})
+    assert fresh.status_code == 200 and len(fresh.json()["items"]) == 2
+
+
+def test_list_is_not_tagged_while_a_write_may_be_in_flight(mock_db, login_as):
+    login_as("u1")
+    client.post("/api/notes", json={"title": "a", "content": "b"})
+    resp = client.get("/api/notes")
+    assert resp.status_code == 200 and "etag" not in resp.headers
+
+
+def test_large_responses_are_gzipped_and_keep_revalidating(mock_db, login_as, settled):
+    login_as("u1")
+    for i in range(20):
+        client.post("/api/notes", json={"title": f"note {i}", "content": "word " * 50})
+
+    raw = client.get("/api/notes", headers={"Accept-Encoding": "gzip"})
+    assert raw.headers["content-encoding"] == "gzip"
+    assert "Accept-Encoding" in raw.headers["vary"]
+    assert raw.headers["etag"].endswith('-gzip"')
+    assert len(raw.json()["items"]) == 20
+    # httpx has already decoded the body; the header is the compressed size
+    assert int(raw.headers["content-length"]) < len(raw.content)
+
+    cached = client.get("/api/notes", headers={"Accept-Encoding": "gzip", "If-None-Match": raw.headers["etag"]})
+    assert cached.status_code == 304
+    # the 304 carries the tag the gzip 200 had, not the bare one
+    assert cached.headers["etag"] == raw.headers["etag"]
+
+    identity = client.get("/api/notes", headers={"Accept-Encoding": "identity"})
+    assert identity.headers["etag"] == raw.headers["etag"].replace("-gzip", "")
+    revalidated = client.get("/api/notes", headers={"Accept-Encoding": "identity",
+                                                    "If-None-Match": identity.headers["etag"]})
+    assert revalidated.status_code == 304 and revalidated.headers["etag"] == identity.headers["etag"]
+
+
+def test_small_responses_are_not_compressed(mock_db, login_as):
+    login_as("u1")
+    resp = client.get("/api/reminders", headers={"Accept-Encoding": "gzip"})
+    assert "content-encoding" not in resp.headers
+    assert "Accept-Encoding" in resp.headers["vary"]
+
+
+def test_encoding_negotiation(monkeypatch):
+    monkeypatch.setattr(compression, "brotli", None)
+    assert choose_encoding("gzip, deflate, br") == "gzip"
+    assert choose_encoding("gzip;q=0, identity") is None
+    assert choose_encoding("") is None
+
+    monkeypatch.setattr(compression, "brotli", object())
+    assert choose_encoding("gzip, br;q=0.5") == "br"
+    assert choose_encoding("br;q=0, gzip") == "gzip"
+
+
+def test_if_none_match_comparison():
+    assert etag_matches('"abc"', '"abc"')
+    assert etag_matches('W/"abc", "def"', '"abc"')
+    assert etag_matches('"abc-br"', '"abc"')
+    assert etag_matches("*", '"abc"')
+    assert not etag_matches('"abcd"', '"abc"')
+    assert not etag_matches(None, '"abc"')
+
+
+def test_revalidated_variant():
+    assert revalidated_variant('"abc-gzip"', '"abc"') == '"abc-gzip"'
+    assert revalidated_variant('"x", W/"abc-br"', '"abc"') == '"abc-br"'
+    assert revalidated_variant('"abc"', '"abc"') is None
+    assert revalidated_variant('"abcd-gzip"', '"abc"') is None
@@ -0,0 +1,138 @@
+import asyncio
+
+from backend.connections import ConnectionManager
+
+
+class FakeSocket:
+    def __init__(self, delay=0.0, fail=False):
+        self.delay = delay
+        self.fail = fail
+        self.sent = []
+        self.closed_with = None
+
+    async def send_json(self, data):
+        if self.fail:
+            raise RuntimeError("socket gone")
+        await asyncio.sleep(self.delay)
+        self.sent.append(data)
+
+    async def close(self, code=1000):
+        self.closed_with = code
+
+
+def test_slow_consumer_does_not_block_fast_one():
+    async def run():
+        manager = ConnectionManager(max_queue=2, policy="drop_oldest")
+        slow, fast = FakeSocket(delay=10), FakeSocket()
+        manager.register("u1", slow)
+        manager.register("u1", fast)
+        for i in range(5):
+            manager.deliver("u1", {"n": i})
+            await asyncio.sleep(0.001)
+        await asyncio.sleep(0.05)
+        return manager, slow, fast
+
+    manager, slow, fast = asyncio.run(run())
+    assert [e["n"] for e in fast.sent] == [0, 1, 2, 3, 4]
+    # slow socket is stuck on event 0 with a full queue of 2; the oldest 2 of 1..4 were dropped
+    assert manager.dropped == 2
+    assert manager.stats()["queue_depth_max"] == 2
+
+
+def test_disconnect_policy_closes_slow_consumer():
+    async def run():
+        manager = ConnectionManager(max_queue=1, policy="disconnect")
+        slow = FakeSocket(delay=10)
+        manager.register("u1", slow)
+        for i in range(3):
+            manager.deliver("u1", {"n": i})
+        await asyncio.sleep(0.05)
+        return manager, slow
+
+    manager, slow = asyncio.run(run())
+    assert slow.closed_with == 1013
+    assert manager.stats()["connections"] == 0
+
+
+def test_failed_socket_is_removed():
+    async def run():
+        manager = ConnectionManager()
+        manager.register("u1", FakeSocket(fail=True))
+        manager.deliver("u1", {"n": 1})
+        await asyncio.sleep(0.05)
+        return manager
+
+    manager = asyncio.run(run())
+    assert manager.connections == {}
+    assert manager.send_failures == 1
+
+
+class LeavingSocket(FakeSocket):
+    """Client that disconnects as soon as it is asked to reconnect."""
+
+    def __init__(self, manager):
+        super().__init__()
+        self.manager = manager
+
+    async def send_json(self, data):
+        await super().send_json(data)
+        if data["event"] == "reconnect":
+            self.manager.unregister(self.conn)
+
+
+def test_drain_hints_reconnect_then_closes_stragglers():
+    async def run():
+        manager = ConnectionManager()
+        leaving = LeavingSocket(manager)
+        leaving.conn = manager.register("u1", leaving)
+        stuck = FakeSocket()
+        manager.register("u2", stuck)
+        closed = await manager.drain(grace=0.2, spread=1)
+        return manager, leaving, stuck, closed
+
+    manager, leaving, stuck, closed = asyncio.run(run())
+    hint = leaving.sent[0]
+    assert hint["event"] == "reconnect" and 0 <= hint["payload"]["retry_after_ms"] <= 200
+    assert stuck.sent[0]["event"] == "reconnect" and stuck.closed_with == 1012
+    assert closed == 1 and leaving.closed_with is None
+    assert manager.connections == {} and manager.stats()["draining"]
+
+
+def test_drain_returns_once_everyone_left():
+    async def run():
+        manager = ConnectionManager()
+        leaving = LeavingSocket(manager)
+        leaving.conn = manager.register("u1", leaving)
+        loop = asyncio.get_running_loop()
+        started = loop.time()
+        await manager.drain(grace=10)
+        return loop.time() - started
+
+    assert asyncio.run(run()) < 1
+
+
+def test_draining_worker_refuses_new_websockets(monkeypatch):
+    from fastapi.testclient import TestClient
+
+    from backend import server
+
+    monkeypatch.setattr(server.connections, "draining", True)
+    with TestClient(server.app).websocket_connect("/ws?token=x") as ws:
+        message = ws.receive()
+    assert message["type"] == "websocket.close" and message["code"] == 1012
+
+
+def test_disconnect_policy_closes_only_once():
+    async def run():
+        manager = ConnectionManager(max_queue=1, policy="disconnect")
+        slow = FakeSocket(delay=10)
+        conn = manager.register("u1", slow)
+        for i in range(10):
+            manager.deliver("u1", {"n": i})
+        conn_closer = conn.closer
+        await asyncio.sleep(0.05)
+        return manager, slow, conn_closer
+
+    manager, slow, closer = asyncio.run(run())
+    assert manager.slow_disconnects == 1 and manager.dropped == 1
+    assert closer is not None and closer.done() and slow.closed_with == 1013
@@ -0,0 +1,42 @@
+import asyncio
+from datetime import datetime, timezone
+
+from fastapi.testclient import TestClient
+
+from backend.migrations import convert_iso_dates
+from backend.server import app
+
+client = TestClient(app)
+
+
+def test_dates_are_stored_natively_and_cursors_round_trip(mock_db, login_as):
+    login_as("u1")
+    for i in range(3):
+        client.post("/api/notes", json={"title": f"n{i}", "content": ""})
+    stored = asyncio.run(mock_db.notes.find_one({}))
+    assert isinstance(stored["created_at"], datetime) and isinstance(stored["updated_at"], datetime)
+
+    first = client.get("/api/notes", params={"limit": 2}).json()
+    second = client.get("/api/notes", params={"limit": 2, "cursor": first["next_cursor"]}).json()
+    assert [n["title"] for n in first["items"] + second["items"]] == ["n2", "n1", "n0"]
+    assert first["items"][0]["created_at"].endswith("Z")
+
+
+def test_convert_iso_dates_normalizes_offsets_and_resumes(mock_db):
+    async def run():
+        await mock_db.messages.insert_many([
+            {"id": "m1", "created_at": "2025-03-01T12:00:00+02:00"},
+            {"id": "m2", "created_at": "2025-03-01T11:00:00Z"},
+            {"id": "m3", "created_at": "2025-03-01T09:30:00"},
+            {"id": "m4", "created_at": datetime(2025, 3, 1, tzinfo=timezone.utc)},
+            {"id": "m5", "created_at": "not a date"},
+        ])
+        assert await convert_iso_dates(mock_db, batch_size=2) == 3
+        assert await convert_iso_dates(mock_db, batch_size=2) == 0
+        return await mock_db.messages.find({}, {"_id": 0}).sort("created_at", 1).to_list(None)
+
+    docs = asyncio.run(run())
+    assert [doc["id"] for doc in docs if isinstance(doc["created_at"], datetime)] == ["m4", "m3", "m1", "m2"]
+    by_id = {doc["id"]: doc["created_at"] for doc in docs}
+    assert by_id["m1"] == datetime(2025, 3, 1, 10, 0, tzinfo=timezone.utc)
+    assert [doc["id"] for doc in docs if isinstance(doc["created_at"], str)] == ["m5"]
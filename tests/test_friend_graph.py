@@ -0,0 +1,119 @@
+import asyncio
+import random
+from types import SimpleNamespace
+
+import pytest
+
+from backend.friends import FriendGraph
+
+mongomock_motor = pytest.importorskip("mongomock_motor")
+
+
+async def _jitter():
+    await asyncio.sleep(random.random() * 0.003)
+
+
+class SlowFriends:
+    """Wraps the friends collection with latency on both sides of every call."""
+
+    def __init__(self, collection):
+        self.collection = collection
+
+    async def insert_one(self, doc):
+        await _jitter()
+        result = await self.collection.insert_one(doc)
+        await _jitter()
+        return result
+
+    async def find_one_and_delete(self, query, projection=None):
+        await _jitter()
+        result = await self.collection.find_one_and_delete(query, projection)
+        await _jitter()
+        return result
+
+    def find(self, *args, **kwargs):
+        cursor = self.collection.find(*args, **kwargs)
+
+        class Cursor:
+            async def to_list(self, length):
+                await _jitter()
+                docs = await cursor.to_list(length)
+                await _jitter()
+                return docs
+
+        return Cursor()
+
+
+def test_cache_matches_database_after_concurrent_changes():
+    random.seed(7)
+    real = mongomock_motor.AsyncMongoMockClient()["memora_test"]
+    graph = FriendGraph(SimpleNamespace(friends=SlowFriends(real.friends)))
+    users = [f"u{i}" for i in range(4)]
+    names = [f"name{i}" for i in range(6)]
+
+    async def worker():
+        for _ in range(40):
+            user, name = random.choice(users), random.choice(names)
+            action = random.random()
+            if action < 0.3:
+                if not await real.friends.find_one({"user_id": user, "friend_username": name}):
+                    await graph.add({"user_id": user, "friend_username": name})
+            elif action < 0.5:
+                await graph.remove(user, name)
+            else:
+                await graph.is_friend(user, name)
+
+    async def run():
+        await asyncio.gather(*[worker() for _ in range(8)])
+        mismatches = []
+        for user in users:
+            cached = await graph.friends_of(user)
+            docs = await real.friends.find({"user_id": user}).to_list(None)
+            if cached != frozenset(d["friend_username"] for d in docs):
+                mismatches.append(user)
+        return mismatches
+
+    assert asyncio.run(run()) == []
+
+
+class GatedFriends:
+    """find() reads immediately but only returns once ``release`` is set."""
+
+    def __init__(self, collection):
+        self.collection = collection
+        self.read_done = asyncio.Event()
+        self.release = asyncio.Event()
+
+    async def find_one_and_delete(self, query, projection=None):
+        return await self.collection.find_one_and_delete(query, projection)
+
+    def find(self, *args, **kwargs):
+        cursor = self.collection.find(*args, **kwargs)
+        gate = self
+
+        class Cursor:
+            async def to_list(self, length):
+                docs = await cursor.to_list(length)
+                gate.read_done.set()
+                await gate.release.wait()
+                return docs
+
+        return Cursor()
+
+
+def test_load_racing_a_remove_does_not_cache_stale_set():
+    real = mongomock_motor.AsyncMongoMockClient()["memora_test"]
+
+    async def run():
+        gated = GatedFriends(real.friends)
+        graph = FriendGraph(SimpleNamespace(friends=gated))
+        await real.friends.insert_one({"user_id": "u1", "friend_username": "bob"})
+        load = asyncio.create_task(graph.friends_of("u1"))
+        await gated.read_done.wait()
+        await graph.remove("u1", "bob")
+        gated.release.set()
+        assert "bob" in await load  # the racing reader saw the old state...
+        gated.read_done.clear()
+        return await graph.is_friend("u1", "bob")  # ...but did not cache it
+
+    assert asyncio.run(run()) is False
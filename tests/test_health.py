@@ -0,0 +1,233 @@
+import asyncio
+from types import SimpleNamespace
+
+import pytest
+from fastapi.testclient import TestClient
+from pymongo import monitoring
+from pymongo.errors import AutoReconnect, ServerSelectionTimeoutError, WaitQueueTimeoutError
+
+from backend import database, migrations, server
+from backend.database import PoolMonitor, client_options
+from backend.server import app
+
+client = TestClient(app, raise_server_exceptions=False)
+
+ADDRESS = ("db1", 27017)
+
+
+def _event(**extra):
+    return SimpleNamespace(address=ADDRESS, **extra)
+
+
+@pytest.fixture
+def pool(monkeypatch):
+    monitor = PoolMonitor(max_pool_size=2)
+    monkeypatch.setattr(server, "pool_monitor", monitor)
+    return monitor
+
+
+@pytest.fixture
+def mongo_up(monkeypatch):
+    async def ping(client, timeout):
+        return True
+
+    monkeypatch.setattr(server, "client", object())
+    monkeypatch.setattr(server, "ping", ping)
+    monkeypatch.setattr(server, "broker_started", True)
+
+
+def test_pool_monitor_counts_checkouts():
+    monitor = PoolMonitor(max_pool_size=4)
+    monitor.pool_created(_event())
+    for _ in range(3):
+        monitor.connection_created(_event())
+        monitor.connection_check_out_started(_event())
+        monitor.connection_checked_out(_event())
+    monitor.connection_checked_in(_event())
+    monitor.connection_check_out_started(_event())
+    monitor.connection_check_out_failed(_event(reason=monitoring.ConnectionCheckOutFailedReason.TIMEOUT))
+
+    stats = monitor.stats()
+    server_stats = stats["servers"]["db1:27017"]
+    assert server_stats["open"] == 3 and server_stats["checked_out"] == 2 and server_stats["waiting"] == 0
+    assert server_stats["checkout_timeouts"] == 1 == server_stats["checkout_failures"]
+    assert stats["saturation"] == 0.5
+
+    monitor.pool_closed(_event())
+    assert monitor.stats()["servers"] == {}
+
+
+def test_liveness_does_not_touch_mongo(monkeypatch, pool):
+    monkeypatch.setattr(server, "client", None)
+    resp = client.get("/health/live")
+    assert resp.status_code == 200 and resp.json()["pool"]["max_pool_size"] == 2
+
+
+def test_ready_when_mongo_answers(pool, mongo_up):
+    resp = client.get("/health/ready")
+    assert resp.status_code == 200
+    assert resp.json()["status"] == "ready" and resp.json()["database"] == "ok"
+
+
+def test_not_ready_without_mongo(monkeypatch, pool):
+    monkeypatch.setattr(server, "client", None)
+    resp = client.get("/health/ready")
+    assert resp.status_code == 503 and resp.json()["database"] == "unavailable"
+
+
+def test_not_ready_while_requests_queue_for_connections(pool, mongo_up):
+    for _ in range(2):
+        pool.connection_check_out_started(_event())
+        pool.connection_checked_out(_event())
+    assert client.get("/health/ready").status_code == 200
+
+    pool.connection_check_out_started(_event())
+    resp = client.get("/health/ready")
+    assert resp.status_code == 503 and resp.json()["pool_saturated"] is True
+
+
+def test_exhausted_pool_is_a_retryable_503(mock_db, login_as, monkeypatch):
+    async def find_one(*args, **kwargs):
+        raise WaitQueueTimeoutError("timed out waiting for a connection")
+
+    login_as("u1")
+    # collection objects are created per attribute access, so patch the class
+    monkeypatch.setattr(type(mock_db.notes), "find_one", find_one)
+    resp = client.get("/api/notes/n1")
+    assert resp.status_code == 503 and resp.headers["retry-after"] == "1"
+
+
+def test_client_options_from_env(monkeypatch):
+    monkeypatch.setenv("MONGO_MAX_POOL_SIZE", "20")
+    monkeypatch.setenv("MONGO_WAIT_QUEUE_TIMEOUT_MS", "500")
+    options = client_options()
+    assert options["maxPoolSize"] == 20 and options["waitQueueTimeoutMS"] == 500
+    assert options["minPoolSize"] == 5
+
+
+def test_create_client_applies_pool_limits(monkeypatch):
+    monkeypatch.setenv("MONGO_MAX_POOL_SIZE", "7")
+    mongo = database.create_client("mongodb://localhost:27017")
+    try:
+        assert mongo.options.pool_options.max_pool_size == 7
+        assert mongo.codec_options.tz_aware
+    finally:
+        mongo.close()
+
+
+class FlakyBroker:
+    def __init__(self, failures):
+        self.failures = failures
+        self.stops = 0
+
+    async def start(self):
+        if self.failures:
+            self.failures -= 1
+            raise ServerSelectionTimeoutError("no primary")
+
+    async def stop(self):
+        self.stops += 1
+
+
+def test_not_ready_until_broker_starts(monkeypatch, pool, mongo_up):
+    monkeypatch.setattr(server, "broker_started", False)
+    monkeypatch.setattr(server, "broker", FlakyBroker(failures=2))
+    resp = client.get("/health/ready")
+    assert resp.status_code == 503 and resp.json()["broker"] is False
+
+    assert asyncio.run(server.start_broker()) is False
+    assert asyncio.run(server.start_broker(retry_delay=0)) is True
+    assert server.broker.stops == 2
+    assert client.get("/health/ready").status_code == 200
+
+
+def test_lifespan_holds_and_cancels_the_migrations_task(monkeypatch):
+    mongomock_motor = pytest.importorskip("mongomock_motor")
+
+    async def slow_migrations(db, migrations=None):
+        await asyncio.sleep(60)
+
+    async def ping(client, timeout):
+        return True
+
+    # restored afterwards; the lifespan rebinds all of them
+    for name in ("client", "db", "blob_store", "migrations_task", "index_report"):
+        monkeypatch.setattr(server, name, getattr(server, name))
+    for component in (server.friend_graph, server.broker, server.reminder_scheduler):
+        monkeypatch.setattr(component, "db", getattr(component, "db", None), raising=False)
+    monkeypatch.setattr(server, "create_client", lambda url, listeners: mongomock_motor.AsyncMongoMockClient())
+    monkeypatch.setattr(server, "ping", ping)
+    monkeypatch.setattr(server, "run_migrations", slow_migrations)
+    monkeypatch.setattr(server.password_hasher, "shutdown", lambda: None)
+
+    with TestClient(app):
+        task = server.migrations_task
+        assert task is not None and not task.done()
+    assert task.cancelled()
+
+
+def test_bootstrap_retries_indexes_and_interrupted_migrations(monkeypatch):
+    calls = []
+
+    async def ensure_indexes(db):
+        calls.append("indexes")
+        if calls.count("indexes") == 1:
+            raise ServerSelectionTimeoutError("no primary")
+        return {"created": []}
+
+    async def flaky(db):
+        calls.append("flaky")
+        if calls.count("flaky") == 1:
+            raise AutoReconnect("primary stepped down")
+
+    async def broken(db):
+        calls.append("broken")
+        raise ValueError("bug")
+
+    async def no_sleep(delay):
+        calls.append(delay)
+
+    monkeypatch.setattr(server, "index_report", None)
+    monkeypatch.setattr(server, "ensure_indexes", ensure_indexes)
+    monkeypatch.setattr(migrations, "MIGRATIONS", [flaky, broken])
+    monkeypatch.setattr(server.asyncio, "sleep", no_sleep)
+    monkeypatch.setattr(server, "DB_BOOTSTRAP_MAX_RETRY_SECONDS", 3)
+
+    asyncio.run(server.bootstrap_database(2))
+    # a bug isn't retried; losing the database is, with a growing delay
+    assert calls == ["indexes", 2, "indexes", "flaky", "broken", 3, "flaky"]
+    assert server.index_report == {"created": []}
+
+
+@pytest.mark.parametrize("path", ["/internal/password-pool", "/internal/websockets", "/internal/indexes"])
+def test_internal_endpoints_need_the_token(monkeypatch, path):
+    monkeypatch.setattr(server, "INTERNAL_TOKEN", None)
+    assert client.get(path).status_code == 403
+
+    monkeypatch.setattr(server, "INTERNAL_TOKEN", "s3cret")
+    assert client.get(path, headers={"X-Internal-Token": "wrong"}).status_code == 403
+    assert client.get(path, headers={"X-Internal-Token": "s3cret"}).status_code == 200
+
+
+async def _from_loopback(scope, receive, send):
+    await app({**scope, "client": ("127.0.0.1", 50000)}, receive, send)
+
+
+def test_loopback_is_trusted_only_when_opted_in(monkeypatch):
+    loopback = TestClient(_from_loopback)
+    monkeypatch.setattr(server, "INTERNAL_TOKEN", None)
+    # a proxy on this host makes every outside request look local
+    assert loopback.get("/internal/websockets").status_code == 403
+
+    monkeypatch.setattr(server, "INTERNAL_ALLOW_LOOPBACK", True)
+    assert loopback.get("/internal/websockets").status_code == 200
+    assert client.get("/internal/websockets").status_code == 403
+
+    # a configured token always wins
+    monkeypatch.setattr(server, "INTERNAL_TOKEN", "s3cret")
+    assert loopback.get("/internal/websockets").status_code == 403
+
+
+def test_loopback_check():
+    assert server.is_loopback("127.0.0.1") and server.is_loopback("::1")
+    assert not server.is_loopback("10.0.0.5") and not server.is_loopback("testclient")
@@ -0,0 +1,35 @@
+import asyncio
+
+import pytest
+
+mongomock_motor = pytest.importorskip("mongomock_motor")
+
+from backend.indexes import INDEXES, ensure_indexes
+
+
+def test_ensure_indexes_is_idempotent_and_reports_drift():
+    db = mongomock_motor.AsyncMongoMockClient()["memora_test"]
+
+    async def run():
+        await db.users.create_index([("email", 1)], name="stray")
+        first = await ensure_indexes(db)
+        second = await ensure_indexes(db)
+        return first, second
+
+    first, second = asyncio.run(run())
+    assert len(first["created"]) == len(INDEXES)
+    assert second["created"] == []
+    assert second["undeclared"] == ["users.stray"]
+
+
+def test_unique_username_index_rejects_duplicates():
+    db = mongomock_motor.AsyncMongoMockClient()["memora_test"]
+
+    async def run():
+        await ensure_indexes(db)
+        await db.users.insert_one({"id": "1", "username": "alice"})
+        await db.users.insert_one({"id": "2", "username": "alice"})
+
+    with pytest.raises(Exception) as excinfo:
+        asyncio.run(run())
+    assert "duplicate" in str(excinfo.value).lower()
@@ -0,0 +1,53 @@
+import asyncio
+from datetime import datetime, timezone
+
+from fastapi.testclient import TestClient
+
+from backend import responses
+from backend.server import MessageListItem, app
+
+client = TestClient(app)
+
+
+def test_list_rows_carry_only_their_lean_fields(mock_db, login_as):
+    login_as("u1")
+    client.post("/api/reminders", json={"title": "r", "date": "2026-01-01"})
+    client.post("/api/checkbox-notes", json={"title": "c", "items": [{"text": "x"}]})
+    client.post("/api/notes", json={"title": "n", "content": "long body"})
+
+    reminder = client.get("/api/reminders").json()["items"][0]
+    assert set(reminder) == {"id", "title", "date", "note", "due_at", "created_at"}
+    checklist = client.get("/api/checkbox-notes").json()["items"][0]
+    assert set(checklist) == {"id", "title", "items", "version", "created_at"}
+    note = client.get("/api/notes").json()["items"][0]
+    assert set(note) == {"id", "title", "created_at"}
+    assert note["created_at"].endswith("Z")
+
+
+def test_legacy_rows_get_the_model_defaults(mock_db, login_as):
+    created = datetime(2024, 5, 1, tzinfo=timezone.utc)
+    # written before note, due_at, version and read_by existed
+    asyncio.run(mock_db.reminders.insert_one(
+        {"id": "r1", "user_id": "u1", "title": "r", "date": "2024-05-02", "created_at": created}
+    ))
+    asyncio.run(mock_db.checkbox_notes.insert_one(
+        {"id": "c1", "user_id": "u1", "title": "c", "items": [], "created_at": created}
+    ))
+    login_as("u1")
+
+    reminder = client.get("/api/reminders").json()["items"][0]
+    assert reminder["note"] is None and reminder["due_at"] is None
+    assert client.get("/api/checkbox-notes").json()["items"][0]["version"] == 1
+
+
+def test_with_defaults_builds_fresh_mutable_defaults():
+    rows = responses.with_defaults(MessageListItem, [{"id": "m1"}, {"id": "m2", "read_by": ["u2"]}, {"id": "m3"}])
+    assert [row["read_by"] for row in rows] == [[], ["u2"], []]
+    assert rows[0]["read_by"] is not rows[2]["read_by"]
+
+
+def test_stdlib_fallback_matches_orjson(monkeypatch):
+    content = {"at": datetime(2026, 1, 2, 3, 4, 5, 6000, tzinfo=timezone.utc), "items": ["é"]}
+    fast = responses.FastJSONResponse(content).body
+    monkeypatch.setattr(responses, "orjson", None)
+    assert responses.FastJSONResponse(content).body == fast
@@ -12,3 +12,57 @@ def test_unread_counts_requires_auth():
 def test_mark_read_requires_auth():
     resp = client.post("/api/messages/someuser/read")
     assert resp.status_code == 401
+
+
+def _seed_friends(db):
+    import asyncio
+
+    async def seed():
+        await db.users.insert_many([{"id": "u1", "username": "alice"}, {"id": "u2", "username": "bob"}])
+        await db.friends.insert_many([
+            {"id": "f1", "user_id": "u1", "friend_username": "bob"},
+            {"id": "f2", "user_id": "u2", "friend_username": "alice"},
+        ])
+    asyncio.run(seed())
+
+
+def test_conversation_latest_page_and_cursors(mock_db, login_as):
+    _seed_friends(mock_db)
+    login_as("u1", "alice")
+    for i in range(5):
+        assert client.post("/api/messages", json={"to_username": "bob", "content": f"m{i}"}).status_code == 200
+
+    login_as("u2", "bob")
+    page = client.get("/api/messages/alice", params={"limit": 2}).json()
+    assert [m["content"] for m in page["items"]] == ["m3", "m4"]
+
+    older = client.get("/api/messages/alice", params={"limit": 2, "before": page["before_cursor"]}).json()
+    assert [m["content"] for m in older["items"]] == ["m1", "m2"]
+    oldest = client.get("/api/messages/alice", params={"limit": 2, "before": older["before_cursor"]}).json()
+    assert [m["content"] for m in oldest["items"]] == ["m0"]
+    assert oldest["before_cursor"] is None
+
+    client.post("/api/messages", json={"to_username": "alice", "content": "reply"})
+    newer = client.get("/api/messages/alice", params={"after": page["after_cursor"]}).json()
+    assert [m["content"] for m in newer["items"]] == ["reply"]
+
+
+def test_unread_counter_tracks_send_and_read(mock_db, login_as):
+    _seed_friends(mock_db)
+    login_as("u1", "alice")
+    client.post("/api/messages", json={"to_username": "bob", "content": "before counter"})
+
+    login_as("u2", "bob")
+    # counter was created by an $inc upsert, so the first read reseeds it from messages
+    assert client.get("/api/messages/unread_counts").json() == [
+        {"friend_user_id": "u1", "friend_username": "alice", "count": 1}
+    ]
+
+    login_as("u1", "alice")
+    for i in range(2):
+        client.post("/api/messages", json={"to_username": "bob", "content": f"m{i}"})
+
+    login_as("u2", "bob")
+    assert client.get("/api/messages/unread_counts").json()[0]["count"] == 3
+    assert client.post("/api/messages/alice/read").json() == {"updated": 3}
+    assert client.get("/api/messages/unread_counts").json() == []
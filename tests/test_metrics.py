@@ -0,0 +1,73 @@
+from types import SimpleNamespace
+
+from fastapi import FastAPI, HTTPException
+from fastapi.testclient import TestClient
+
+from backend import server
+from backend.metrics import Metrics, MetricsMiddleware, MongoCommandListener
+
+
+def _app():
+    metrics = Metrics()
+    listener = MongoCommandListener(metrics)
+    app = FastAPI()
+    app.add_middleware(MetricsMiddleware, metrics=metrics)
+
+    @app.get("/items/{item_id}")
+    async def get_item(item_id: str):
+        # what the driver reports for the commands this handler would issue
+        listener.succeeded(SimpleNamespace(command_name="find", duration_micros=2000))
+        listener.succeeded(SimpleNamespace(command_name="find", duration_micros=3000))
+        if item_id == "missing":
+            raise HTTPException(status_code=404)
+        return {"id": item_id}
+
+    return app, metrics, listener
+
+
+def test_requests_are_labelled_by_route_template():
+    app, metrics, _ = _app()
+    client = TestClient(app)
+    client.get("/items/a")
+    client.get("/items/b")
+    client.get("/items/missing")
+    client.get("/nowhere")
+
+    assert metrics.requests == {
+        ("GET", "/items/{item_id}", "200"): 2,
+        ("GET", "/items/{item_id}", "404"): 1,
+        ("GET", "unmatched", "404"): 1,
+    }
+    assert metrics.in_flight == 0
+    assert metrics.latency[("GET", "/items/{item_id}")].count == 3
+
+
+def test_mongo_commands_are_attributed_to_the_issuing_route():
+    app, metrics, listener = _app()
+    client = TestClient(app)
+    client.get("/items/a")
+    listener.failed(SimpleNamespace(command_name="update", duration_micros=1000))
+
+    assert metrics.mongo_commands == {("/items/{item_id}", "find"): 2, ("background", "update"): 1}
+    assert metrics.mongo_failures == {("background", "update"): 1}
+    per_request = metrics.commands_per_request[("/items/{item_id}",)]
+    assert per_request.count == 1 and per_request.sum == 2
+    assert abs(metrics.mongo_seconds_per_request[("/items/{item_id}",)].sum - 0.005) < 1e-9
+
+
+def test_render_is_prometheus_text():
+    app, metrics, _ = _app()
+    TestClient(app).get("/items/a")
+    text = metrics.render()
+
+    assert "# TYPE memora_http_request_duration_seconds histogram" in text
+    assert 'memora_http_requests_total{method="GET",route="/items/{item_id}",status="200"} 1' in text
+    assert 'memora_http_request_duration_seconds_bucket{method="GET",route="/items/{item_id}",le="+Inf"} 1' in text
+    assert 'memora_mongo_commands_total{route="/items/{item_id}",command="find"} 2' in text
+
+
+def test_metrics_endpoint(mock_db):
+    resp = TestClient(server.app).get("/metrics")
+    assert resp.status_code == 200
+    assert resp.headers["content-type"].startswith("text/plain")
+    assert "memora_http_requests_in_flight" in resp.text
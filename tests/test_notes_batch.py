@@ -0,0 +1,85 @@
+import asyncio
+
+from fastapi.testclient import TestClient
+
+from backend.server import app
+
+client = TestClient(app)
+
+
+def test_mixed_batch_reports_per_item_results(mock_db, login_as):
+    asyncio.run(mock_db.notes.insert_one({"id": "theirs", "user_id": "u2", "title": "x", "content": "x",
+                                          "created_at": "2024-01-01T00:00:00+00:00"}))
+    login_as("u1")
+    keep = client.post("/api/notes", json={"title": "keep", "content": "c"}).json()["id"]
+    drop = client.post("/api/notes", json={"title": "drop", "content": "c"}).json()["id"]
+
+    resp = client.post("/api/notes/batch", json={"operations": [
+        {"op": "create", "note": {"title": "new", "content": "c"}},
+        {"op": "update", "id": keep, "note": {"title": "kept", "content": "c2"}},
+        {"op": "delete", "id": drop},
+        {"op": "delete", "id": "theirs"},
+        {"op": "delete", "id": keep},
+        {"op": "update", "id": keep},
+    ]})
+    assert resp.status_code == 200, resp.text
+    statuses = [r["status"] for r in resp.json()]
+    assert statuses == ["created", "updated", "deleted", "not_found", "invalid", "invalid"]
+    created_id = resp.json()[0]["id"]
+
+    resp = client.post("/api/notes/batch/get", json={"ids": [keep, created_id, drop, "theirs"]})
+    body = resp.json()
+    assert [n["title"] for n in body["notes"]] == ["kept", "new"]
+    assert body["missing"] == [drop, "theirs"]
+
+
+def test_batch_size_is_capped(mock_db, login_as):
+    login_as("u1")
+    ops = [{"op": "delete", "id": str(i)} for i in range(501)]
+    assert client.post("/api/notes/batch", json={"operations": ops}).status_code == 422
+
+
+def test_bad_attachment_only_fails_its_own_item(mock_db, login_as):
+    login_as("u1")
+    existing = client.post("/api/notes", json={"title": "old", "content": "c"}).json()["id"]
+    bad = [{"url": "data:nocomma"}]
+
+    resp = client.post("/api/notes/batch", json={"operations": [
+        {"op": "create", "note": {"title": "good", "content": "c"}},
+        {"op": "create", "note": {"title": "bad", "content": "c", "attachments": bad}},
+        {"op": "update", "id": existing, "note": {"title": "bad", "content": "c", "attachments": bad}},
+    ]})
+    assert resp.status_code == 200, resp.text
+    results = resp.json()
+    assert [r["status"] for r in results] == ["created", "invalid", "invalid"]
+    assert results[1]["detail"] == "Invalid attachment data"
+
+    docs = asyncio.run(mock_db.notes.find({}, {"_id": 0, "title": 1, "seq": 1}).to_list(None))
+    assert sorted(doc["title"] for doc in docs) == ["good", "old"]
+    # only the write that was sent took a sequence number
+    assert sorted(doc["seq"] for doc in docs) == [1, 2]
+
+
+def test_notes_deleted_during_the_batch_are_not_found(mock_db, login_as, monkeypatch):
+    login_as("u1")
+    ids = [client.post("/api/notes", json={"title": t, "content": "c"}).json()["id"] for t in ("a", "b", "c", "d")]
+    collection = type(mock_db.notes)
+    bulk_write = collection.bulk_write
+
+    async def delete_then_write(self, requests, **kwargs):
+        # another device deletes two of the notes just before the batch lands
+        await mock_db.notes.delete_many({"id": {"$in": [ids[0], ids[2]]}})
+        return await bulk_write(self, requests, **kwargs)
+
+    monkeypatch.setattr(collection, "bulk_write", delete_then_write)
+    resp = client.post("/api/notes/batch", json={"operations": [
+        {"op": "update", "id": ids[0], "note": {"title": "a2", "content": "c"}},
+        {"op": "update", "id": ids[1], "note": {"title": "b2", "content": "c"}},
+        {"op": "delete", "id": ids[2]},
+        {"op": "delete", "id": ids[3]},
+    ]})
+    assert [r["status"] for r in resp.json()] == ["not_found", "updated", "not_found", "deleted"]
+
+    tombstones = asyncio.run(mock_db.sync_tombstones.find({}, {"_id": 0, "id": 1}).to_list(None))
+    assert [doc["id"] for doc in tombstones] == [ids[3]]
+    assert [doc["title"] for doc in asyncio.run(mock_db.notes.find().to_list(None))] == ["b2"]
@@ -0,0 +1,58 @@
+import asyncio
+from datetime import datetime, timezone
+
+import pytest
+from fastapi.testclient import TestClient
+
+from backend.migrations import backfill_note_month_day, convert_iso_dates
+from backend.server import app
+
+client = TestClient(app)
+
+
+def _note(note_id, created_at, **extra):
+    return {"id": note_id, "user_id": "u1", "title": note_id, "content": "c",
+            "created_at": created_at.isoformat(), **extra}
+
+
+def test_backfill_then_lookup(mock_db, login_as):
+    now = datetime.now(timezone.utc)
+    if (now.month, now.day) == (2, 29):
+        pytest.skip("no matching day in the previous year")
+    docs = [
+        _note("last-year", now.replace(year=now.year - 1)),
+        _note("two-years", now.replace(year=now.year - 2)),
+        _note("this-year", now),
+        _note("other-day", now.replace(year=now.year - 1, day=1 if now.day != 1 else 2)),
+    ]
+
+    async def seed():
+        await mock_db.notes.insert_many(docs)
+        assert await convert_iso_dates(mock_db, batch_size=3) == 4
+        return await backfill_note_month_day(mock_db, batch_size=2)
+
+    assert asyncio.run(seed()) == 4
+    assert asyncio.run(backfill_note_month_day(mock_db)) == 0
+
+    login_as("u1")
+    resp = client.get("/api/notes/on-this-day/list")
+    assert resp.status_code == 200
+    assert [n["id"] for n in resp.json()] == ["last-year", "two-years"]
+
+
+def test_backfill_skips_notes_without_a_usable_date(mock_db):
+    good = datetime(2020, 3, 14, tzinfo=timezone.utc)
+
+    async def run():
+        await mock_db.notes.insert_many([
+            {"id": "missing", "user_id": "u1"},
+            {"id": "garbled", "user_id": "u1", "created_at": "yesterday"},
+            {"id": "null", "user_id": "u1", "created_at": None},
+            {"id": "good", "user_id": "u1", "created_at": good},
+        ])
+        updated = await backfill_note_month_day(mock_db, batch_size=2)
+        return updated, {doc["id"]: doc.get("month_day") async for doc in mock_db.notes.find()}
+
+    updated, keys = asyncio.run(run())
+    assert updated == 1
+    assert keys == {"missing": None, "garbled": None, "null": None, "good": "03-14"}
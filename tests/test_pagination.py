@@ -0,0 +1,47 @@
+from fastapi.testclient import TestClient
+
+from backend.server import app
+
+client = TestClient(app)
+
+
+def _walk(path, limit):
+    ids, cursor = [], None
+    while True:
+        params = {"limit": limit}
+        if cursor:
+            params["cursor"] = cursor
+        resp = client.get(path, params=params)
+        assert resp.status_code == 200, resp.text
+        body = resp.json()
+        ids.extend(item["id"] for item in body["items"])
+        cursor = body["next_cursor"]
+        if not cursor:
+            return ids
+
+
+def test_notes_pages_cover_every_note_once(mock_db, login_as):
+    login_as("u1")
+    for i in range(7):
+        client.post("/api/notes", json={"title": f"n{i}", "content": "c"})
+    client.post("/api/notes", json={"title": "other", "content": "c"})
+
+    first = client.get("/api/notes", params={"limit": 3}).json()
+    assert len(first["items"]) == 3 and first["next_cursor"]
+    assert len(set(_walk("/api/notes", 3))) == 8
+
+
+def test_reminders_paginate_by_date(mock_db, login_as):
+    login_as("u1")
+    for day in (5, 1, 3, 2, 4):
+        client.post("/api/reminders", json={"title": "r", "date": f"2026-01-0{day}"})
+    ids = _walk("/api/reminders", 2)
+    assert len(ids) == 5
+    dates = [client.get("/api/reminders", params={"limit": 5}).json()["items"][i]["date"] for i in range(5)]
+    assert dates == sorted(dates)
+
+
+def test_invalid_cursor_is_rejected(mock_db, login_as):
+    login_as("u1")
+    resp = client.get("/api/checkbox-notes", params={"cursor": "not-a-cursor"})
+    assert resp.status_code == 400
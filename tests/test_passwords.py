@@ -0,0 +1,26 @@
+import asyncio
+
+from backend.passwords import PasswordHasher, PasswordPoolSaturated
+
+
+def test_hash_and_verify_on_pool():
+    hasher = PasswordHasher(max_workers=1)
+
+    async def run():
+        hashed = await hasher.hash("secret")
+        return await hasher.verify("secret", hashed), await hasher.verify("wrong", hashed)
+
+    assert asyncio.run(run()) == (True, False)
+    hasher.shutdown()
+
+
+def test_rejects_when_queue_full():
+    hasher = PasswordHasher(max_workers=1, max_queue=1)
+
+    async def run():
+        return await asyncio.gather(*[hasher.hash("x") for _ in range(3)], return_exceptions=True)
+
+    results = asyncio.run(run())
+    assert sum(isinstance(r, PasswordPoolSaturated) for r in results) == 1
+    assert hasher.stats()["rejected"] == 1
+    hasher.shutdown()
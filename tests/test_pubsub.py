@@ -0,0 +1,120 @@
+import asyncio
+import multiprocessing
+import threading
+
+import pytest
+
+from backend.pubsub import Broker, InProcessBroker, RedisBroker, _encode_command, _read_reply
+
+
+def _bulk(data: bytes) -> bytes:
+    return f"${len(data)}\r\n".encode() + data + b"\r\n"
+
+
+class StandInRedis:
+    """Just enough of the Redis PUBLISH/SUBSCRIBE protocol for broker tests."""
+
+    def __init__(self):
+        self.subscribers = {}
+        self.loop = asyncio.new_event_loop()
+        self.port = None
+        ready = threading.Event()
+        threading.Thread(target=self._run, args=(ready,), daemon=True).start()
+        ready.wait(5)
+
+    def _run(self, ready):
+        asyncio.set_event_loop(self.loop)
+        server = self.loop.run_until_complete(asyncio.start_server(self._handle, "127.0.0.1", 0))
+        self.port = server.sockets[0].getsockname()[1]
+        ready.set()
+        self.loop.run_forever()
+
+    async def _handle(self, reader, writer):
+        try:
+            while True:
+                command = await _read_reply(reader)
+                name = command[0].decode().upper()
+                if name == "SUBSCRIBE":
+                    channel = command[1]
+                    self.subscribers.setdefault(channel, []).append(writer)
+                    writer.write(b"*3\r\n" + _bulk(b"subscribe") + _bulk(channel) + b":1\r\n")
+                elif name == "PUBLISH":
+                    channel, payload = command[1], command[2]
+                    targets = self.subscribers.get(channel, [])
+                    for sub in targets:
+                        sub.write(_encode_command(b"message", channel, payload))
+                    writer.write(f":{len(targets)}\r\n".encode())
+                else:
+                    writer.write(b"+OK\r\n")
+                await writer.drain()
+        except (ConnectionError, asyncio.IncompleteReadError):
+            pass
+
+    @property
+    def url(self):
+        return f"redis://127.0.0.1:{self.port}"
+
+
+def _subscriber_worker(url, results):
+    async def main():
+        received = asyncio.Queue()
+
+        async def deliver(user_id, event):
+            await received.put((user_id, event))
+
+        broker = RedisBroker(deliver, url)
+        await broker.start()
+        results.put("ready")
+        results.put(await asyncio.wait_for(received.get(), timeout=10))
+        await broker.stop()
+
+    asyncio.run(main())
+
+
+def _publisher_worker(url):
+    async def main():
+        async def deliver(user_id, event):
+            pass
+
+        broker = RedisBroker(deliver, url)
+        await broker.start()
+        await broker.publish("u2", {"event": "new_message", "payload": {"content": "hi"}})
+        await broker.stop()
+
+    asyncio.run(main())
+
+
+def test_event_reaches_subscriber_in_another_process():
+    redis = StandInRedis()
+    ctx = multiprocessing.get_context("spawn")
+    results = ctx.Queue()
+
+    subscriber = ctx.Process(target=_subscriber_worker, args=(redis.url, results))
+    subscriber.start()
+    assert results.get(timeout=20) == "ready"
+
+    publisher = ctx.Process(target=_publisher_worker, args=(redis.url,))
+    publisher.start()
+    publisher.join(20)
+
+    assert results.get(timeout=20) == ("u2", {"event": "new_message", "payload": {"content": "hi"}})
+    subscriber.join(20)
+    assert publisher.exitcode == 0 and subscriber.exitcode == 0
+
+
+def test_in_process_broker_delivers_directly():
+    delivered = []
+
+    async def deliver(user_id, event):
+        delivered.append((user_id, event))
+
+    asyncio.run(InProcessBroker(deliver).publish("u1", {"event": "x"}))
+    assert delivered == [("u1", {"event": "x"})]
+
+
+def test_broker_without_publish_cannot_be_built():
+    class Incomplete(Broker):
+        pass
+
+    with pytest.raises(TypeError):
+        Incomplete(None)
@@ -0,0 +1,100 @@
+import asyncio
+from datetime import datetime, timedelta, timezone
+
+from fastapi.testclient import TestClient
+
+from backend.migrations import backfill_reminder_due_at
+from backend.reminders import ReminderScheduler, parse_due_at
+from backend.server import app
+
+client = TestClient(app)
+
+
+def _scheduler(db, sent, **kwargs):
+    async def publish(user_id, message):
+        sent.append((user_id, message))
+    return ReminderScheduler(db, publish, **kwargs)
+
+
+def test_parse_due_at_reads_iso_dates_as_utc():
+    assert parse_due_at("2026-03-01T09:30") == datetime(2026, 3, 1, 9, 30, tzinfo=timezone.utc)
+    assert parse_due_at("2026-03-01T09:30:00+02:00") == datetime(2026, 3, 1, 7, 30, tzinfo=timezone.utc)
+    assert parse_due_at("2026-03-01") == datetime(2026, 3, 1, tzinfo=timezone.utc)
+    assert parse_due_at("next tuesday") is None
+    assert parse_due_at(None) is None
+
+
+def test_only_one_scheduler_holds_the_lease(mock_db):
+    async def run():
+        first, second = _scheduler(mock_db, [], worker_id="a"), _scheduler(mock_db, [], worker_id="b")
+        assert await first.acquire_lease()
+        assert not await second.acquire_lease()
+        assert await first.acquire_lease()
+
+        # an expired lease is taken over
+        await mock_db.scheduler_leases.update_one(
+            {"_id": "reminders"}, {"$set": {"expires_at": datetime.now(timezone.utc) - timedelta(seconds=1)}}
+        )
+        assert await second.acquire_lease()
+        assert not await first.acquire_lease()
+
+        # stopping the leader releases the lease immediately
+        await second.stop()
+        assert await first.acquire_lease()
+
+    asyncio.run(run())
+
+
+def test_due_reminders_fire_once(mock_db, login_as):
+    login_as("u1")
+    past = (datetime.now(timezone.utc) - timedelta(minutes=1)).isoformat()
+    future = (datetime.now(timezone.utc) + timedelta(hours=1)).isoformat()
+    client.post("/api/reminders", json={"title": "missed", "date": "2020-01-01"})
+    soon = client.post("/api/reminders", json={"title": "soon", "date": "2026-01-01", "due_at": future}).json()
+
+    async def run():
+        sent = []
+        scheduler = _scheduler(mock_db, sent)
+        # reminders saved already in the past are not fired
+        assert await scheduler.fire_due() == 0
+
+        await mock_db.reminders.update_one({"id": soon["id"]}, {"$set": {"due_at": datetime.fromisoformat(past)}})
+        assert await scheduler.fire_due() == 1
+        assert await scheduler.fire_due() == 0
+        return sent
+
+    sent = asyncio.run(run())
+    assert [(user_id, message["event"], message["payload"]["id"]) for user_id, message in sent] == [
+        ("u1", "reminder_due", soon["id"])
+    ]
+
+
+def test_rescheduling_a_fired_reminder_arms_it_again(mock_db, login_as):
+    login_as("u1")
+    created = client.post("/api/reminders", json={"title": "r", "date": "2020-01-01"}).json()
+    doc = asyncio.run(mock_db.reminders.find_one({"id": created["id"]}))
+    assert doc["notified_at"] is not None
+
+    due = datetime.now(timezone.utc) + timedelta(days=1)
+    resp = client.put(f"/api/reminders/{created['id']}", json={"title": "r", "date": "x", "due_at": due.isoformat()})
+    assert resp.status_code == 200
+    doc = asyncio.run(mock_db.reminders.find_one({"id": created["id"]}))
+    assert doc["notified_at"] is None
+    assert abs(doc["due_at"] - due) < timedelta(milliseconds=1)
+
+
+def test_backfill_marks_past_reminders_notified(mock_db):
+    async def run():
+        await mock_db.reminders.insert_many([
+            {"id": "old", "user_id": "u1", "date": "2020-01-01T08:00"},
+            {"id": "new", "user_id": "u1", "date": "2999-01-01T08:00"},
+            {"id": "bad", "user_id": "u1", "date": "someday"},
+        ])
+        assert await backfill_reminder_due_at(mock_db) == 3
+        assert await backfill_reminder_due_at(mock_db) == 0
+        return {doc["id"]: doc async for doc in mock_db.reminders.find({}, {"_id": 0})}
+
+    docs = asyncio.run(run())
+    assert docs["old"]["notified_at"] is not None
+    assert docs["new"]["notified_at"] is None and docs["new"]["due_at"].year == 2999
+    assert docs["bad"]["due_at"] is None and docs["bad"]["notified_at"] is not None
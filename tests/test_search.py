@@ -0,0 +1,110 @@
+import asyncio
+
+from fastapi.testclient import TestClient
+
+from backend import search
+from backend.indexes import INDEXES
+from backend.migrations import backfill_note_search
+from backend.search import index_fields, search_notes, snippet, tokenize
+from backend.server import app
+
+client = TestClient(app)
+
+
+def _note(title, content):
+    return client.post("/api/notes", json={"title": title, "content": content}).json()
+
+
+def _search(q, **params):
+    resp = client.get("/api/notes/search", params={"q": q, **params})
+    assert resp.status_code == 200
+    return resp.json()["items"]
+
+
+def test_tokenize_folds_case_and_accents():
+    assert tokenize("Café au LAIT, crème!") == ["cafe", "au", "lait", "creme"]
+    fields = index_fields("Beach day", "the beach was warm")
+    assert fields["weights"]["beach"] == 4 and fields["terms"] == ["beach", "day", "the", "warm", "was"]
+
+
+def test_search_ranks_title_matches_and_matches_prefixes(mock_db, login_as):
+    login_as("u1")
+    in_content = _note("Saturday", "We walked along the beach until sunset")
+    in_title = _note("Beach trip", "Sand everywhere")
+    _note("Groceries", "milk, eggs, bread")
+
+    hits = _search("beach")
+    assert [hit["id"] for hit in hits] == [in_title["id"], in_content["id"]]
+    assert hits[0]["score"] > hits[1]["score"]
+
+    assert [hit["id"] for hit in _search("sun")] == [in_content["id"]]
+    assert [hit["id"] for hit in _search("beach sunset")] == [in_content["id"]]
+    assert _search("volcano") == []
+
+
+def test_search_returns_snippet_with_highlights(mock_db, login_as):
+    login_as("u1")
+    filler = "lorem ipsum " * 30
+    _note("Long", filler + "the lighthouse keeper waved " + filler)
+    hit = _search("lighthouse")[0]
+    assert hit["snippet"].startswith("…") and hit["snippet"].endswith("…")
+    (start, end), = hit["highlights"]
+    assert hit["snippet"][start:end] == "lighthouse"
+
+
+def test_search_follows_updates_and_deletes(mock_db, login_as):
+    login_as("u1")
+    note = _note("Picnic", "apples")
+    client.put(f"/api/notes/{note['id']}", json={"title": "Picnic", "content": "pears"})
+    assert _search("apples") == []
+    assert [hit["id"] for hit in _search("pears")] == [note["id"]]
+    assert "search" not in client.get(f"/api/notes/{note['id']}").json()
+
+    client.delete(f"/api/notes/{note['id']}")
+    assert _search("pears") == []
+
+
+def test_search_is_scoped_to_the_user(mock_db, login_as):
+    login_as("u1")
+    _note("Secret", "hidden treasure")
+    login_as("u2")
+    assert _search("treasure") == []
+
+
+def test_snippet_without_content_match_starts_at_the_top():
+    text, highlights = snippet("short text", ["title"])
+    assert text == "short text" and highlights == []
+
+
+def test_backfill_indexes_existing_notes(mock_db, login_as):
+    asyncio.run(mock_db.notes.insert_one({
+        "id": "n1", "user_id": "u1", "title": "Old", "content": "ancient scroll",
+        "created_at": "2020-01-01T00:00:00+00:00",
+    }))
+    assert asyncio.run(backfill_note_search(mock_db)) == 1
+    login_as("u1")
+    assert [hit["id"] for hit in _search("scroll")] == ["n1"]
+
+
+def test_best_match_ranks_first_behind_many_weak_ones(mock_db):
+    weak = [{"id": f"w{i}", "user_id": "u1", "search": index_fields("", "common " + "filler " * 30)}
+            for i in range(300)]
+    best = {"id": "best", "user_id": "u1", "search": index_fields("common ground", "common ground")}
+    other = {"id": "x", "user_id": "u2", "search": index_fields("common ground", "")}
+
+    async def run():
+        await mock_db.notes.insert_many(weak + [best, other])
+        return await search_notes(mock_db, "u1", "common", 3), await search_notes(mock_db, "u1", "ground common", 3)
+
+    (common, _), (both, _) = asyncio.run(run())
+    assert common[0]["id"] == "best" and len(common) == 3
+    assert [hit["id"] for hit in both] == ["best"]
+
+
+def test_candidates_are_capped_and_read_through_the_search_index(mock_db, monkeypatch):
+    monkeypatch.setattr(search, "MAX_CANDIDATES", 5)
+    notes = [{"id": f"n{i}", "user_id": "u1", "search": index_fields("", "common")} for i in range(20)]
+    asyncio.run(mock_db.notes.insert_many(notes))
+    hits, _ = asyncio.run(search_notes(mock_db, "u1", "common", 50))
+    assert len(hits) == 5
+    assert search.SEARCH_INDEX in {spec.name for spec in INDEXES}
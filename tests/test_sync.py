@@ -0,0 +1,102 @@
+import asyncio
+from datetime import datetime, timezone
+
+import pytest
+from fastapi.testclient import TestClient
+
+from backend import sync
+from backend.migrations import backfill_sync_seq
+from backend.server import app
+
+client = TestClient(app)
+
+
+@pytest.fixture
+def settled(monkeypatch):
+    monkeypatch.setattr(sync, "SETTLE_SECONDS", 0)
+
+
+def _sync(since=0, **params):
+    resp = client.get("/api/sync", params={"since": since, **params})
+    assert resp.status_code == 200
+    return resp.json()
+
+
+def test_sync_returns_only_changes_since_cursor(mock_db, login_as, settled):
+    login_as("u1")
+    note = client.post("/api/notes", json={"title": "a", "content": "b"}).json()
+    reminder = client.post("/api/reminders", json={"title": "r", "date": "2026-01-01"}).json()
+    client.post("/api/checkbox-notes", json={"title": "c", "items": [{"text": "x"}]})
+
+    first = _sync()
+    assert [n["id"] for n in first["changes"]["notes"]] == [note["id"]]
+    assert len(first["changes"]["reminders"]) == 1 and len(first["changes"]["checkbox_notes"]) == 1
+    assert first["cursor"] == 3 and first["has_more"] is False
+    assert _sync(first["cursor"])["changes"] == {"notes": [], "reminders": [], "checkbox_notes": [], "friends": []}
+
+    client.put(f"/api/notes/{note['id']}", json={"title": "a2", "content": "b"})
+    client.delete(f"/api/reminders/{reminder['id']}")
+    second = _sync(first["cursor"])
+    assert [n["title"] for n in second["changes"]["notes"]] == ["a2"]
+    assert second["deleted"]["reminders"] == [{"id": reminder["id"], "seq": 5}]
+    assert second["cursor"] == 5
+
+    login_as("u2")
+    assert _sync()["cursor"] == 0
+
+
+def test_sync_pages_through_in_seq_order(mock_db, login_as, settled):
+    login_as("u1")
+    for i in range(5):
+        client.post("/api/notes", json={"title": f"n{i}", "content": ""})
+        client.post("/api/reminders", json={"title": f"r{i}", "date": "2026-01-01"})
+
+    seen, since = [], 0
+    while True:
+        page = _sync(since, limit=3)
+        seen += [doc["seq"] for docs in page["changes"].values() for doc in docs]
+        since = page["cursor"]
+        if not page["has_more"]:
+            break
+    assert sorted(seen) == list(range(1, 11))
+
+
+def test_recent_changes_are_sent_but_hold_the_cursor_back(mock_db, login_as):
+    login_as("u1")
+    client.post("/api/notes", json={"title": "a", "content": "b"})
+    page = _sync()
+    assert len(page["changes"]["notes"]) == 1
+    assert page["cursor"] == 0
+
+
+def test_removing_a_friend_leaves_tombstones_for_both_sides(mock_db, login_as, settled):
+    async def seed():
+        await mock_db.users.insert_many([{"id": "u1", "username": "alice"}, {"id": "u2", "username": "bob"}])
+        await mock_db.friends.insert_many([
+            {"id": "f1", "user_id": "u1", "friend_username": "bob"},
+            {"id": "f2", "user_id": "u2", "friend_username": "alice"},
+        ])
+    asyncio.run(seed())
+
+    login_as("u1", "alice")
+    assert client.delete("/api/friends/bob").status_code == 200
+    assert [d["id"] for d in _sync()["deleted"]["friends"]] == ["f1"]
+    login_as("u2", "bob")
+    assert [d["id"] for d in _sync()["deleted"]["friends"]] == ["f2"]
+
+
+def test_backfill_numbers_existing_documents(mock_db):
+    async def run():
+        await mock_db.notes.insert_many([
+            {"id": "n1", "user_id": "u1", "created_at": "2025-01-01T00:00:00+00:00"},
+            {"id": "n2", "user_id": "u1", "created_at": "2025-01-02T00:00:00+00:00"},
+        ])
+        await mock_db.reminders.insert_one({"id": "r1", "user_id": "u1", "created_at": "2025-01-03T00:00:00+00:00"})
+        assert await backfill_sync_seq(mock_db) == 3
+        assert await backfill_sync_seq(mock_db) == 0
+        docs = await mock_db.notes.find({}, {"_id": 0}).to_list(None) + await mock_db.reminders.find({}, {"_id": 0}).to_list(None)
+        return docs
+
+    docs = asyncio.run(run())
+    assert sorted(doc["seq"] for doc in docs) == [1, 2, 3]
+    assert docs[0]["updated_at"] == datetime(2025, 1, 1, tzinfo=timezone.utc)
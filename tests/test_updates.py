@@ -0,0 +1,34 @@
+from fastapi.testclient import TestClient
+
+from backend.server import app
+
+client = TestClient(app)
+
+
+def test_updates_return_new_document(mock_db, login_as):
+    login_as("u1")
+    note = client.post("/api/notes", json={"title": "a", "content": "b"}).json()
+    resp = client.put(f"/api/notes/{note['id']}", json={"title": "a2", "content": "b2"})
+    assert resp.status_code == 200 and resp.json()["title"] == "a2"
+
+    reminder = client.post("/api/reminders", json={"title": "r", "date": "2026-01-01"}).json()
+    resp = client.put(f"/api/reminders/{reminder['id']}", json={"title": "r2", "date": "2026-02-01"})
+    assert resp.json()["date"] == "2026-02-01"
+
+    checklist = client.post("/api/checkbox-notes", json={"title": "c", "items": [{"text": "x"}]}).json()
+    resp = client.put(f"/api/checkbox-notes/{checklist['id']}",
+                      json={"title": "c", "items": [{"text": "x", "checked": True}]})
+    assert resp.json()["items"][0]["checked"] is True
+
+
+def test_updates_of_other_users_documents_are_404(mock_db, login_as):
+    login_as("u1")
+    note = client.post("/api/notes", json={"title": "a", "content": "b"}).json()
+    reminder = client.post("/api/reminders", json={"title": "r", "date": "2026-01-01"}).json()
+    checklist = client.post("/api/checkbox-notes", json={"title": "c", "items": []}).json()
+
+    login_as("u2")
+    assert client.put(f"/api/notes/{note['id']}", json={"title": "x", "content": "y"}).status_code == 404
+    assert client.put(f"/api/reminders/{reminder['id']}", json={"title": "x", "date": "d"}).status_code == 404
+    assert client.put(f"/api/checkbox-notes/{checklist['id']}", json={"title": "x", "items": []}).status_code == 404
+    assert client.put("/api/notes/missing", json={"title": "x", "content": "y"}).status_code == 404